@@ -0,0 +1,89 @@
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from bench_common import fill_synthetic_rows, int_list, option, percentile, use_bench_database, write_results
+
+# Usage: python benchmarks/bench_api.py [--rows 10000,100000,1000000] [--repeat N] [--json results.json]
+#
+# Loads synthetic rows into the benchmark database (BENCH_POSTGRES_DB,
+# truncated first) and times POST /api/jobs through the Flask test client,
+# with the response cache off, at each table size.
+
+SCENARIOS = {
+    'list_first_page': {'page': 1, 'limit': 10},
+    'list_with_description': {'page': 1, 'limit': 10, 'fields': ['id', 'job_title', 'job_description']},
+    'list_middle_page': None,
+    'search_first_page': {'search': 'php developer', 'page': 1, 'limit': 10},
+    'search_prefix': {'search': 'dev* kubernetes', 'page': 1, 'limit': 10},
+    'search_cursor_page': None,
+    'search_estimated_total': {'search': 'react', 'cursor': None, 'total': 'estimate', 'limit': 10},
+    'list_remote_recent': {'remote': True, 'posted_since': None, 'cursor': None, 'limit': 10},
+}
+
+
+def scenario_bodies(client, rows):
+    bodies = dict(SCENARIOS)
+    bodies['list_middle_page'] = {'page': max(1, rows // 20), 'limit': 10}
+    bodies['list_remote_recent'] = dict(SCENARIOS['list_remote_recent'],
+                                        posted_since=(date.today() - timedelta(days=7)).isoformat())
+    first = client.post('/api/jobs', json={'search': 'react', 'cursor': None, 'limit': 10}).get_json()
+    bodies['search_cursor_page'] = {'search': 'react', 'cursor': first['next_cursor'], 'limit': 10}
+    return bodies
+
+
+def measure(client, body, repeat):
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.post('/api/jobs', json=body)
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/jobs answered {response.status_code}: {response.get_data(as_text=True)}")
+        size = len(response.get_data())
+    return {'median_ms': statistics.median(samples), 'p95_ms': percentile(samples, 0.95), 'max_ms': max(samples),
+            'bytes': size}
+
+
+def main(argv):
+    sizes = option(argv, "--rows", [10000, 100000, 1000000], int_list)
+    repeat = option(argv, "--repeat", 20, int)
+    json_path = option(argv, "--json")
+
+    os.environ['RESPONSE_CACHE'] = 'off'
+    use_bench_database()
+    from db_pool import get_pool
+    from flask_main import app
+
+    pool = get_pool()
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("TRUNCATE linkedin RESTART IDENTITY CASCADE")
+        conn.commit()
+
+    client = app.test_client()
+    results = {}
+    loaded = 0
+    for rows in sorted(sizes):
+        print(f"Loading {rows:,} rows...")
+        with pool.connection() as conn:
+            fill_synthetic_rows(conn, "linkedin", rows, loaded)
+        loaded = rows
+
+        results[str(rows)] = {}
+        for name, body in scenario_bodies(client, rows).items():
+            timing = measure(client, body, repeat)
+            results[str(rows)][name] = timing
+            print(f"{rows:>9,} {name:24} median {timing['median_ms']:8.1f}ms  p95 {timing['p95_ms']:8.1f}ms  "
+                  f"{timing['bytes']:>8,} bytes")
+
+    if json_path:
+        write_results(json_path, "api", {'rows': sizes, 'repeat': repeat}, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
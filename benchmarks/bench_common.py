@@ -0,0 +1,149 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+# Shared helpers of the offline benchmarks: fixtures, the throwaway
+# benchmark database and the JSON result files compared by compare.py.
+
+# Load environment variables from .env file
+load_dotenv()
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+SEARCH_FIXTURE = os.path.join(FIXTURES_DIR, "search_results.html")
+DETAIL_FIXTURE = os.path.join(FIXTURES_DIR, "job_detail.html")
+
+TITLES = ["Software Engineer", "Senior Backend Developer", "PHP Developer", "Frontend Developer", "React Developer",
+          "Full Stack Developer", "Laravel Developer", "Node.js Developer", "DevOps Engineer", "Data Engineer"]
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises", "Pied Piper"]
+WORDS = ["team", "build", "scalable", "services", "php", "javascript", "react", "laravel", "python", "kubernetes",
+         "remote", "experience", "years", "design", "api", "cloud", "aws", "docker", "testing", "agile", "product",
+         "customers", "senior", "junior", "backend", "frontend", "database", "postgres", "mysql", "growth"]
+
+# Rows g = start..stop of a synthetic linkedin table with ~150 word
+# descriptions drawn from WORDS; the subquery refers to g so it is
+# evaluated per row
+SYNTHETIC_ROWS_QUERY = """
+INSERT INTO {table} (id, linkedin_job_id, job_title, job_link, company_name, company_link, job_source,
+                     job_location, salary, job_type, job_description, job_posted_date, posted_at, is_remote)
+SELECT g, g,
+       (%(titles)s::text[])[1 + g %% array_length(%(titles)s::text[], 1)],
+       'https://www.linkedin.com/jobs/view/' || g,
+       (%(companies)s::text[])[1 + (g / 7) %% array_length(%(companies)s::text[], 1)],
+       'https://www.linkedin.com/company/' || g %% 1000,
+       'LinkedIn', 'Remote', 'N/A', 'Full-time',
+       array_to_string(ARRAY(
+           SELECT (%(words)s::text[])[1 + floor(random() * array_length(%(words)s::text[], 1))::int]
+           FROM generate_series(1, 150) WHERE g > 0
+       ), ' '),
+       '1 day ago',
+       date_trunc('day', now()) - (g %% 60) * interval '1 day',
+       g %% 3 = 0
+FROM generate_series(%(start)s, %(stop)s) AS g
+"""
+
+SYNC_ID_SEQUENCE_QUERY = "SELECT setval(pg_get_serial_sequence(%s, 'id'), max(id)) FROM {table}"
+
+
+def read_fixture(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+# Function to read "--name value" from argv, converted with cast
+def option(argv, name, default=None, cast=str):
+    if name in argv:
+        return cast(argv[argv.index(name) + 1])
+    return default
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",")]
+
+
+# Function returning the connection settings of the throwaway benchmark
+# database. BENCH_POSTGRES_DB must be set and differ from POSTGRES_DB, as
+# the benchmarks truncate its tables.
+def bench_db_config():
+    database = os.getenv('BENCH_POSTGRES_DB')
+    if not database:
+        raise SystemExit("Set BENCH_POSTGRES_DB to a throwaway database; its tables are truncated")
+    config = {
+        'user': os.getenv('BENCH_POSTGRES_USER', os.getenv('POSTGRES_USER')),
+        'password': os.getenv('BENCH_POSTGRES_PASSWORD', os.getenv('POSTGRES_PASSWORD')),
+        'host': os.getenv('BENCH_POSTGRES_HOST', os.getenv('POSTGRES_HOST')),
+        'port': os.getenv('BENCH_POSTGRES_PORT', os.getenv('POSTGRES_PORT')),
+        'database': database,
+    }
+    if (config['database'], config['host']) == (os.getenv('POSTGRES_DB'), os.getenv('POSTGRES_HOST')):
+        raise SystemExit("BENCH_POSTGRES_DB must not be the application database")
+    return config
+
+
+# Function to point the application modules imported afterwards at the
+# benchmark database and bring its schema up to date
+def use_bench_database():
+    config = bench_db_config()
+    for key, name in (('user', 'POSTGRES_USER'), ('password', 'POSTGRES_PASSWORD'), ('host', 'POSTGRES_HOST'),
+                      ('port', 'POSTGRES_PORT'), ('database', 'POSTGRES_DB')):
+        if config[key] is not None:
+            os.environ[name] = config[key]
+
+    from migration import apply_migration
+    apply_migration()
+    return config
+
+
+# Function to load synthetic rows loaded + 1..rows into table. The rows get
+# explicit ids, so the id sequence is moved past them afterwards and later
+# inserts into the benchmark database do not collide with them.
+def fill_synthetic_rows(conn, table, rows, loaded=0, step=50000):
+    cursor = conn.cursor()
+    params = {'titles': TITLES, 'companies': COMPANIES, 'words': WORDS}
+    for start in range(loaded + 1, rows + 1, step):
+        cursor.execute(SYNTHETIC_ROWS_QUERY.format(table=table),
+                       dict(params, start=start, stop=min(start + step - 1, rows)))
+        conn.commit()
+    cursor.execute(SYNC_ID_SEQUENCE_QUERY.format(table=table), (table,))
+    cursor.execute(f"ANALYZE {table}")
+    conn.commit()
+    cursor.close()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to write the results of one benchmark run as JSON, with enough
+# context (commit, machine, parameters) to compare it with another run
+def write_results(path, benchmark, params, results):
+    document = {
+        'benchmark': benchmark,
+        'recorded_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
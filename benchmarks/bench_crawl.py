@@ -0,0 +1,163 @@
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_common import DETAIL_FIXTURE, SEARCH_FIXTURE, option, read_fixture, use_bench_database, write_results
+
+# Usage: python benchmarks/bench_crawl.py [--pages N] [--workers N] [--delay-ms 200] [--jitter-ms 50]
+#                                         [--throttle-rate 0.0] [--slow-rate 0.0] [--slow-ms 3000]
+#                                         [--rate 5] [--write] [--json results.json]
+#
+# Crawls the keyword searches against a local stand-in server that answers
+# every search URL with the recorded search fixture after a simulated
+# network delay, so scheduler, rate controller, HTTP fetcher and extractor
+# run end to end without touching LinkedIn. The server answers a
+# --throttle-rate fraction of requests with 429 and delays a --slow-rate
+# fraction by --slow-ms. With --write the jobs are also upserted into the
+# benchmark database (BENCH_POSTGRES_DB).
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    pages = {}
+    delay = 0.0
+    jitter = 0.0
+    throttle_rate = 0.0
+    slow_rate = 0.0
+    slow = 0.0
+
+    def do_GET(self):
+        if random.random() < self.throttle_rate:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        delay = self.delay + random.uniform(-self.jitter, self.jitter)
+        if random.random() < self.slow_rate:
+            delay += self.slow
+        time.sleep(max(0.0, delay))
+        body = self.pages['detail' if self.path.startswith('/jobs/view/') else 'search']
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(delay_ms, jitter_ms, throttle_rate=0.0, slow_rate=0.0, slow_ms=0.0):
+    FixtureHandler.pages = {
+        'search': read_fixture(SEARCH_FIXTURE).encode("utf-8"),
+        'detail': read_fixture(DETAIL_FIXTURE).encode("utf-8"),
+    }
+    FixtureHandler.delay = delay_ms / 1000
+    FixtureHandler.jitter = jitter_ms / 1000
+    FixtureHandler.throttle_rate = throttle_rate
+    FixtureHandler.slow_rate = slow_rate
+    FixtureHandler.slow = slow_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def browser_fetch(url):
+    raise RuntimeError(f"Browser fallback disabled in the crawl benchmark: {url}")
+
+
+def crawl_tasks(pages):
+    from crawl_scheduler import CrawlTask
+    from crawl_pages import generate_tasks
+    tasks = generate_tasks()
+    return [CrawlTask(tasks[index % len(tasks)].keyword, f"{tasks[index % len(tasks)].url}&start={index}")
+            for index in range(pages)]
+
+
+def main(argv):
+    pages = option(argv, "--pages", 40, int)
+    workers = option(argv, "--workers", 4, int)
+    delay_ms = option(argv, "--delay-ms", 200, float)
+    jitter_ms = option(argv, "--jitter-ms", 50, float)
+    throttle_rate = option(argv, "--throttle-rate", 0.0, float)
+    slow_rate = option(argv, "--slow-rate", 0.0, float)
+    slow_ms = option(argv, "--slow-ms", 3000, float)
+    rate = option(argv, "--rate", 5.0, float)
+    json_path = option(argv, "--json")
+    write = "--write" in argv
+
+    if write:
+        use_bench_database()
+    server = start_server(delay_ms, jitter_ms, throttle_rate, slow_rate, slow_ms)
+    os.environ['LINKEDIN_BASE_URL'] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.pop('HTML_CACHE_DIR', None)
+
+    from crawl_scheduler import CrawlScheduler
+    from extractor import search_page_parser
+    from http_fetcher import PageFetcher, SEARCH_PAGE_MARKER
+    from rate_controller import RateController
+
+    controller = RateController(rate=rate, burst=workers, max_rate=rate * 4, concurrency=workers,
+                                max_concurrency=workers * 2, backoff_seconds=0.5)
+    fetcher = PageFetcher(browser_fetch, SEARCH_PAGE_MARKER, mode='http', pool_size=workers, controller=controller)
+    scheduler = CrawlScheduler(fetcher, max_workers=workers, max_per_host=workers)
+    tasks = crawl_tasks(pages)
+
+    conn = cursor = writer = None
+    if write:
+        from db_pool import get_pool
+        from job_store import JobWriter
+        conn = get_pool().getconn()
+        cursor = conn.cursor()
+        writer = JobWriter(cursor)
+
+    jobs = failed = 0
+    started = time.perf_counter()
+    for result in scheduler.run(tasks):
+        if result.error is not None:
+            failed += 1
+            continue
+        for data in search_page_parser().iter_jobs(result.html):
+            jobs += 1
+            if writer is not None:
+                writer.add(data)
+    if writer is not None:
+        writer.flush()
+        conn.commit()
+    seconds = time.perf_counter() - started
+
+    fetcher.close()
+    server.shutdown()
+    if conn is not None:
+        cursor.close()
+        from db_pool import get_pool
+        get_pool().putconn(conn)
+
+    results = {
+        'pages': len(tasks),
+        'failed': failed,
+        'jobs': jobs,
+        'seconds': seconds,
+        'pages_per_second': len(tasks) / seconds if seconds else 0.0,
+        'jobs_per_second': jobs / seconds if seconds else 0.0,
+    }
+    results['rate_control'] = controller.report()
+    if writer is not None:
+        results['written'] = writer.totals
+    print(f"{len(tasks)} pages ({failed} failed), {jobs} jobs in {seconds:.2f}s = "
+          f"{results['pages_per_second']:.1f} pages/s, {results['jobs_per_second']:.0f} jobs/s "
+          f"(workers={workers}, delay={delay_ms:.0f}±{jitter_ms:.0f}ms)")
+
+    if json_path:
+        write_results(json_path, "crawl", {'pages': pages, 'workers': workers, 'delay_ms': delay_ms,
+                                           'jitter_ms': jitter_ms, 'throttle_rate': throttle_rate,
+                                           'slow_rate': slow_rate, 'slow_ms': slow_ms, 'rate': rate,
+                                           'write': write}, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
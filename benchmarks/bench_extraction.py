@@ -0,0 +1,103 @@
+import sys
+import time
+
+from bench_common import DETAIL_FIXTURE, SEARCH_FIXTURE, option, read_fixture, write_results
+
+from bs4 import BeautifulSoup
+from extractor import (extract_detail_page, extract_job_data, find_job_cards, find_results_section, parse_html,
+                       search_page_parser)
+
+# Usage: python benchmarks/bench_extraction.py [saved_page.html ...] [--detail saved_detail.html]
+#                                               [--repeat N] [--json results.json]
+#
+# Without pages the recorded fixtures in benchmarks/fixtures are used.
+
+LEGACY_FIELDS = [
+    ("h3", "base-search-card__title", None),
+    ("a", "base-card__full-link absolute top-0 right-0 bottom-0 left-0 p-0 z-[2]", "href"),
+    ("div", "show-more-less-html__markup relative overflow-hidden", None),
+    ("a", "hidden-nested-link", None),
+    ("a", "hidden-nested-link", "href"),
+    ("li", "job-details-jobs-unified-top-card__job-insight job-details-jobs-unified-top-card__job-insight--highlight", None),
+    ("span", "job-search-card__location", None),
+    ("div", "salary compensation__salary", None),
+    ("time", "job-search-card__listdate--new", None),
+]
+
+
+# The extraction as it was before extractor.py: html.parser, exact
+# multi-class matches and two find() calls per field
+def legacy_extract(html):
+    soup = BeautifulSoup(html, "html.parser")
+    section = soup.find("section", class_="two-pane-serp-page__results-list")
+    if section is None:
+        return []
+    cards = section.find_all("div",
+                             class_="base-card relative w-full hover:no-underline focus:no-underline base-card--link base-search-card base-search-card--link job-search-card")
+    jobs = []
+    for card in cards:
+        job = []
+        for tag, class_name, attribute in LEGACY_FIELDS:
+            if attribute is not None:
+                element = card.find(tag, class_=class_name)
+                job.append(element[attribute].strip() if element else "N/A")
+            else:
+                job.append(card.find(tag, class_=class_name).text.strip() if card.find(tag, class_=class_name) else "N/A")
+        jobs.append(job)
+    return jobs
+
+
+def compiled_extract(html):
+    section = find_results_section(parse_html(html))
+    if section is None:
+        return []
+    return [extract_job_data(card) for card in find_job_cards(section)]
+
+
+def streaming_extract(html):
+    return list(search_page_parser('stream').iter_jobs(html))
+
+
+def detail_extract(html):
+    return [extract_detail_page(html)]
+
+
+def measure(extract, pages, repeat):
+    cards = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            cards += len(extract(html))
+    seconds = time.perf_counter() - started
+    return cards, seconds
+
+
+def main(argv):
+    repeat = option(argv, "--repeat", 5, int)
+    json_path = option(argv, "--json")
+    detail_path = option(argv, "--detail", DETAIL_FIXTURE)
+    for name in ("--repeat", "--json", "--detail"):
+        if name in argv:
+            index = argv.index(name)
+            argv = argv[:index] + argv[index + 2:]
+    paths = argv or [SEARCH_FIXTURE]
+
+    pages = [read_fixture(path) for path in paths]
+    detail_pages = [read_fixture(detail_path)]
+
+    results = {}
+    runs = (("legacy", legacy_extract, pages), ("compiled", compiled_extract, pages),
+            ("streaming", streaming_extract, pages), ("detail", detail_extract, detail_pages))
+    for name, extract, inputs in runs:
+        records, seconds = measure(extract, inputs, repeat)
+        rate = records / seconds if seconds else 0.0
+        unit = "pages" if name == "detail" else "cards"
+        results[name] = {'records': records, 'seconds': seconds, f'{unit}_per_second': rate}
+        print(f"{name:9} {records} {unit} in {seconds:.3f}s = {rate:,.0f} {unit}/s")
+
+    if json_path:
+        write_results(json_path, "extraction", {'pages': paths, 'detail': detail_path, 'repeat': repeat}, results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
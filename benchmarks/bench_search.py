@@ -0,0 +1,111 @@
+import statistics
+import sys
+import time
+
+from bench_common import fill_synthetic_rows, int_list, option, use_bench_database, write_results
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from job_search import count_jobs, search_jobs
+
+# Usage: python benchmarks/bench_search.py [--rows 100000,1000000] [--repeat N] [--json results.json]
+#
+# Builds a synthetic copy of the linkedin table in a scratch schema of the
+# benchmark database (BENCH_POSTGRES_DB) and times searches over the old
+# LIKE query and the full-text path. The scratch schema is dropped afterwards.
+
+SCHEMA = "bench_search"
+SEARCHES = ["php developer", "react", "senior backend engineer", "laravel", "kubernetes remote"]
+PAGE_SIZE = 10
+
+SETUP_QUERIES = [
+    f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+    f"CREATE SCHEMA {SCHEMA}",
+    f"CREATE TABLE {SCHEMA}.linkedin (LIKE public.linkedin INCLUDING DEFAULTS INCLUDING INDEXES)",
+    # Its own id sequence; the copied default would draw from public.linkedin's
+    f"CREATE SEQUENCE {SCHEMA}.linkedin_id_seq OWNED BY {SCHEMA}.linkedin.id",
+    f"ALTER TABLE {SCHEMA}.linkedin ALTER COLUMN id SET DEFAULT nextval('{SCHEMA}.linkedin_id_seq')",
+    f"""
+    CREATE TRIGGER linkedin_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF job_title, company_name, job_location, job_type, job_description ON {SCHEMA}.linkedin
+    FOR EACH ROW EXECUTE FUNCTION public.linkedin_search_vector_update()
+    """,
+]
+
+# The query /api/jobs ran before job_search.py
+LIKE_QUERY = """
+SELECT * FROM linkedin
+WHERE job_title LIKE %s OR job_link LIKE %s OR company_name LIKE %s OR company_link LIKE %s OR job_source LIKE %s OR job_location LIKE %s OR salary LIKE %s OR job_type LIKE %s OR job_description LIKE %s OR job_posted_date LIKE %s
+LIMIT %s OFFSET %s
+"""
+
+LIKE_COUNT_QUERY = """
+SELECT COUNT(*) as total FROM linkedin WHERE job_title LIKE %s OR job_link LIKE %s OR company_name LIKE %s OR company_link LIKE %s OR job_source LIKE %s OR job_location LIKE %s OR salary LIKE %s OR job_type LIKE %s OR job_description LIKE %s OR job_posted_date LIKE %s
+"""
+
+
+def like_search(cursor, text):
+    pattern = f"%{text}%"
+    cursor.execute(LIKE_QUERY, (pattern,) * 10 + (PAGE_SIZE, 0))
+    cursor.fetchall()
+    cursor.execute(LIKE_COUNT_QUERY, (pattern,) * 10)
+    cursor.fetchone()
+
+
+def fulltext_search(cursor, text):
+    search_jobs(cursor, text, PAGE_SIZE)
+    count_jobs(cursor, text)
+
+
+def measure(cursor, search, repeat):
+    timings = {}
+    for text in SEARCHES:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            search(cursor, text)
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[text] = statistics.median(samples)
+    return timings
+
+
+def main(argv):
+    sizes = option(argv, "--rows", [100000, 1000000], int_list)
+    repeat = option(argv, "--repeat", 5, int)
+    json_path = option(argv, "--json")
+
+    conn = psycopg2.connect(**use_bench_database())
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    results = {}
+    try:
+        for query in SETUP_QUERIES:
+            cursor.execute(query)
+        cursor.execute(f"SET search_path TO {SCHEMA}, public")
+        conn.commit()
+
+        loaded = 0
+        for rows in sorted(sizes):
+            print(f"Loading {rows:,} rows...")
+            fill_synthetic_rows(conn, f"{SCHEMA}.linkedin", rows, loaded)
+            loaded = rows
+
+            like = measure(cursor, like_search, repeat)
+            fulltext = measure(cursor, fulltext_search, repeat)
+            results[str(rows)] = {'like_ms': like, 'fulltext_ms': fulltext}
+            print(f"{'search':26} {'LIKE ms':>10} {'full-text ms':>13} {'speedup':>8}")
+            for text in SEARCHES:
+                speedup = like[text] / fulltext[text] if fulltext[text] else 0.0
+                print(f"{text:26} {like[text]:10.1f} {fulltext[text]:13.1f} {speedup:7.1f}x")
+    finally:
+        conn.rollback()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    if json_path:
+        write_results(json_path, "search", {'rows': sizes, 'repeat': repeat}, results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,69 @@
+import sys
+import time
+
+from bench_common import SEARCH_FIXTURE, option, read_fixture, use_bench_database, write_results
+
+# Usage: python benchmarks/bench_upsert.py [--rows 20000] [--batch 100] [--json results.json]
+#
+# Upserts synthetic jobs built from the recorded search fixture into the
+# benchmark database (BENCH_POSTGRES_DB, truncated first) through JobWriter:
+# once as new rows, once unchanged and once with every title changed.
+
+
+def synthetic_jobs(rows):
+    from extractor import search_page_parser
+    cards = list(search_page_parser().iter_jobs(read_fixture(SEARCH_FIXTURE)))
+    jobs = []
+    for index in range(rows):
+        data = dict(cards[index % len(cards)])
+        data['JobLink'] = f"https://www.linkedin.com/jobs/view/bench-job-{index + 1}"
+        jobs.append(data)
+    return jobs
+
+
+def run_phase(pool, jobs, batch_size):
+    from job_store import JobWriter
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        writer = JobWriter(cursor, batch_size=batch_size)
+        started = time.perf_counter()
+        for data in jobs:
+            writer.add(data)
+        writer.flush()
+        conn.commit()
+        seconds = time.perf_counter() - started
+        cursor.close()
+    totals = writer.totals
+    return dict(totals, seconds=seconds, rows_per_second=len(jobs) / seconds if seconds else 0.0)
+
+
+def main(argv):
+    rows = option(argv, "--rows", 20000, int)
+    batch_size = option(argv, "--batch", 100, int)
+    json_path = option(argv, "--json")
+
+    use_bench_database()
+    from db_pool import get_pool
+    pool = get_pool()
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("TRUNCATE linkedin RESTART IDENTITY CASCADE")
+        conn.commit()
+
+    jobs = synthetic_jobs(rows)
+    changed = [dict(data, JobTitle=data['JobTitle'] + " II") for data in jobs]
+
+    results = {}
+    for name, phase_jobs in (("insert", jobs), ("unchanged", jobs), ("update", changed)):
+        results[name] = run_phase(pool, phase_jobs, batch_size)
+        print(f"{name:9} {rows} jobs in {results[name]['seconds']:.2f}s = "
+              f"{results[name]['rows_per_second']:,.0f} rows/s ({results[name]['inserted']} inserted, "
+              f"{results[name]['updated']} updated, {results[name]['unchanged']} unchanged)")
+
+    if json_path:
+        write_results(json_path, "upsert", {'rows': rows, 'batch': batch_size}, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
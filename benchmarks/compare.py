@@ -0,0 +1,50 @@
+import json
+import sys
+
+# Usage: python benchmarks/compare.py baseline.json candidate.json
+#
+# Prints every numeric result of two runs of the same benchmark side by
+# side with the candidate/baseline ratio.
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def main(argv):
+    if len(argv) != 2:
+        print("Usage: python benchmarks/compare.py baseline.json candidate.json")
+        return 1
+
+    documents = []
+    for path in argv:
+        with open(path, encoding="utf-8") as f:
+            documents.append(json.load(f))
+    baseline, candidate = documents
+    if baseline['benchmark'] != candidate['benchmark']:
+        print(f"Different benchmarks: {baseline['benchmark']} vs {candidate['benchmark']}")
+        return 1
+
+    print(f"{baseline['benchmark']}: {baseline.get('git_commit')} -> {candidate.get('git_commit')}")
+    if baseline['params'] != candidate['params']:
+        print(f"Warning: parameters differ: {baseline['params']} vs {candidate['params']}")
+
+    old = dict(flatten(baseline['results']))
+    new = dict(flatten(candidate['results']))
+    width = max((len(name) for name in old), default=10)
+    for name in sorted(old.keys() | new.keys()):
+        before, after = old.get(name), new.get(name)
+        if before is None or after is None:
+            print(f"{name:{width}} {before if before is not None else '-':>14} {after if after is not None else '-':>14}")
+            continue
+        ratio = after / before if before else 0.0
+        print(f"{name:{width}} {before:14.3f} {after:14.3f} {ratio:7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,204 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import psutil
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from dotenv import load_dotenv
+from metrics import STAGE_SECONDS
+
+# Load environment variables from .env file
+load_dotenv()
+
+CHROME_ARGUMENTS = [
+    '--headless',
+    "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+]
+
+# Extra flags used by the detail scrapers to disable WebRTC
+WEBRTC_ARGUMENTS = [
+    "--disable-webrtc",
+    "--disable-rtc-smoothness-algorithm",
+    "--disable-rtc-smoothing",
+]
+
+
+# Function to start a new headless Chrome instance
+def create_driver(extra_arguments=()):
+    chrome_options = Options()
+    for argument in CHROME_ARGUMENTS + list(extra_arguments):
+        chrome_options.add_argument(argument)
+    return webdriver.Chrome(options=chrome_options)
+
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+# Pool of reusable Chrome sessions. Drivers are health checked on checkout,
+# have their cookies/cache cleared between leases and are recycled after
+# BROWSER_MAX_PAGES pages or once the resident memory of their chromedriver
+# and browser processes passes BROWSER_MAX_MEMORY_MB.
+class BrowserPool:
+    def __init__(self, size=None, max_pages=None, max_memory_mb=None, extra_arguments=()):
+        self.size = size or int(os.getenv('BROWSER_POOL_SIZE', 1))
+        self.max_pages = max_pages or int(os.getenv('BROWSER_MAX_PAGES', 50))
+        self.max_memory_mb = max_memory_mb or int(os.getenv('BROWSER_MAX_MEMORY_MB', 512))
+        self.extra_arguments = list(extra_arguments)
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._created_at = time.perf_counter()
+
+        self.stats = {
+            'pages': 0,
+            'drivers_started': 0,
+            'startup_seconds': 0.0,
+            'shutdown_seconds': 0.0,
+            'recycled': 0,
+            'unhealthy': 0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Lease a driver for one page; the driver goes back to the pool afterwards
+    @contextmanager
+    def lease(self):
+        self._slots.acquire()
+        entry = None
+        healthy = True
+        try:
+            entry = self._checkout()
+            yield entry.driver
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            if entry is not None:
+                entry.pages += 1
+                with self._lock:
+                    self.stats['pages'] += 1
+                self._checkin(entry, healthy)
+            self._slots.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start()
+            if self._is_healthy(entry):
+                return entry
+            with self._lock:
+                self.stats['unhealthy'] += 1
+            self._retire(entry)
+
+    def _checkin(self, entry, healthy):
+        if not healthy:
+            with self._lock:
+                self.stats['unhealthy'] += 1
+            self._retire(entry)
+            return
+
+        if entry.pages >= self.max_pages or self._memory_mb(entry) >= self.max_memory_mb:
+            with self._lock:
+                self.stats['recycled'] += 1
+            self._retire(entry)
+            return
+
+        try:
+            self._reset(entry)
+        except WebDriverException:
+            self._retire(entry)
+            return
+        self._idle.put(entry)
+
+    def _start(self):
+        started = time.perf_counter()
+        driver = create_driver(self.extra_arguments)
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage='driver_start')
+        with self._lock:
+            self.stats['drivers_started'] += 1
+            self.stats['startup_seconds'] += elapsed
+        return PooledDriver(driver)
+
+    def _retire(self, entry):
+        started = time.perf_counter()
+        try:
+            entry.driver.quit()
+        except WebDriverException as err:
+            print(f"Error closing browser: {err}")
+        with self._lock:
+            self.stats['shutdown_seconds'] += time.perf_counter() - started
+
+    def _is_healthy(self, entry):
+        try:
+            return entry.driver.execute_script("return 1") == 1
+        except WebDriverException:
+            return False
+
+    # Function to measure the resident memory of a driver: the chromedriver
+    # service process and every browser process it started
+    def _memory_mb(self, entry):
+        try:
+            pid = entry.driver.service.process.pid
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+        except (AttributeError, psutil.Error):
+            return 0
+        used = 0
+        for process in processes:
+            try:
+                used += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return used / (1024 * 1024)
+
+    # Clear cookies, cache and storage so the next lease starts clean
+    def _reset(self, entry):
+        driver = entry.driver
+        driver.delete_all_cookies()
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+        driver.get("about:blank")
+
+    def close(self):
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(entry)
+
+    # Summary of the run, including the time saved versus starting and
+    # quitting a fresh driver for every page
+    def report(self):
+        stats = dict(self.stats)
+        started = max(stats['drivers_started'], 1)
+        avg_startup = stats['startup_seconds'] / started
+        avg_shutdown = stats['shutdown_seconds'] / started
+        avoided = max(stats['pages'] - stats['drivers_started'], 0)
+
+        stats['avg_startup_seconds'] = avg_startup
+        stats['saved_seconds'] = avoided * (avg_startup + avg_shutdown)
+        stats['wall_seconds'] = time.perf_counter() - self._created_at
+
+        print(f"Browser pool: {stats['pages']} pages served by {stats['drivers_started']} Chrome start(s), "
+              f"saved ~{stats['saved_seconds']:.1f}s vs one driver per URL "
+              f"({stats['recycled']} recycled, {stats['unhealthy']} unhealthy)")
+        return stats
@@ -0,0 +1,47 @@
+from crawl_scheduler import CrawlTask
+from readiness import wait_for_job_detail, wait_for_search_results
+from metrics import STAGE_SECONDS
+
+# Keyword searches and pooled page loaders shared by the Flask apps, the CLI
+# scrapers and the crawl workers (worker.py), which must not have to import
+# a Flask app to crawl.
+
+# List of keywords to search for jobs
+KEYWORDS = ['php developer', 'software engineer', 'full stack developer', 'backend developer', 'frontend developer',
+            'mern stack developer', 'react developer', 'Laravel developer', 'nodejs developer',
+            'javascript developer']  # Add more keywords
+
+
+# Function to generate one crawl task per keyword search
+def generate_tasks():
+    base_url = "https://www.linkedin.com/jobs/search/?currentJobId=4023652314&f_TPR=r86400&f_WT=2&geoId=103644278&keywords={keyword}&origin=JOB_SEARCH_PAGE_SEARCH_BUTTON&refresh=true"
+    return [CrawlTask(keyword, base_url.format(keyword=keyword.replace(' ', '%20'))) for keyword in KEYWORDS]
+
+
+# Function to load a search page with a driver leased from the pool
+def fetch_search_page(pool, url):
+    with pool.lease() as driver:
+        with STAGE_SECONDS.time(stage='driver_get'):
+            driver.get(url)
+        wait_for_search_results(driver)
+        return driver.page_source
+
+
+# Function to load a search with a pooled driver, scrolling for more results
+def scroll_search_page(pool, deep, seen, url):
+    with pool.lease() as driver:
+        return deep.scroll_page(driver, url, seen)
+
+
+# Function to load a job detail page and return its content
+def load_detail_page(driver, url):
+    with STAGE_SECONDS.time(stage='driver_get'):
+        driver.get(url)
+    wait_for_job_detail(driver)
+    return driver.page_source
+
+
+# Function to load a job detail page with a driver leased from the pool
+def fetch_detail_page(pool, url):
+    with pool.lease() as driver:
+        return load_detail_page(driver, url)
@@ -0,0 +1,123 @@
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+class CrawlTask:
+    def __init__(self, keyword, url, page=0):
+        self.keyword = keyword
+        self.url = url
+        self.page = page
+        self.host = urlsplit(url).netloc
+
+
+class CrawlResult:
+    def __init__(self, task, html=None, error=None, seconds=0.0):
+        self.task = task
+        self.html = html
+        self.error = error
+        self.seconds = seconds
+
+
+# Interleave tasks round-robin by keyword so that one keyword with many
+# URLs cannot starve the others
+def fair_order(tasks):
+    by_keyword = OrderedDict()
+    for task in tasks:
+        by_keyword.setdefault(task.keyword, deque()).append(task)
+
+    ordered = []
+    while by_keyword:
+        for keyword in list(by_keyword):
+            ordered.append(by_keyword[keyword].popleft())
+            if not by_keyword[keyword]:
+                del by_keyword[keyword]
+    return ordered
+
+
+# Runs fetch(url) for every task on a bounded worker pool, never running
+# more than max_workers fetches overall or max_per_host against one host.
+# Results are yielded as they complete so the caller can parse and store
+# them while the remaining fetches are still in flight, and may queue
+# follow-up tasks with add() while iterating.
+class CrawlScheduler:
+    def __init__(self, fetch, max_workers=None, max_per_host=None):
+        self.fetch = fetch
+        self.max_workers = max_workers or int(os.getenv('CRAWL_MAX_WORKERS', 4))
+        self.max_per_host = max_per_host or int(os.getenv('CRAWL_MAX_PER_HOST', 4))
+        self.results = []
+        self.wall_seconds = 0.0
+        self._pending = deque()
+
+    def _timed_fetch(self, task):
+        started = time.perf_counter()
+        try:
+            html = self.fetch(task.url)
+            return CrawlResult(task, html=html, seconds=time.perf_counter() - started)
+        except Exception as err:
+            return CrawlResult(task, error=err, seconds=time.perf_counter() - started)
+
+    # Queues a task while run() is iterating, e.g. the next results page of
+    # a search whose previous page has just been parsed
+    def add(self, task):
+        self._pending.append(task)
+
+    def run(self, tasks):
+        self._pending = pending = deque(fair_order(tasks))
+        in_flight = {}
+        per_host = {}
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or in_flight:
+                # Submit the first pending tasks whose host still has capacity
+                skipped = deque()
+                while pending and len(in_flight) < self.max_workers:
+                    task = pending.popleft()
+                    if per_host.get(task.host, 0) >= self.max_per_host:
+                        skipped.append(task)
+                        continue
+                    per_host[task.host] = per_host.get(task.host, 0) + 1
+                    in_flight[executor.submit(self._timed_fetch, task)] = task
+                pending.extendleft(reversed(skipped))
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = in_flight.pop(future)
+                    per_host[task.host] -= 1
+                    result = future.result()
+                    self.results.append(result)
+                    yield result
+
+        self.wall_seconds = time.perf_counter() - started
+
+    # Per-URL timings plus the overall wall time against the sum of fetch
+    # times, i.e. what a sequential crawl would have taken
+    def summary(self):
+        fetch_seconds = sum(result.seconds for result in self.results)
+        failed = [result for result in self.results if result.error is not None]
+
+        for result in self.results:
+            status = "failed" if result.error is not None else "ok"
+            print(f"  {result.seconds:6.2f}s  {status:6}  [{result.task.keyword}] {result.task.url}")
+        print(f"Crawl summary: {len(self.results)} URLs, {len(failed)} failed, "
+              f"{self.wall_seconds:.1f}s wall vs {fetch_seconds:.1f}s sequential "
+              f"(workers={self.max_workers}, per host={self.max_per_host})")
+
+        return {
+            'urls': len(self.results),
+            'failed': len(failed),
+            'wall_seconds': self.wall_seconds,
+            'fetch_seconds': fetch_seconds,
+            'timings': [
+                {'keyword': result.task.keyword, 'url': result.task.url, 'seconds': result.seconds,
+                 'error': str(result.error) if result.error is not None else None}
+                for result in self.results
+            ],
+        }
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+from dotenv import load_dotenv
+from metrics import DB_STATEMENT_SECONDS
+
+# Load environment variables from .env file
+load_dotenv()
+
+PLACEHOLDER_PATTERN = re.compile(r'%\((\w+)\)s|%s|%%')
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+# Cursor recording how long each statement took, by statement type
+class TimedCursor(psycopg2.extensions.cursor):
+    def execute(self, query, params=None):
+        with DB_STATEMENT_SECONDS.time(statement=_statement_type(query)):
+            return super().execute(query, params)
+
+
+class TimedRealDictCursor(RealDictCursor):
+    def execute(self, query, params=None):
+        with DB_STATEMENT_SECONDS.time(statement=_statement_type(query)):
+            return super().execute(query, params)
+
+
+def _statement_type(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    words = str(query).split(None, 1)
+    return words[0].upper() if words else ''
+
+
+# Connection that remembers which statements were prepared on it, least
+# recently used first, and when it was last known to be alive. Its cursors
+# are timed by default.
+class PooledConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = TimedCursor
+        self.prepared = OrderedDict()
+        self.max_prepared = int(os.getenv('DB_MAX_PREPARED', 64))
+        self.checked_at = time.monotonic()
+
+
+# Function to turn a query with %s or %(name)s placeholders into a PREPARE
+# body with $n parameters, and the names or positions in parameter order
+def _numbered_placeholders(query):
+    names = []
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(1) is None:
+            names.append(len(names))
+            return f'${len(names)}'
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f'${names.index(match.group(1)) + 1}'
+
+    return PLACEHOLDER_PATTERN.sub(replace, query), names
+
+
+# Function to run query as a server-side prepared statement when the cursor
+# belongs to a pooled connection, so repeated queries skip parsing and
+# planning. Falls back to a plain execute on other connections. Each
+# connection keeps at most DB_MAX_PREPARED statements and deallocates the
+# least recently used one beyond that, since column projections and filters
+# make the number of distinct query texts open ended.
+def execute_prepared(cursor, query, params=()):
+    conn = cursor.connection
+    if not isinstance(conn, PooledConnection):
+        cursor.execute(query, params)
+        return
+
+    body, names = _numbered_placeholders(query)
+    name = 'stmt_' + hashlib.sha1(body.encode('utf-8')).hexdigest()[:16]
+    if name in conn.prepared:
+        conn.prepared.move_to_end(name)
+    else:
+        while len(conn.prepared) >= conn.max_prepared:
+            stale, _ = conn.prepared.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {stale}")
+        cursor.execute(f"PREPARE {name} AS {body}")
+        conn.prepared[name] = True
+    values = [params[key] for key in names]
+    if values:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(values))})", values)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+
+# Fixed-size pool of Postgres connections shared by the threads of one
+# process. Connections are opened lazily up to DB_POOL_SIZE, pinged on
+# checkout when they sat idle for DB_VALIDATE_AFTER_SECONDS, reopened when
+# the ping fails, and run every statement under DB_STATEMENT_TIMEOUT_MS.
+# Callers waiting for a free connection give up after DB_POOL_TIMEOUT.
+class DatabasePool:
+    def __init__(self, config, size=None, timeout=None, statement_timeout_ms=None, validate_after=None):
+        self.config = config
+        self.size = size or int(os.getenv('DB_POOL_SIZE', 5))
+        self.timeout = timeout or float(os.getenv('DB_POOL_TIMEOUT', 10))
+        self.statement_timeout_ms = statement_timeout_ms or int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+        self.validate_after = validate_after or float(os.getenv('DB_VALIDATE_AFTER_SECONDS', 30))
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.stats = {'checkouts': 0, 'opened': 0, 'reconnects': 0, 'timeouts': 0, 'wait_seconds': 0.0,
+                      'max_wait_seconds': 0.0}
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection,
+                                options=f"-c statement_timeout={self.statement_timeout_ms}", **self.config)
+        self._count('opened')
+        return conn
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _validate(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.checked_at < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        conn.checked_at = time.monotonic()
+        return True
+
+    def getconn(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('timeouts')
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.stats['checkouts'] += 1
+            self.stats['wait_seconds'] += waited
+            self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], waited)
+
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if self._validate(conn):
+                return conn
+            self._count('reconnects')
+            if not conn.closed:
+                conn.close()
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    # Returns conn to the pool; uncommitted work is rolled back so the next
+    # user starts outside a transaction
+    def putconn(self, conn):
+        try:
+            if not conn.closed:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.checked_at = time.monotonic()
+                self._idle.put(conn)
+        except psycopg2.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def report(self):
+        checkouts = self.stats['checkouts']
+        average_wait = self.stats['wait_seconds'] / checkouts if checkouts else 0.0
+        print(f"Database pool: {checkouts} checkouts, average wait {average_wait * 1000:.1f}ms, "
+              f"max wait {self.stats['max_wait_seconds'] * 1000:.1f}ms, {self.stats['opened']} opened, "
+              f"{self.stats['reconnects']} reconnects, {self.stats['timeouts']} timeouts")
+        return dict(self.stats, size=self.size, idle=self._idle.qsize(), average_wait_seconds=average_wait)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+# Function returning the pool of this process, created from the POSTGRES_*
+# settings on first use. A forked gunicorn worker gets its own pool instead
+# of sharing sockets with its parent.
+def get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # Database connection parameters
+            config = {
+                'user': os.getenv('POSTGRES_USER'),
+                'password': os.getenv('POSTGRES_PASSWORD'),
+                'host': os.getenv('POSTGRES_HOST'),
+                'port': os.getenv('POSTGRES_PORT'),
+                'database': os.getenv('POSTGRES_DB'),
+            }
+            _pool = DatabasePool(config)
+            _pool_pid = os.getpid()
+        return _pool
@@ -0,0 +1,186 @@
+import os
+import threading
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from dotenv import load_dotenv
+from crawl_scheduler import CrawlTask
+from extractor import card_job_id
+from metrics import STAGE_SECONDS
+from readiness import JOB_CARD_SELECTOR, wait_for_search_results
+
+# Load environment variables from .env file
+load_dotenv()
+
+# LinkedIn serves 25 job cards per search results page
+PAGE_SIZE = 25
+PAGINATION_MODES = ('off', 'offset', 'scroll')
+
+SHOW_MORE_SELECTOR = "button.infinite-scroller__show-more-button"
+CARD_URNS_SCRIPT = "return Array.from(document.querySelectorAll(arguments[0])).map(card => card.getAttribute('data-entity-urn'))"
+
+
+# Function returning the URL of results page number page (0-based) of a
+# search, selected by the start offset
+def page_url(url, page, page_size=PAGE_SIZE):
+    if page == 0:
+        return url
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in ('start', 'pageNum')]
+    query.append(('start', str(page * page_size)))
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
+
+
+# Function telling whether url asks for a results page after the first. A
+# search has no results section past its last page, which ends the search
+# instead of being a fetch error.
+def later_page(url):
+    start = dict(parse_qsl(urlsplit(url).query)).get('start', '0')
+    return start.isdigit() and int(start) > 0
+
+
+# Function to key a search URL by its path and query, so a URL rewritten to
+# LINKEDIN_BASE_URL on its way to the browser still matches its task
+def search_key(url):
+    parts = urlsplit(url)
+    return parts.path, parts.query
+
+
+# Wraps the seen index handed to a card parser. The parser checks every card
+# of the page in order, so this counts the cards and how many known job IDs
+# came in a row; reached turns True once stop_after of them were known.
+class KnownRun:
+    def __init__(self, seen, stop_after):
+        self.seen = seen
+        self.stop_after = stop_after
+        self.cards = 0
+        self.run = 0
+        self.reached = False
+
+    def __contains__(self, job_id):
+        self.cards += 1
+        if self.seen is None or job_id not in self.seen:
+            self.run = 0
+            return False
+        self.run += 1
+        if self.stop_after and self.run >= self.stop_after:
+            self.reached = True
+        return True
+
+
+# Function counting the longest run of consecutive known job IDs without
+# touching the hit statistics of the seen index
+def longest_known_run(job_ids, seen):
+    if seen is None or seen.mode == 'off':
+        return 0
+    longest = run = 0
+    for job_id in job_ids:
+        run = run + 1 if job_id is not None and job_id in seen.ids else 0
+        longest = max(longest, run)
+    return longest
+
+
+# Follows a keyword search past its first results page. CRAWL_PAGINATION
+# 'offset' requests the next page by start offset after each parsed page,
+# 'scroll' keeps scrolling one browser page (see scroll_page) and 'off'
+# reads the first page only. A search stops after CRAWL_MAX_PAGES pages, on
+# a page without cards or results section, or once CRAWL_STOP_AFTER_KNOWN consecutive cards
+# were already known from earlier runs (0 disables the early stop).
+class DeepCrawl:
+    def __init__(self, mode=None, max_pages=None, stop_after_known=None):
+        self.mode = mode or os.getenv('CRAWL_PAGINATION', 'off')
+        if self.mode not in PAGINATION_MODES:
+            raise ValueError(f"Unknown pagination mode: {self.mode}")
+        self.max_pages = max_pages or int(os.getenv('CRAWL_MAX_PAGES', 40))
+        if stop_after_known is None:
+            stop_after_known = int(os.getenv('CRAWL_STOP_AFTER_KNOWN', PAGE_SIZE))
+        self.stop_after_known = stop_after_known
+
+        self._lock = threading.Lock()
+        self.searches = {}
+        self._scrolled = {}
+
+    def known_run(self, seen):
+        return KnownRun(seen, self.stop_after_known)
+
+    def _finish(self, keyword, pages, reason):
+        with self._lock:
+            self.searches[keyword] = {'pages': pages, 'stopped': reason}
+
+    # Function returning the task for the next results page of a search
+    # once task's page was parsed with known, or None when it is done. A
+    # scrolled search is recorded with the batches scroll_page loaded.
+    def next_task(self, task, known):
+        if self.mode == 'scroll':
+            with self._lock:
+                batches, reason = self._scrolled.pop(search_key(task.url), (task.page + 1, self.mode))
+            self._finish(task.keyword, batches, reason)
+            return None
+
+        reason = None
+        if self.mode != 'offset':
+            reason = self.mode
+        elif known.reached:
+            reason = 'known'
+        elif known.cards == 0:
+            reason = 'exhausted'
+        elif task.page + 1 >= self.max_pages:
+            reason = 'page_limit'
+        if reason is not None:
+            self._finish(task.keyword, task.page + 1, reason)
+            return None
+        return CrawlTask(task.keyword, page_url(task.url, task.page + 1), page=task.page + 1)
+
+    # Function to load a search in driver and scroll for further results
+    # until the page stops growing, max_pages batches were loaded or the
+    # newest cards contain a run of known job IDs; returns the page source
+    # with every card loaded
+    def scroll_page(self, driver, url, seen=None):
+        with STAGE_SECONDS.time(stage='driver_get'):
+            driver.get(url)
+        wait_for_search_results(driver)
+
+        batches = 1
+        reason = 'page_limit'
+        job_ids = self._card_ids(driver)
+        while batches < self.max_pages:
+            if self.stop_after_known and longest_known_run(job_ids, seen) >= self.stop_after_known:
+                reason = 'known'
+                break
+            self._show_more(driver)
+            wait_for_search_results(driver)
+            loaded = self._card_ids(driver)
+            if len(loaded) <= len(job_ids):
+                reason = 'exhausted'
+                break
+            job_ids = loaded
+            batches += 1
+
+        print(f"Scrolled {batches} result batches ({len(job_ids)} cards) for URL: {url}")
+        with self._lock:
+            self._scrolled[search_key(url)] = (batches, reason)
+        return driver.page_source
+
+    def _card_ids(self, driver):
+        urns = driver.execute_script(CARD_URNS_SCRIPT, JOB_CARD_SELECTOR)
+        return [card_job_id({'data-entity-urn': urn}) for urn in urns or []]
+
+    def _show_more(self, driver):
+        try:
+            for button in driver.find_elements(By.CSS_SELECTOR, SHOW_MORE_SELECTOR):
+                if button.is_displayed():
+                    button.click()
+        except WebDriverException as err:
+            print(f"Could not click the show more button: {err}")
+
+    def report(self):
+        with self._lock:
+            searches = dict(self.searches)
+        reasons = {}
+        for search in searches.values():
+            reasons[search['stopped']] = reasons.get(search['stopped'], 0) + 1
+        pages = sum(search['pages'] for search in searches.values())
+        print(f"Deep crawl ({self.mode}): {len(searches)} searches, {pages} result pages, stopped by "
+              + (", ".join(f"{reason}: {count}" for reason, count in sorted(reasons.items())) or "nothing"))
+        return {'searches': searches, 'pages': pages, 'stopped': reasons}
@@ -0,0 +1,181 @@
+import os
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from job_store import description_key, upsert_descriptions
+
+# Load environment variables from .env file
+load_dotenv()
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Rows that failed wait for their next_attempt_at, and are given up after
+# ENRICH_MAX_ATTEMPTS failures in a row
+SELECT_BATCH_QUERY = """
+SELECT id, job_link, page_hash, record_hash FROM linkedin
+WHERE id > %s
+  AND (enriched_at IS NULL OR enriched_at < now() - make_interval(days => %s))
+  AND enrich_attempts < %s AND (next_attempt_at IS NULL OR next_attempt_at <= now())
+ORDER BY id
+LIMIT %s
+"""
+
+SAVE_DETAILS_QUERY = f"""
+UPDATE linkedin
+SET description_id = v.description_id, job_description = NULL, job_type = v.job_type, salary = v.salary,
+    salary_min = v.salary_min, salary_max = v.salary_max,
+    salary_currency = v.salary_currency, salary_period = v.salary_period,
+    page_hash = v.page_hash, record_hash = v.record_hash,
+    enrichment_status = '{STATUS_DONE}', enriched_at = now(), enrich_attempts = 0, next_attempt_at = NULL
+FROM (VALUES %s) AS v (id, description_id, job_type, salary, salary_min, salary_max, salary_currency,
+                       salary_period, page_hash, record_hash)
+WHERE linkedin.id = v.id
+"""
+
+# Every row with a job link, whatever its enrichment state, for reparsing
+# cached pages after an extractor fix
+SELECT_ALL_BATCH_QUERY = """
+SELECT id, job_link, page_hash, record_hash FROM linkedin
+WHERE id > %s AND job_link IS NOT NULL
+ORDER BY id
+LIMIT %s
+"""
+
+# Only the small columns are touched, so the TOASTed description is reused
+MARK_UNCHANGED_QUERY = f"""
+UPDATE linkedin
+SET page_hash = v.page_hash, enrichment_status = '{STATUS_DONE}', enriched_at = now(), enrich_attempts = 0,
+    next_attempt_at = NULL
+FROM (VALUES %s) AS v (id, page_hash)
+WHERE linkedin.id = v.id
+"""
+
+# enriched_at is left alone; a failed row is fetched again after
+# ENRICH_RETRY_SECONDS, twice as long after every further failure but never
+# more than ENRICH_STALE_DAYS
+MARK_FAILED_QUERY = """
+UPDATE linkedin
+SET enrichment_status = %(status)s, enrich_attempts = enrich_attempts + 1,
+    next_attempt_at = now() + LEAST(make_interval(secs => %(retry_seconds)s * 2 ^ enrich_attempts),
+                                    make_interval(days => %(stale_days)s))
+WHERE id = ANY(%(ids)s)
+"""
+
+LOAD_CHECKPOINT_QUERY = "SELECT last_id FROM enrichment_checkpoint WHERE name = %s"
+
+SAVE_CHECKPOINT_QUERY = """
+INSERT INTO enrichment_checkpoint (name, last_id, updated_at) VALUES (%s, %s, now())
+ON CONFLICT (name) DO UPDATE SET last_id = EXCLUDED.last_id, updated_at = EXCLUDED.updated_at
+"""
+
+
+# Writes the outcome of detail scrapes: extracted details, pages or records
+# that did not change, and pages without details or that failed to load
+class DetailWriter:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.stale_days = int(os.getenv('ENRICH_STALE_DAYS', 7))
+        self.retry_seconds = float(os.getenv('ENRICH_RETRY_SECONDS', 3600))
+        self.stats = {'batches': 0, 'done': 0, 'failed': 0, 'unchanged_page': 0, 'unchanged_record': 0}
+
+    # Write extracted details for (id, data, page_hash, record_hash) rows in
+    # one statement. Descriptions go to job_descriptions, once per content.
+    def save_details(self, rows):
+        if not rows:
+            return
+        description_ids = upsert_descriptions(self.cursor, [data['JobDescription'] for _, data, _, _ in rows])
+        values = [(job_id, description_ids.get(description_key(data['JobDescription'])), data['JobType'],
+                   data['Salary'], data['SalaryMin'], data['SalaryMax'], data['SalaryCurrency'],
+                   data['SalaryPeriod'], page_hash, record_hash)
+                  for job_id, data, page_hash, record_hash in rows]
+        execute_values(self.cursor, SAVE_DETAILS_QUERY, values,
+                       template="(%s::integer, %s::integer, %s::varchar, %s::varchar, %s::numeric, %s::numeric, "
+                                "%s::varchar, %s::varchar, %s::varchar, %s::varchar)",
+                       page_size=len(values))
+        self.stats['done'] += len(rows)
+
+    # Refresh rows whose page or extracted record did not change, given
+    # (id, page_hash, reason) with reason 'unchanged_page' or 'unchanged_record'
+    def mark_unchanged(self, rows):
+        if not rows:
+            return
+        execute_values(self.cursor, MARK_UNCHANGED_QUERY, [(job_id, page_hash) for job_id, page_hash, _ in rows],
+                       template="(%s::integer, %s::varchar)", page_size=len(rows))
+        for _, _, reason in rows:
+            self.stats[reason] += 1
+
+    def mark_failed(self, job_ids):
+        if not job_ids:
+            return
+        self.cursor.execute(MARK_FAILED_QUERY, {'status': STATUS_FAILED, 'retry_seconds': self.retry_seconds,
+                                                'stale_days': self.stale_days, 'ids': list(job_ids)})
+        self.stats['failed'] += len(job_ids)
+
+
+# Work queue of rows that still need details, or whose details are older
+# than ENRICH_STALE_DAYS, leaving out failed rows until their next attempt
+# and those that failed ENRICH_MAX_ATTEMPTS times. Rows are walked by keyset pagination over id and
+# the last handled id is checkpointed in the same transaction as the batch,
+# so a crashed run resumes where it stopped. In reparse mode every row whose
+# page is_cached(job_link) is walked instead, ignoring enriched_at and the
+# checkpoint, so cached pages are all parsed again after a selector fix.
+class EnrichmentQueue(DetailWriter):
+    def __init__(self, cursor, name='detail', batch_size=None, stale_days=None, reparse=False, is_cached=None):
+        super().__init__(cursor)
+        self.name = name
+        self.batch_size = batch_size or int(os.getenv('ENRICH_BATCH_SIZE', 10))
+        self.stale_days = stale_days or self.stale_days
+        self.max_attempts = int(os.getenv('ENRICH_MAX_ATTEMPTS', 5))
+        self.reparse = reparse
+        self.is_cached = is_cached
+        self.last_id = 0 if reparse else self._load_checkpoint()
+        self.fed_id = self.last_id
+
+    def _load_checkpoint(self):
+        self.cursor.execute(LOAD_CHECKPOINT_QUERY, (self.name,))
+        row = self.cursor.fetchone()
+        if row is not None and row[0]:
+            print(f"Resuming enrichment '{self.name}' after id {row[0]}")
+            return row[0]
+        return 0
+
+    # Next rows after the last one handed out, which may be ahead of the
+    # checkpoint while earlier rows are still being processed
+    def next_batch(self):
+        while True:
+            if self.reparse:
+                self.cursor.execute(SELECT_ALL_BATCH_QUERY, (self.fed_id, self.batch_size))
+            else:
+                self.cursor.execute(SELECT_BATCH_QUERY, (self.fed_id, self.stale_days, self.max_attempts,
+                                                         self.batch_size))
+            jobs = self.cursor.fetchall()
+            if not jobs:
+                return jobs
+            self.fed_id = jobs[-1][0]
+            if self.is_cached is not None:
+                jobs = [job for job in jobs if self.is_cached(job[1])]
+            if jobs:
+                return jobs
+
+    # Record that every row up to last_id was handled; commit afterwards
+    def checkpoint(self, last_id):
+        self.last_id = last_id
+        self.stats['batches'] += 1
+        if not self.reparse:
+            self.cursor.execute(SAVE_CHECKPOINT_QUERY, (self.name, last_id))
+
+    # The queue is drained, so the next run starts from the beginning again
+    def finish(self):
+        self.last_id = 0
+        self.fed_id = 0
+        if not self.reparse:
+            self.cursor.execute(SAVE_CHECKPOINT_QUERY, (self.name, 0))
+
+    def report(self):
+        skipped = self.stats['unchanged_page'] + self.stats['unchanged_record']
+        total = skipped + self.stats['done'] + self.stats['failed']
+        skip_rate = skipped / total if total else 0.0
+        print(f"Enrichment '{self.name}': {self.stats['done']} enriched, {self.stats['failed']} failed, "
+              f"{skipped} unchanged ({self.stats['unchanged_page']} page, {self.stats['unchanged_record']} record, "
+              f"skip rate {skip_rate:.0%}) in {self.stats['batches']} batches")
+        return dict(self.stats, skip_rate=skip_rate)
@@ -0,0 +1,273 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+from extractor import EXTRACTOR_VERSION, MISSING
+from fingerprint import page_fingerprint, record_fingerprint
+from rate_controller import CircuitOpen
+
+# Load environment variables from .env file
+load_dotenv()
+
+STOP = object()
+# Result of a row that was not fetched because the circuit of its host is open
+DEFERRED = object()
+LOG_INTERVAL_SECONDS = 10
+
+
+# Function to compare a fetched detail page with the hashes stored for its
+# row. Pages whose fingerprint matches are not parsed, unless cached pages
+# are being reparsed, and records whose fingerprint matches are reported
+# unchanged rather than changed. The page fingerprint includes
+# EXTRACTOR_VERSION, so pages seen by an older extractor are parsed again.
+def compare_detail_page(parse, html, page_hash, record_hash, reparse=False):
+    new_page_hash = page_fingerprint(html, EXTRACTOR_VERSION)
+    if new_page_hash == page_hash and not reparse:
+        return {'status': 'unchanged_page', 'page_hash': new_page_hash}
+
+    data = parse(html)
+    new_record_hash = record_fingerprint(data)
+    if new_record_hash == record_hash:
+        return {'status': 'unchanged_record', 'page_hash': new_page_hash}
+    return {'status': 'changed', 'data': data, 'page_hash': new_page_hash, 'record_hash': new_record_hash}
+
+
+# A pool of worker threads applying func to every (job_id, payload) item of
+# inbox and passing (job_id, result) on to outbox. Failed items are passed on
+# with a None result so the writer can still account for them, and DEFERRED
+# ones are passed on untouched.
+class Stage:
+    def __init__(self, name, func, workers, inbox, outbox, downstream_workers):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.downstream_workers = downstream_workers
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._running = workers
+        self._lock = threading.Lock()
+
+    def start(self):
+        for index in range(self.workers):
+            threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True).start()
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is STOP:
+                break
+            job_id, payload = item
+            result = DEFERRED if payload is DEFERRED else None
+            started = time.perf_counter()
+            if payload is not None and payload is not DEFERRED:
+                try:
+                    result = self.func(payload)
+                except Exception as err:
+                    print(f"Error in {self.name} stage for job {job_id}: {err}")
+                    with self._lock:
+                        self.errors += 1
+            with self._lock:
+                self.processed += 1
+                self.busy_seconds += time.perf_counter() - started
+            self.outbox.put((job_id, result))
+
+        # The last worker to stop tells the next stage to stop as well
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last:
+            for _ in range(self.downstream_workers):
+                self.outbox.put(STOP)
+
+
+# Detail enrichment as fetch -> parse -> write stages connected by bounded
+# queues. Full queues block the stage in front of them, so a slow writer
+# throttles parsing and a slow parser throttles fetching. Writes are batched
+# and the checkpoint only advances past rows whose results were committed,
+# failed rows included, as those are retried by their next_attempt_at. Once
+# the rate controller's circuit opens, no more rows are handed out, the rows
+# it kept from being fetched hold the checkpoint back and the run stops
+# early. Pages whose
+# fingerprint matches the stored one are not parsed, and records whose
+# fingerprint matches are not written again.
+class EnrichmentPipeline:
+    def __init__(self, fetch, parse, fetch_workers=None, parse_workers=None, queue_size=None):
+        self.fetch = fetch
+        self.parse = parse
+        self.fetch_workers = fetch_workers or int(os.getenv('ENRICH_FETCH_WORKERS', 2))
+        self.parse_workers = parse_workers or int(os.getenv('ENRICH_PARSE_WORKERS', 1))
+        queue_size = queue_size or int(os.getenv('ENRICH_QUEUE_SIZE', 16))
+
+        self.fetch_queue = queue.Queue(queue_size)
+        self.parse_queue = queue.Queue(queue_size)
+        self.write_queue = queue.Queue(queue_size)
+        self.fetch_stage = Stage('fetch', self._fetch, self.fetch_workers, self.fetch_queue, self.parse_queue,
+                                 self.parse_workers)
+        self.parse_stage = Stage('parse', self._parse, self.parse_workers, self.parse_queue, self.write_queue, 1)
+
+        self.written = 0
+        self.write_seconds = 0.0
+        self.max_depths = {'fetch': 0, 'parse': 0, 'write': 0}
+        self.wall_seconds = 0.0
+        self.progress = None
+        self.reparse = False
+        self.halted = threading.Event()
+
+    # job is (job_link, page_hash, record_hash) as stored in the table
+    def _fetch(self, job):
+        try:
+            return job, self.fetch(job[0])
+        except CircuitOpen:
+            self.halted.set()
+            return DEFERRED
+
+    def _parse(self, fetched):
+        (_, page_hash, record_hash), html = fetched
+        return compare_detail_page(self.parse, html, page_hash, record_hash, reparse=self.reparse)
+
+    def depths(self):
+        return {
+            'fetch': self.fetch_queue.qsize(),
+            'parse': self.parse_queue.qsize(),
+            'write': self.write_queue.qsize(),
+        }
+
+    # Runs the pipeline over every job handed out by the enrichment queue,
+    # committing after each batch of queue.batch_size results and passing
+    # the running totals to the optional progress callback
+    def run(self, conn, enrichment_queue, progress=None):
+        self.progress = progress
+        self.reparse = enrichment_queue.reparse
+        started = time.perf_counter()
+        last_log = started
+        self.fetch_stage.start()
+        self.parse_stage.start()
+
+        fed = deque()
+        completed = set()
+        buffered = deque()
+        exhausted = False
+        stops_sent = 0
+        details = []
+        unchanged = []
+        failed = []
+        results = 0
+
+        while True:
+            if self.halted.is_set() and not exhausted:
+                print("Enrichment pipeline: circuit open, stopping after the rows in flight")
+                exhausted = True
+                buffered.clear()
+
+            # Hand out work while the fetch queue has room
+            while not exhausted and not self.fetch_queue.full():
+                if not buffered:
+                    buffered.extend(enrichment_queue.next_batch())
+                    if not buffered:
+                        exhausted = True
+                        break
+                job_id, job_link, page_hash, record_hash = buffered.popleft()
+                self.fetch_queue.put_nowait((job_id, (job_link, page_hash, record_hash)))
+                fed.append(job_id)
+            while exhausted and stops_sent < self.fetch_workers and not self.fetch_queue.full():
+                self.fetch_queue.put_nowait(STOP)
+                stops_sent += 1
+
+            self._sample_depths()
+            if time.perf_counter() - last_log >= LOG_INTERVAL_SECONDS:
+                last_log = time.perf_counter()
+                print(f"Enrichment pipeline: queue depths {self.depths()}, {self.written} written")
+
+            try:
+                item = self.write_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is STOP:
+                break
+
+            # Rows whose fetch or parse failed are marked failed; rows the
+            # open circuit kept from being fetched stay as they are and keep
+            # the checkpoint from moving past them
+            job_id, result = item
+            if result is None:
+                failed.append(job_id)
+            elif result is DEFERRED:
+                pass
+            elif result['status'] != 'changed':
+                unchanged.append((job_id, result['page_hash'], result['status']))
+            elif result['data']['JobDescription'] == MISSING:
+                failed.append(job_id)
+            else:
+                details.append((job_id, result['data'], result['page_hash'], result['record_hash']))
+            if result is not DEFERRED:
+                completed.add(job_id)
+            results += 1
+
+            if results >= enrichment_queue.batch_size:
+                self._write(conn, enrichment_queue, details, unchanged, failed, fed, completed)
+                details, unchanged, failed, results = [], [], [], 0
+
+        self._write(conn, enrichment_queue, details, unchanged, failed, fed, completed)
+        # A run stopped by an open circuit resumes from its checkpoint
+        if not self.halted.is_set():
+            enrichment_queue.finish()
+        conn.commit()
+        self.wall_seconds = time.perf_counter() - started
+
+    def _write(self, conn, enrichment_queue, details, unchanged, failed, fed, completed):
+        started = time.perf_counter()
+        enrichment_queue.save_details(details)
+        enrichment_queue.mark_unchanged(unchanged)
+        enrichment_queue.mark_failed(failed)
+
+        # Advance the checkpoint over the contiguous prefix of finished rows
+        last_id = None
+        while fed and fed[0] in completed:
+            last_id = fed.popleft()
+            completed.discard(last_id)
+        if last_id is not None:
+            enrichment_queue.checkpoint(last_id)
+
+        conn.commit()
+        self.written += len(details) + len(unchanged) + len(failed)
+        self.write_seconds += time.perf_counter() - started
+        if self.progress is not None:
+            self.progress(dict(enrichment_queue.stats, written=self.written))
+
+    def _sample_depths(self):
+        for name, depth in self.depths().items():
+            self.max_depths[name] = max(self.max_depths[name], depth)
+
+    # Per-stage throughput and the deepest each queue got; the stage in front
+    # of a queue that stays full is the bottleneck
+    def report(self):
+        stats = {'wall_seconds': self.wall_seconds, 'max_queue_depths': dict(self.max_depths), 'stages': {},
+                 'halted': self.halted.is_set()}
+        for stage in (self.fetch_stage, self.parse_stage):
+            stats['stages'][stage.name] = {
+                'workers': stage.workers,
+                'processed': stage.processed,
+                'errors': stage.errors,
+                'busy_seconds': stage.busy_seconds,
+                'per_second': stage.processed / self.wall_seconds if self.wall_seconds else 0.0,
+            }
+        stats['stages']['write'] = {
+            'workers': 1,
+            'processed': self.written,
+            'errors': 0,
+            'busy_seconds': self.write_seconds,
+            'per_second': self.written / self.wall_seconds if self.wall_seconds else 0.0,
+        }
+
+        for name, stage in stats['stages'].items():
+            print(f"Stage {name}: {stage['processed']} items, {stage['per_second']:.2f}/s, "
+                  f"{stage['busy_seconds']:.1f}s busy across {stage['workers']} worker(s), {stage['errors']} errors")
+        print(f"Max queue depths: {self.max_depths}")
+        if self.halted.is_set():
+            print("Stopped early: the circuit of the fetched host was open")
+        return stats
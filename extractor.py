@@ -0,0 +1,268 @@
+import os
+import re
+import time
+from bs4 import BeautifulSoup, Tag
+from lxml import etree
+from metrics import JOBS_EXTRACTED, STAGE_SECONDS
+from job_fields import is_remote, parse_posted_at, salary_fields
+
+PARSER = "lxml"
+MISSING = "N/A"
+JOB_SOURCE = "LinkedIn"
+
+SECTION_CLASS = "two-pane-serp-page__results-list"
+CARD_CLASS = "job-search-card"
+JOB_URN_PREFIX = "urn:li:jobPosting:"
+
+WHITESPACE = re.compile(r'\s+')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+# (field, tag, class token, attribute) for every value read from a search
+# result card. Fields listed twice take the first selector that matches.
+CARD_SELECTORS = [
+    ("JobTitle", "h3", "base-search-card__title", None),
+    ("JobLink", "a", "base-card__full-link", "href"),
+    ("JobDescription", "div", "show-more-less-html__markup", None),
+    ("CompanyName", "a", "hidden-nested-link", None),
+    ("CompanyLink", "a", "hidden-nested-link", "href"),
+    ("JobType", "li", "job-details-jobs-unified-top-card__job-insight--highlight", None),
+    ("JobLocation", "span", "job-search-card__location", None),
+    ("Salary", "div", "compensation__salary", None),
+    ("JobPostedDate", "time", "job-search-card__listdate--new", None),
+    ("JobPostedDate", "time", "job-search-card__listdate", None),
+    ("JobPostedOn", "time", "job-search-card__listdate--new", "datetime"),
+    ("JobPostedOn", "time", "job-search-card__listdate", "datetime"),
+]
+
+# Same for a job detail page. The two detail scrapers historically read
+# job_type from different nodes, so both are accepted.
+DETAIL_SELECTORS = [
+    ("JobDescription", "div", "description__text", None),
+    ("JobType", "span", "description__job-criteria-text--criteria", None),
+    ("JobType", "span", "job-details-jobs-unified-top-card__job-insight-view-model-secondary", None),
+    ("Salary", "div", "compensation__salary", None),
+]
+
+# Part of the stored page fingerprints; bump it whenever selectors or the
+# parsed fields change so detail pages seen before are extracted again.
+# Fingerprints stored before it existed count as version 1.
+EXTRACTOR_VERSION = 3
+
+# Fields whose text is collapsed to single spaces
+NORMALISED_FIELDS = {"JobDescription"}
+
+
+# Selectors compiled into a (tag, class token) lookup table so a subtree can
+# be matched against all of them in a single walk
+class CompiledSelectors:
+    def __init__(self, selectors):
+        self.fields = []
+        self.lookup = {}
+        for priority, (field, tag, class_name, attribute) in enumerate(selectors):
+            if field not in self.fields:
+                self.fields.append(field)
+            self.lookup.setdefault((tag, class_name), []).append((field, attribute, priority))
+
+    def _match(self, found, tag, classes, element):
+        for class_name in classes:
+            for field, attribute, priority in self.lookup.get((tag, class_name), ()):
+                if field in found and found[field][0] <= priority:
+                    continue
+                found[field] = (priority, element, attribute)
+
+    def _values(self, found, get_text):
+        data = {}
+        for field in self.fields:
+            if field not in found:
+                data[field] = MISSING
+                continue
+            _, element, attribute = found[field]
+            if attribute is not None:
+                value = (element.get(attribute) or MISSING).strip()
+            else:
+                value = get_text(element).strip()
+            if field in NORMALISED_FIELDS:
+                value = WHITESPACE.sub(' ', value).strip()
+            data[field] = value
+        return data
+
+    # Extract from a BeautifulSoup tag
+    def extract(self, root):
+        found = {}
+        for element in root.descendants:
+            if not isinstance(element, Tag):
+                continue
+            classes = element.get("class")
+            if classes:
+                self._match(found, element.name, classes, element)
+        return self._values(found, lambda element: element.get_text())
+
+    # Extract from an lxml element, as produced by the streaming parser
+    def extract_element(self, root):
+        found = {}
+        for element in root.iter():
+            if not isinstance(element.tag, str):
+                continue
+            classes = element.get("class")
+            if classes:
+                self._match(found, element.tag, classes.split(), element)
+        return self._values(found, lambda element: "".join(element.itertext()))
+
+
+CARD_EXTRACTOR = CompiledSelectors(CARD_SELECTORS)
+DETAIL_EXTRACTOR = CompiledSelectors(DETAIL_SELECTORS)
+
+
+def parse_html(html):
+    with STAGE_SECONDS.time(stage='parse_html'):
+        return BeautifulSoup(html, PARSER)
+
+
+def find_results_section(soup):
+    return soup.find("section", class_=SECTION_CLASS)
+
+
+def find_job_cards(section):
+    return section.find_all("div", class_=CARD_CLASS)
+
+
+# The typed fields (PostedAt, Salary*, Remote) are parsed from the text ones
+def _job_record(data):
+    JOBS_EXTRACTED.inc()
+    record = {
+        "JobTitle": data["JobTitle"],
+        "JobLink": data["JobLink"],
+        "CompanyName": data["CompanyName"],
+        "CompanyLink": data["CompanyLink"],
+        "JobSource": JOB_SOURCE,
+        "JobLocation": data["JobLocation"],
+        "Salary": data["Salary"],
+        "JobType": data["JobType"],
+        "JobDescription": data["JobDescription"],
+        "JobPostedDate": data["JobPostedDate"],
+        "PostedAt": parse_posted_at(data["JobPostedDate"], data["JobPostedOn"]),
+        "Remote": is_remote(data["JobLocation"], data["JobTitle"]),
+    }
+    record.update(salary_fields(data["Salary"]))
+    return record
+
+
+# Function to read the job ID a card carries in data-entity-urn, or None.
+# Works on BeautifulSoup tags and lxml elements alike.
+def card_job_id(card):
+    urn = card.get("data-entity-urn") or ""
+    job_id = urn[len(JOB_URN_PREFIX):]
+    if urn.startswith(JOB_URN_PREFIX) and job_id.isdigit():
+        return int(job_id)
+    return None
+
+
+# Function to extract the fields of one search result card
+def extract_job_data(card):
+    with STAGE_SECONDS.time(stage='extract'):
+        data = CARD_EXTRACTOR.extract(card)
+    return _job_record(data)
+
+
+# Function to extract the description, job type and salary (as text and
+# parsed) of a detail page
+def extract_additional_job_data(soup):
+    with STAGE_SECONDS.time(stage='extract'):
+        data = DETAIL_EXTRACTOR.extract(soup)
+    data.update(salary_fields(data["Salary"]))
+    return data
+
+
+def extract_detail_page(html):
+    return extract_additional_job_data(parse_html(html))
+
+
+# Function to extract every job card of a search results page, or None when
+# the results section is missing. Cards whose job ID is in seen are skipped
+# without being extracted.
+def extract_search_page(html, seen=None):
+    section = find_results_section(parse_html(html))
+    if section is None:
+        return None
+    return [extract_job_data(card) for card in find_job_cards(section)
+            if seen is None or card_job_id(card) not in seen]
+
+
+# Parses a whole search page into a tree, then yields its jobs
+class TreeCardParser:
+    def __init__(self):
+        self.section_found = False
+
+    def iter_jobs(self, html, seen=None):
+        jobs = extract_search_page(html, seen)
+        self.section_found = jobs is not None
+        yield from jobs or []
+
+
+# Parses a search page incrementally and yields each job as soon as its card
+# element closes. Handled elements are discarded, so memory is bounded by the
+# size of one card rather than the whole page.
+class StreamingCardParser:
+    def __init__(self):
+        self.section_found = False
+        self._in_section = False
+        self._card = None
+
+    def iter_jobs(self, html, seen=None):
+        parser = etree.HTMLPullParser(events=("start", "end"))
+        parse_seconds = 0.0
+        for offset in range(0, len(html), STREAM_CHUNK_SIZE):
+            started = time.perf_counter()
+            parser.feed(html[offset:offset + STREAM_CHUNK_SIZE])
+            parse_seconds += time.perf_counter() - started
+            yield from self._drain(parser, seen)
+        started = time.perf_counter()
+        parser.close()
+        STAGE_SECONDS.observe(parse_seconds + time.perf_counter() - started, stage='parse_html')
+        yield from self._drain(parser, seen)
+
+    def _drain(self, parser, seen):
+        for event, element in parser.read_events():
+            if not isinstance(element.tag, str):
+                continue
+            if event == "start":
+                self._start(element)
+                continue
+
+            if element is self._card:
+                self._card = None
+                if seen is None or card_job_id(element) not in seen:
+                    with STAGE_SECONDS.time(stage='extract'):
+                        data = CARD_EXTRACTOR.extract_element(element)
+                    yield _job_record(data)
+            elif self._card is not None:
+                continue
+            if element.tag == "section" and self._in_section and SECTION_CLASS in element.get("class", "").split():
+                self._in_section = False
+
+            # Drop the finished element and its already handled siblings
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    def _start(self, element):
+        classes = element.get("class", "").split()
+        if element.tag == "section" and SECTION_CLASS in classes:
+            self.section_found = True
+            self._in_section = True
+        elif self._in_section and self._card is None and element.tag == "div" and CARD_CLASS in classes:
+            self._card = element
+
+
+# Function returning the search page parser for EXTRACT_MODE: 'stream' yields
+# jobs while the page is still being parsed, 'tree' parses the page first
+def search_page_parser(mode=None):
+    mode = mode or os.getenv('EXTRACT_MODE', 'stream')
+    if mode == 'stream':
+        return StreamingCardParser()
+    if mode == 'tree':
+        return TreeCardParser()
+    raise ValueError(f"Unknown extract mode: {mode}")
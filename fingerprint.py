@@ -0,0 +1,31 @@
+import hashlib
+import json
+import re
+
+# Parts of a page that change on every request without changing the job:
+# scripts, styles, embedded JSON payloads, comments and tracking parameters
+VOLATILE_BLOCKS = re.compile(r'<(script|style|code)\b.*?</\1\s*>|<!--.*?-->', re.S | re.I)
+TRACKING_PARAMETERS = re.compile(r'([?&](?:refId|trackingId|trk|position|pageNum|currentJobId)=)[^"&\'\s>]*')
+WHITESPACE = re.compile(r'\s+')
+
+
+# Function to fingerprint a fetched page, ignoring its volatile parts. The
+# optional version is mixed in, so pages fingerprinted under another one
+# never match.
+def page_fingerprint(html, version=None):
+    stable = VOLATILE_BLOCKS.sub('', html)
+    stable = TRACKING_PARAMETERS.sub(r'\1', stable)
+    stable = WHITESPACE.sub(' ', stable)
+    if version is not None:
+        stable = f"v{version}\n{stable}"
+    return hashlib.sha256(stable.encode('utf-8')).hexdigest()
+
+
+# Function to fingerprint an extracted record
+def record_fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Function to fingerprint a job description, the key it is stored under
+def description_fingerprint(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -1,20 +1,33 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-import psycopg2
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-import time
-import re
 from apscheduler.schedulers.background import BackgroundScheduler
 from dotenv import load_dotenv
 import os
+from browser_pool import BrowserPool
+from crawl_scheduler import CrawlScheduler
+from crawl_pages import fetch_search_page, generate_tasks, scroll_search_page
+from deep_crawl import DeepCrawl, later_page
+from http_fetcher import PageFetcher, SEARCH_PAGE_MARKER
+from readiness import wait_report
+from extractor import search_page_parser
+from job_store import JobWriter
+from job_fields import remote_search
+from job_search import (TOTAL_MODES, count_jobs, filter_key, get_job, normalize_search, parse_fields, parse_filters,
+                        search_jobs)
+from response_cache import ResponseCache, bump_generation
+from db_pool import TimedRealDictCursor, get_pool
+from scrape_coordinator import ScrapeCoordinator
+from job_export import EXPORT_FORMATS, export_body, parse_export_options
+from metrics import instrument_app
+from seen_index import SeenIndex
+from work_queue import queue_status, seed_work_queue
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+instrument_app(app)
 
 # Database configuration
 DB_CONFIG = {
@@ -25,168 +38,280 @@ DB_CONFIG = {
     'database': os.getenv('POSTGRES_DB'),
 }
 
+# Cached /api/jobs responses, dropped whenever a scrape run commits new data
+jobs_cache = ResponseCache('jobs', DB_CONFIG)
 
-# Initialize Selenium WebDriver
-def init_webdriver():
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    return webdriver.Chrome(options=chrome_options)
 
-
-# List of keywords to search for jobs
-KEYWORDS = ['php developer', 'software engineer', 'full stack developer', 'backend developer', 'frontend developer',
-            'mern stack developer', 'react developer', 'Laravel developer', 'nodejs developer',
-            'javascript developer']  # Add more keywords
+# Initialize the Selenium browser pool shared by all URLs of a run
+def init_browser_pool(size=None):
+    return BrowserPool(size=size)
 
 
 # Function to dynamically generate URLs based on keywords
 def generate_urls():
-    base_url = "https://www.linkedin.com/jobs/search/?currentJobId=4023652314&f_TPR=r86400&f_WT=2&geoId=103644278&keywords={keyword}&origin=JOB_SEARCH_PAGE_SEARCH_BUTTON&refresh=true"
-    return [base_url.format(keyword=keyword.replace(' ', '%20')) for keyword in KEYWORDS]
+    return [task.url for task in generate_tasks()]
 
 
-# Function to scrape data and insert it into the database
-def scrape_and_insert_data():
-    urls = generate_urls()
+# Function to scrape data and insert it into the database. With
+# CRAWL_PAGINATION set, every keyword search is followed past its first
+# results page (see DeepCrawl).
+def scrape_and_insert_data(fetch_mode=None, progress=None):
+    tasks = generate_tasks()
+    deep = DeepCrawl()
 
-    # Database connection
-    conn = psycopg2.connect(**DB_CONFIG)
+    # Database connection from the pool shared with the API routes
+    db_pool = get_pool()
+    conn = db_pool.getconn()
     cursor = conn.cursor()
 
-    insert_query = """
-    INSERT INTO linkedin (job_title, job_link, company_name, company_link, job_source, job_location, salary, job_type, job_description, job_posted_date)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-
-    # Loop through each URL and scrape job data
-    for url in urls:
-        driver = init_webdriver()
-        driver.get(url)
-        driver.implicitly_wait(10)
-        driver.execute_script("window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });")
-        time.sleep(3)
-        html = driver.page_source
-        driver.quit()
-
-        soup = BeautifulSoup(html, "html.parser")
-        section = soup.find("section", class_="two-pane-serp-page__results-list")
-        if section is None:
-            print(f"Section not found for URL: {url}. The structure might have changed.")
-            continue
-
-        job_sections = section.find_all("div",
-                                        class_="base-card relative w-full hover:no-underline focus:no-underline base-card--link base-search-card base-search-card--link job-search-card")
-
-        for job_section in job_sections:
-            job_title = job_section.find("h3", class_="base-search-card__title").text.strip() if job_section.find(
-                "h3", class_="base-search-card__title") else "N/A"
-            job_link_tag = job_section.find("a", class_="base-card__full-link")
-            job_link = job_link_tag['href'].strip() if job_link_tag else "N/A"
-            job_description_raw = job_section.find("div",
-                                                   class_="show-more-less-html__markup relative overflow-hidden").text.strip() if job_section.find(
-                "div", class_="show-more-less-html__markup relative overflow-hidden") else "N/A"
-            job_description = re.sub(r'\s+', ' ', job_description_raw).strip()
-
-            company_name = job_section.find("a", class_="hidden-nested-link").text.strip() if job_section.find("a",
-                                                                                                               class_="hidden-nested-link") else "N/A"
-            company_link_tag = job_section.find("a", class_="hidden-nested-link")
-            company_link = company_link_tag['href'].strip() if company_link_tag else "N/A"
-            job_source = "LinkedIn"
-            job_type = job_section.find("li",
-                                        class_="job-details-jobs-unified-top-card__job-insight job-details-jobs-unified-top-card__job-insight--highlight").text.strip() if job_section.find(
-                "li",
-                class_="job-details-jobs-unified-top-card__job-insight job-details-jobs-unified-top-card__job-insight--highlight") else "N/A"
-            job_location = job_section.find("span",
-                                            class_="job-search-card__location").text.strip() if job_section.find(
-                "span", class_="job-search-card__location") else "N/A"
-            salary = job_section.find("div", class_="salary compensation__salary").text.strip() if job_section.find(
-                "div", class_="salary compensation__salary") else "N/A"
-            job_posted_date = job_section.find("time",
-                                               class_="job-search-card__listdate--new").text.strip() if job_section.find(
-                "time", class_="job-search-card__listdate--new") else "N/A"
-
-            data = (job_title, job_link, company_name, company_link, job_source, job_location, salary, job_type,
-                    job_description, job_posted_date)
-
-            try:
-                cursor.execute(insert_query, data)
-            except psycopg2.Error as err:
-                print(f"Error inserting data: {err}")
-                print(f"Failed data: {data}")
-
-        print(f"Scraping completed for URL: {url}")
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # One browser per worker so every concurrent fetch can hold a driver
+    max_workers = int(os.getenv('CRAWL_MAX_WORKERS', 4))
+    pool = init_browser_pool(size=max_workers)
+
+    # Jobs written by this or earlier runs are skipped before extraction,
+    # unless cached pages are being reparsed. The index exists before the
+    # fetchers so the scroll fetch can consult it.
+    fetch_mode = fetch_mode or os.getenv('FETCH_MODE', 'browser')
+    seen = SeenIndex('jobs', mode='off' if fetch_mode == 'cache' else None)
+
+    if deep.mode == 'scroll':
+        browser_fetch = lambda url: scroll_search_page(pool, deep, seen, url)
+    else:
+        browser_fetch = lambda url: fetch_search_page(pool, url)
+    fetcher = PageFetcher(browser_fetch, SEARCH_PAGE_MARKER, mode=fetch_mode, pool_size=max_workers,
+                          marker_optional=later_page)
+    scheduler = CrawlScheduler(fetcher, max_workers=max_workers)
+
+    writer = JobWriter(cursor, seen=seen)
+
+    try:
+        # Fetch the keyword searches concurrently and scrape each page as it
+        # arrives; the next page of a search is queued once its page is parsed
+        pages_total = len(tasks)
+        for pages_done, result in enumerate(scheduler.run(tasks), 1):
+            next_task = insert_search_results(writer, result, deep)
+            if next_task is not None:
+                scheduler.add(next_task)
+                pages_total += 1
+            if progress is not None:
+                progress(dict(writer.totals, pages_done=pages_done, pages_total=pages_total))
+        writer.flush()
+
+        # Cached API responses of every worker are invalidated on commit
+        bump_generation(cursor)
+        conn.commit()
+        seen.save()
+    finally:
+        fetcher.close()
+        fetcher.report()
+        pool.close()
+        pool.report()
+        wait_report()
+        scheduler.summary()
+        deep.report()
+        writer.report()
+        cursor.close()
+        db_pool.putconn(conn)
+
+    seen.report()
+
+
+# Function to scrape the job cards of one fetched search page. Returns the
+# task for the next results page when deep crawling should go on.
+def insert_search_results(writer, result, deep=None):
+    url = result.task.url
+    if result.error is not None:
+        print(f"Error fetching URL: {url}: {result.error}")
+        return None
+
+    # Jobs are queued for writing as soon as each card has been parsed
+    parser = search_page_parser()
+    known = deep.known_run(writer.seen) if deep is not None else writer.seen
+    remote = remote_search(url)
+    for data in parser.iter_jobs(result.html, seen=known):
+        # Cards of a remote-only search rarely say so themselves
+        writer.add(dict(data, Remote=True) if remote else data)
+
+    # Past its last page a search has no results section and simply ends
+    if not parser.section_found and result.task.page == 0:
+        print(f"Section not found for URL: {url}. The structure might have changed.")
+        return None
+
+    print(f"Scraping completed for URL: {url}")
+    return deep.next_task(result.task, known) if deep is not None else None
+
+
+# Scrape runs of every worker go through one queue so only one runs at a time
+scrape_coordinator = ScrapeCoordinator('search', scrape_and_insert_data)
+
+
+# Function to queue the hourly scrape; every worker fires it, but a run
+# requested within SCRAPE_SKIP_RECENT_SECONDS is reused. With WORK_QUEUE=on
+# the work is queued for the crawl workers instead of run in this process.
+def request_scheduled_scrape():
+    if os.getenv('WORK_QUEUE', 'off') == 'on':
+        seed_work_queue(generate_tasks())
+        return
+    scrape_coordinator.request(skip_recent_seconds=float(os.getenv('SCRAPE_SKIP_RECENT_SECONDS', 1800)))
 
 
 # Scheduler function to run the scraping task every hour
 def schedule_scraping_job():
     scheduler = BackgroundScheduler()
-    scheduler.add_job(scrape_and_insert_data, 'interval', hours=1)  # Schedule the job to run every hour
+    scheduler.add_job(request_scheduled_scrape, 'interval', hours=1)  # Schedule the job to run every hour
     scheduler.start()
 
 
-# API route to trigger scraping manually
+# API route to trigger scraping manually. The scrape runs in the background;
+# triggers arriving while a run is queued join that run.
 @app.route('/scrape', methods=['POST'])
 def scrape():
-    scrape_and_insert_data()
-    return jsonify({"status": "success", "message": "Data scraped and inserted successfully."})
-
-
-# API to retrieve jobs with pagination and search
+    data = request.get_json(silent=True) or {}
+    params = {'fetch_mode': data['fetch_mode']} if data.get('fetch_mode') else {}
+    job_id = scrape_coordinator.request(params)
+    return jsonify({"status": "queued", "job_id": job_id, "message": "Scrape queued."}), 202
+
+
+# API route with the status and progress of a scrape run
+@app.route('/scrape/<int:job_id>', methods=['GET'])
+def scrape_status(job_id):
+    run = scrape_coordinator.status(job_id)
+    if run is None:
+        return jsonify({"status": "error", "message": f"No scrape run {job_id}"}), 404
+    return jsonify(run)
+
+
+# API to retrieve jobs with pagination and search. Sending a "cursor" (null
+# or empty for the first page, then the returned next_cursor) pages by keyset
+# instead of page/limit. "total" is exact, estimate, cached or none; it
+# defaults to exact for page/limit requests and none for cursor requests.
+# Optional filters: location (substring), remote (true/false), posted_since
+# (ISO 8601) and salary_min/salary_max in salary_currency (default USD) per
+# salary_period (default year). "fields" picks the columns of each job; the
+# description is left out unless asked for (see /api/jobs/<id>).
 @app.route('/api/jobs', methods=['POST'])
 def get_jobs():
     data = request.get_json() or {}
-    search_query = data.get('search', '')
+    # The cache key, cursors and the query all use the normalised text
+    search_query = normalize_search(data.get('search', ''))
     page = data.get('page', 1)
     per_page = data.get('limit', 10)
+    use_cursor = 'cursor' in data
+    total_mode = data.get('total') or ('none' if use_cursor else 'exact')
 
     page = int(page)
     per_page = int(per_page)
-    offset = (page - 1) * per_page
-
-    conn = psycopg2.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
-
-    search_query = f"%{search_query}%"
-
-    query = """
-                SELECT * FROM linkedin
-                WHERE job_title LIKE %s OR job_link LIKE %s OR company_name LIKE %s OR company_link LIKE %s OR job_source LIKE %s OR job_location LIKE %s OR salary LIKE %s OR job_type LIKE %s OR job_description LIKE %s OR job_posted_date LIKE %s
-                LIMIT %s OFFSET %s
-            """
-    cursor.execute(query, (
-        search_query, search_query, search_query, search_query, search_query, search_query, search_query, search_query,
-        search_query, search_query, per_page, offset))
-
-    jobs = cursor.fetchall()
-
-    cursor.execute(
-        "SELECT COUNT(*) as total FROM linkedin WHERE job_title LIKE %s OR job_link LIKE %s OR company_name LIKE %s OR company_link LIKE %s OR job_source LIKE %s OR job_location LIKE %s OR salary LIKE %s OR job_type LIKE %s OR job_description LIKE %s OR job_posted_date LIKE %s",
-        (search_query, search_query, search_query, search_query, search_query, search_query, search_query,
-         search_query, search_query, search_query))
-    total_jobs = cursor.fetchone()['total']
-
-    response = {
-        'jobs': jobs,
-        'page': page,
-        'per_page': per_page,
-        'total_jobs': total_jobs,
-        'total_pages': (total_jobs // per_page) + (1 if total_jobs % per_page > 0 else 0)
-    }
+    offset = 0 if use_cursor else (page - 1) * per_page
+    if total_mode not in TOTAL_MODES:
+        return jsonify({"status": "error", "message": f"total must be one of {', '.join(TOTAL_MODES)}"}), 400
+    try:
+        filters = parse_filters(data)
+        columns = parse_fields(data.get('fields'))
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    # Identical requests are answered from the cache until the data changes
+    cache_key = (search_query, page, per_page, data.get('cursor') if use_cursor else None,
+                 total_mode, repr(filter_key(filters)), tuple(columns))
+    generation = jobs_cache.generation
+    cached = jobs_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(cursor_factory=TimedRealDictCursor)
+        try:
+            # Ranked full-text search over the indexed search vector
+            jobs, next_cursor = search_jobs(cursor, search_query, per_page, offset=offset,
+                                            after=data.get('cursor') if use_cursor else None, filters=filters,
+                                            columns=columns)
+        except ValueError as err:
+            cursor.close()
+            return jsonify({"status": "error", "message": str(err)}), 400
+
+        response = {
+            'jobs': jobs,
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+        }
+        if not use_cursor:
+            response['page'] = page
+
+        if total_mode != 'none':
+            total_jobs, estimated = count_jobs(cursor, search_query, total_mode, filters)
+            response['total_jobs'] = total_jobs
+            response['total_estimated'] = estimated
+            if not use_cursor:
+                response['total_pages'] = (total_jobs // per_page) + (1 if total_jobs % per_page > 0 else 0)
+
+        cursor.close()
+
+    jobs_cache.put(cache_key, response, generation)
+    return jsonify(response)
 
-    cursor.close()
-    conn.close()
 
-    return jsonify(response)
+# API route with every column of one job, description included
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job_detail(job_id):
+    cache_key = ('job', job_id)
+    generation = jobs_cache.generation
+    cached = jobs_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(cursor_factory=TimedRealDictCursor)
+        job = get_job(cursor, job_id)
+        cursor.close()
+    if job is None:
+        return jsonify({"status": "error", "message": f"No job {job_id}"}), 404
+
+    jobs_cache.put(cache_key, job, generation)
+    return jsonify(job)
+
+
+# API to export the whole table, or the rows changed since updated_since, as
+# a streamed NDJSON or CSV download. Query parameters: format (ndjson or
+# csv), columns (comma separated), updated_since (ISO 8601) and gzip=1.
+@app.route('/api/jobs/export', methods=['GET'])
+def export_jobs():
+    output_format = request.args.get('format', 'ndjson')
+    if output_format not in EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        columns, updated_since = parse_export_options(request.args.get('columns'), request.args.get('updated_since'))
+    except ValueError as err:
+        return jsonify({"status": "error", "message": str(err)}), 400
+
+    compress = request.args.get('gzip') in ('1', 'true')
+    headers = {'Content-Disposition': f'attachment; filename="jobs.{output_format}"'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(export_body(output_format, columns, updated_since, compress),
+                    mimetype=EXPORT_FORMATS[output_format], headers=headers)
+
+
+# API route with the hit rate of the /api/jobs response cache of this worker
+@app.route('/api/jobs/cache', methods=['GET'])
+def jobs_cache_stats():
+    return jsonify(jobs_cache.report())
+
+
+# API route with the depth of the work queue and the throughput of every
+# crawl worker
+@app.route('/api/work-queue', methods=['GET'])
+def work_queue_stats():
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(cursor_factory=TimedRealDictCursor)
+        status = queue_status(cursor)
+        cursor.close()
+    return jsonify(status)
+
+
+# API route with the checkout and wait statistics of this worker's database pool
+@app.route('/api/db-pool', methods=['GET'])
+def db_pool_stats():
+    return jsonify(get_pool().report())
 
 
 if __name__ == "__main__":
@@ -1,160 +1,111 @@
-from flask import Flask, jsonify
-import time
+from flask import Flask, jsonify, request
 import psycopg2
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from dotenv import load_dotenv
+from browser_pool import BrowserPool, WEBRTC_ARGUMENTS
+from http_fetcher import PageFetcher, DETAIL_PAGE_MARKER
+from readiness import wait_report
+from crawl_pages import fetch_detail_page
+from extractor import extract_detail_page
+from enrichment import EnrichmentQueue
+from enrichment_pipeline import EnrichmentPipeline
+from response_cache import bump_generation
+from db_pool import get_pool
+from metrics import instrument_app
+from scrape_coordinator import ScrapeCoordinator
 import os
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
+instrument_app(app)
 
 
-# Function to initialize the Selenium driver
-def init():
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-webrtc")
-    chrome_options.add_argument("--disable-rtc-smoothness-algorithm")
-    chrome_options.add_argument("--disable-rtc-smoothing")
-
-    return webdriver.Chrome(options=chrome_options)
-
-
-# Function to crawl a page and return its content
-def crawlPage(driver, url):
-    driver.get(url)
-    driver.implicitly_wait(10)
-    time.sleep(3)
-    return driver.page_source
-
-
-# Function to parse the HTML using BeautifulSoup
-def parseHtml(html):
-    return BeautifulSoup(html, "html.parser")
-
-
-# Function to extract additional job data
-def extractAdditionalJobData(soup):
-    job_description = (soup.find("div", class_="description__text description__text--rich")
-                       .text.strip()) if soup.find("div", class_="description__text description__text--rich") else "N/A"
-    job_type = (soup.find("span", class_="job-details-jobs-unified-top-card__job-insight-view-model-secondary")
-                .text.strip()) if soup.find("span",
-                                            class_="job-details-jobs-unified-top-card__job-insight-view-model-secondary") else "N/A"
-    salary = (soup.find("div", class_="salary compensation__salary")
-              .text.strip()) if soup.find("div", class_="salary compensation__salary") else "N/A"
-
-    return {
-        "JobDescription": job_description,
-        "JobType": job_type,
-        "Salary": salary
-    }
-
-
-# Function to update the job data in the Postgres database
-def update_job_data(cursor, data, job_id):
-    try:
-        update_query = """
-        UPDATE linkedin 
-        SET job_description = %s, job_type = %s, salary = %s
-        WHERE id = %s
-        """
-        cursor.execute(update_query, (
-            data['JobDescription'],
-            data['JobType'],
-            data['Salary'],
-            job_id
-        ))
-    except psycopg2.Error as err:
-        print(f"Error updating data: {err}")
-        print(f"Failed data: {data}")
+# Function to initialize the Selenium browser pool
+def init(size=None):
+    return BrowserPool(size=size, extra_arguments=WEBRTC_ARGUMENTS)
 
 
 # Main function that handles scraping and updating jobs
-def scrape_and_update_jobs():
-    # Database connection parameters
-    config = {
-        'user': os.getenv('POSTGRES_USER'),
-        'password': os.getenv('POSTGRES_PASSWORD'),
-        'host': os.getenv('POSTGRES_HOST'),
-        'port': os.getenv('POSTGRES_PORT'),
-        'database': os.getenv('POSTGRES_DB'),
-    }
-
-    # Initialize the web driver
-    driver = init()
-
-    # Initialize the connection and cursor variables
+def scrape_and_update_jobs(fetch_mode=None, progress=None):
+    # Connections come from the process-wide database pool
+    db_pool = get_pool()
+
+    # One browser per fetch worker of the pipeline
+    fetch_workers = int(os.getenv('ENRICH_FETCH_WORKERS', 2))
+    pool = init(size=fetch_workers)
+    fetcher = PageFetcher(lambda url: fetch_detail_page(pool, url), DETAIL_PAGE_MARKER, mode=fetch_mode,
+                          pool_size=fetch_workers)
+    pipeline = EnrichmentPipeline(fetcher, extract_detail_page, fetch_workers=fetch_workers)
+
+    # Initialize the connection, cursor and queue variables
     conn = None
     cursor = None
+    queue = None
 
     try:
-        # Connect to the database
-        conn = psycopg2.connect(**config)
+        # Check a connection out of the pool
+        conn = db_pool.getconn()
         cursor = conn.cursor()
 
-        offset = 0
-        limit = 10
-
-        while True:
-            # Fetch records with offset and limit
-            cursor.execute("SELECT id, job_link FROM linkedin LIMIT %s OFFSET %s", (limit, offset))
-            jobs = cursor.fetchall()
-
-            print('Jobs: ', offset)
-            # Break the loop if no more records are fetched
-            if not jobs:
-                break
-
-            for job in jobs:
-                job_id, job_link = job
-
-                # Crawl the job link page
-                html = crawlPage(driver, job_link)
-                soup = parseHtml(html)
-
-                # Extract additional job data
-                additional_data = extractAdditionalJobData(soup)
+        # Only rows without details, or with stale details, are queued; in
+        # cache mode every row with a cached page is parsed again
+        if fetcher.mode == 'cache':
+            queue = EnrichmentQueue(cursor, reparse=True, is_cached=fetcher.cache.contains)
+        else:
+            queue = EnrichmentQueue(cursor)
 
-                # Update the job record in the database with the new data
-                update_job_data(cursor, additional_data, job_id)
+        # Fetch, parse and write run as concurrent stages, committing per batch
+        pipeline.run(conn, queue, progress=progress)
 
-            # Commit the transaction for the current batch
-            conn.commit()
-
-            # Increment offset for the next batch
-            offset += limit
+        # Cached API responses are invalidated once the details are committed
+        bump_generation(cursor)
+        conn.commit()
 
     except psycopg2.Error as err:
         print(f"Database Error: {err}")
 
     finally:
-        # Close the cursor and connection if they were initialized
+        # Close the cursor and return the connection if they were initialized
         if cursor is not None:
             cursor.close()
         if conn is not None:
-            conn.close()
-        driver.quit()
+            db_pool.putconn(conn)
+        db_pool.report()
+        fetcher.close()
+        fetcher.report()
+        pool.close()
+        pool.report()
+        wait_report()
+        pipeline.report()
+        if queue is not None:
+            queue.report()
+
+
+# Detail runs of every worker go through one queue so only one runs at a time
+scrape_coordinator = ScrapeCoordinator('detail', scrape_and_update_jobs)
 
 
-# Flask route to trigger the scraping and updating process
+# Flask route to trigger the scraping and updating process in the background
 @app.route('/scrape-jobs', methods=['POST'])
 def scrape_jobs():
     try:
-        scrape_and_update_jobs()
-        return jsonify({'message': 'Jobs scraped and updated successfully'}), 200
+        data = request.get_json(silent=True) or {}
+        params = {'fetch_mode': data['fetch_mode']} if data.get('fetch_mode') else {}
+        job_id = scrape_coordinator.request(params)
+        return jsonify({'message': 'Job scrape queued', 'job_id': job_id}), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+# Flask route with the status and progress of a detail scrape run
+@app.route('/scrape-jobs/<int:job_id>', methods=['GET'])
+def scrape_jobs_status(job_id):
+    run = scrape_coordinator.status(job_id)
+    if run is None:
+        return jsonify({'error': f'No scrape run {job_id}'}), 404
+    return jsonify(run), 200
+
+
 if __name__ == "__main__":
     app.run(debug=True)
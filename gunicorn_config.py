@@ -1,2 +1,17 @@
-bind = "0.0.0.0:8080"
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8080)}"
 workers = 2
+
+# Requests run on threads of each worker. Gunicorn only times out a gthread
+# worker whose main loop stops, not a long request, so streamed exports of
+# the whole table are not killed after the default 30 seconds.
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+
+# Start the hourly scrape trigger in every worker; the scrape coordinator
+# makes sure only one of them actually runs it
+def post_worker_init(worker):
+    from flask_main import schedule_scraping_job
+    schedule_scraping_job()
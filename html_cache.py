@@ -0,0 +1,219 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Query parameters that only track the visit and never change the page
+TRACKING_PARAMETERS = {'refId', 'trackingId', 'trk', 'position', 'currentJobId', 'origin', 'refresh'}
+
+
+# Blobs written this recently are never removed as unreferenced, since
+# their entry may still be on its way to disk
+BLOB_GRACE_SECONDS = 600
+
+
+class CacheMiss(KeyError):
+    pass
+
+
+# Function to normalise a URL into the cache key: no fragment, no tracking
+# parameters and the remaining query parameters sorted
+def canonical_url(url):
+    parts = urlsplit(url)
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in TRACKING_PARAMETERS)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path.rstrip('/') or '/', urlencode(query), ''))
+
+
+# On-disk cache of fetched pages. Each canonical URL has a small JSON entry
+# with its fetch metadata pointing at a gzip blob named by the SHA-256 of
+# the HTML, so identical pages are stored once. Entries older than
+# HTML_CACHE_MAX_AGE_DAYS are evicted first, then the oldest entries until
+# the blobs fit in HTML_CACHE_MAX_MB. Every process sharing the directory
+# calls evict(), but the cache is only walked by one of them at a time and
+# at most every HTML_CACHE_EVICT_SECONDS.
+class HtmlCache:
+    def __init__(self, directory, max_mb=None, max_age_days=None, evict_seconds=None):
+        self.directory = directory
+        self.max_bytes = (max_mb or float(os.getenv('HTML_CACHE_MAX_MB', 1024))) * 1024 * 1024
+        self.max_age_seconds = (max_age_days or float(os.getenv('HTML_CACHE_MAX_AGE_DAYS', 30))) * 86400
+        if evict_seconds is None:
+            evict_seconds = float(os.getenv('HTML_CACHE_EVICT_SECONDS', 3600))
+        self.evict_seconds = evict_seconds
+        self.entries_dir = os.path.join(directory, 'entries')
+        self.blobs_dir = os.path.join(directory, 'blobs')
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evicted': 0}
+
+    # Function returning the cache configured by HTML_CACHE_DIR, or None
+    @classmethod
+    def from_env(cls):
+        directory = os.getenv('HTML_CACHE_DIR')
+        return cls(directory) if directory else None
+
+    def _entry_path(self, url):
+        key = hashlib.sha256(canonical_url(url).encode()).hexdigest()
+        return os.path.join(self.entries_dir, key[:2], key + '.json')
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blobs_dir, content_hash[:2], content_hash + '.html.gz')
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def get_entry(self, url):
+        try:
+            with open(self._entry_path(url), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # Function to check whether get() can serve url, without reading the page
+    def contains(self, url):
+        entry = self.get_entry(url)
+        return (entry is not None and time.time() - entry['fetched_at'] <= self.max_age_seconds
+                and os.path.exists(self._blob_path(entry['content_hash'])))
+
+    def get(self, url):
+        entry = self.get_entry(url)
+        if entry is not None and time.time() - entry['fetched_at'] <= self.max_age_seconds:
+            try:
+                with gzip.open(self._blob_path(entry['content_hash']), 'rt', encoding='utf-8') as f:
+                    html = f.read()
+                self._count('hits')
+                return html
+            except OSError:
+                pass
+        self._count('misses')
+        return None
+
+    def put(self, url, html, backend):
+        data = html.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        try:
+            # A reused blob counts as new, so eviction leaves it to its entry
+            os.utime(blob_path)
+        except FileNotFoundError:
+            self._write_atomic(blob_path, gzip.compress(data))
+
+        entry = {
+            'url': url,
+            'canonical_url': canonical_url(url),
+            'content_hash': content_hash,
+            'fetched_at': time.time(),
+            'backend': backend,
+            'size': len(data),
+            'compressed_size': os.path.getsize(blob_path),
+        }
+        self._write_atomic(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+        self._count('stores')
+        return entry
+
+    def _entries(self):
+        for root, _, files in os.walk(self.entries_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        with open(path, encoding='utf-8') as f:
+                            yield path, json.load(f)
+                    except (OSError, ValueError):
+                        continue
+
+    # Other processes may remove the same file first
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    # Function to evict unless another process is evicting or did so within
+    # evict_seconds. Returns whether this call walked the cache.
+    def evict(self):
+        stamp_path = os.path.join(self.directory, 'evicted_at')
+        with open(os.path.join(self.directory, 'evict.lock'), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                try:
+                    if time.time() - os.path.getmtime(stamp_path) < self.evict_seconds:
+                        return False
+                except FileNotFoundError:
+                    pass
+                self._evict()
+                with open(stamp_path, 'w'):
+                    pass
+                return True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _evict(self):
+        now = time.time()
+        live = []
+        for path, entry in self._entries():
+            if now - entry['fetched_at'] > self.max_age_seconds:
+                if self._remove(path):
+                    self._count('evicted')
+            else:
+                live.append((entry['fetched_at'], path, entry))
+
+        # Drop the oldest entries until the blobs they reference fit
+        live.sort(key=lambda item: item[0])
+        sizes = {}
+        for _, _, entry in live:
+            sizes[entry['content_hash']] = entry.get('compressed_size', 0)
+        total = sum(sizes.values())
+        referenced = {}
+        for _, _, entry in live:
+            referenced[entry['content_hash']] = referenced.get(entry['content_hash'], 0) + 1
+        while live and total > self.max_bytes:
+            _, path, entry = live.pop(0)
+            if self._remove(path):
+                self._count('evicted')
+            referenced[entry['content_hash']] -= 1
+            if referenced[entry['content_hash']] == 0:
+                total -= sizes[entry['content_hash']]
+
+        # Remove blobs no entry points at any more, unless just written
+        keep = {entry['content_hash'] for _, _, entry in live}
+        for root, _, files in os.walk(self.blobs_dir):
+            for name in files:
+                if not name.endswith('.html.gz') or name[:-len('.html.gz')] in keep:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    if now - os.path.getmtime(path) < BLOB_GRACE_SECONDS:
+                        continue
+                except FileNotFoundError:
+                    continue
+                self._remove(path)
+
+    def report(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_rate = self.stats['hits'] / lookups if lookups else 0.0
+        print(f"HTML cache {self.directory}: {self.stats['hits']} hits, {self.stats['misses']} misses "
+              f"({hit_rate:.0%}), {self.stats['stores']} stored, {self.stats['evicted']} evicted")
+        return dict(self.stats, hit_rate=hit_rate)
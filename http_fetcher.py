@@ -0,0 +1,175 @@
+import os
+import threading
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from html_cache import CacheMiss, HtmlCache
+from metrics import PAGES_FETCHED, STAGE_SECONDS
+from rate_controller import FetchError, Throttled, get_controller, parse_retry_after
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Markers that must be present in the static HTML for it to be usable
+SEARCH_PAGE_MARKER = "two-pane-serp-page__results-list"
+DETAIL_PAGE_MARKER = "description__text"
+
+# Served instead of the page once LinkedIn wants a login
+AUTH_WALL_MARKER = "authwall"
+
+# Status codes LinkedIn answers with when it throttles a client
+THROTTLE_STATUS_CODES = (429, 999)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+
+# Function to point a LinkedIn URL at LINKEDIN_BASE_URL, e.g. a local
+# stand-in server that serves saved pages
+def rewrite_url(url, base_url=None):
+    base_url = base_url or os.getenv('LINKEDIN_BASE_URL')
+    if not base_url:
+        return url
+    base = urlsplit(base_url)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+# Fetches pages for one run. In 'http' mode pages are fetched with a pooled
+# keep-alive session and only handed to browser_fetch when the static markup
+# lacks required_marker or the request fails; in 'browser' mode every page
+# goes through browser_fetch as before. When HTML_CACHE_DIR is set every
+# fetched page is cached, and 'cache' mode serves pages from the cache only
+# so extractors can be rerun without any network access. Live fetches are
+# paced, retried and circuit broken per host by the shared RateController;
+# throttling, auth walls and browser pages lacking required_marker raise a
+# FetchError once the retries are used up. Browser pages of URLs for which
+# marker_optional is true are returned without the marker, e.g. a search
+# page past the last one.
+class PageFetcher:
+    def __init__(self, browser_fetch, required_marker=None, mode=None, pool_size=None, timeout=None, cache=None,
+                 controller=None, marker_optional=None):
+        self.browser_fetch = browser_fetch
+        self.required_marker = required_marker
+        self.marker_optional = marker_optional
+        self.controller = controller or get_controller()
+        self.mode = mode or os.getenv('FETCH_MODE', 'browser')
+        if self.mode not in ('browser', 'http', 'cache'):
+            raise ValueError(f"Unknown fetch mode: {self.mode}")
+        self.timeout = timeout or float(os.getenv('HTTP_TIMEOUT', 15))
+        self.cache = cache or HtmlCache.from_env()
+        if self.mode == 'cache' and self.cache is None:
+            raise ValueError("Fetch mode 'cache' needs HTML_CACHE_DIR to be set")
+
+        self.session = None
+        if self.mode == 'http':
+            pool_size = pool_size or int(os.getenv('CRAWL_MAX_WORKERS', 4))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session = requests.Session()
+            self.session.headers.update(HEADERS)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.stats = {'http': 0, 'browser': 0, 'cache': 0, 'fallbacks': 0, 'bytes': 0}
+
+    def __call__(self, url):
+        if self.mode == 'cache':
+            html = self.cache.get(url)
+            if html is None:
+                raise CacheMiss(url)
+            self._count('cache', html)
+            return html
+
+        retries = None
+        if self.mode == 'http':
+            html = self.fetch_http(url)
+            if html is not None and (self.required_marker is None or self.required_marker in html):
+                return self._fetched(url, 'http', html)
+            with self._lock:
+                self.stats['fallbacks'] += 1
+            # The host already failed every HTTP retry, so the browser gets a
+            # single try instead of a second round of backoff
+            if html is None:
+                retries = 0
+
+        html = self.controller.call(rewrite_url(url), self._browser_get, retries=retries)
+        return self._fetched(url, 'browser', html)
+
+    def _browser_get(self, url):
+        try:
+            html = self.browser_fetch(url)
+        except Exception as err:
+            raise FetchError(f"Browser fetch failed: {err}") from err
+        if self.required_marker is not None and self.required_marker not in (html or ""):
+            if AUTH_WALL_MARKER in (html or ""):
+                raise Throttled(f"Auth wall instead of {url}")
+            if self.marker_optional is not None and self.marker_optional(url):
+                return html
+            raise FetchError(f"Page without {self.required_marker}: {url}")
+        return html
+
+    def _http_get(self, url):
+        try:
+            with STAGE_SECONDS.time(stage='http_get'):
+                response = self.session.get(url, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as err:
+            raise FetchError(f"HTTP request failed: {err}") from err
+        if response.status_code in THROTTLE_STATUS_CODES:
+            raise Throttled(f"HTTP {response.status_code} for {url}",
+                            parse_retry_after(response.headers.get('Retry-After')))
+        if response.status_code >= 500:
+            raise FetchError(f"HTTP {response.status_code} for {url}")
+        response.raise_for_status()
+        if self.required_marker is not None and self.required_marker not in response.text \
+                and AUTH_WALL_MARKER in response.text:
+            raise Throttled(f"Auth wall instead of {url}")
+        return response.text
+
+    def _fetched(self, url, backend, html):
+        self._count(backend, html)
+        if self.cache is not None:
+            self.cache.put(url, html, backend)
+        return html
+
+    # Throttling is raised to the caller; other failures return None so the
+    # page falls back to the browser
+    def fetch_http(self, url):
+        try:
+            return self.controller.call(rewrite_url(url), self._http_get)
+        except Throttled:
+            raise
+        except (FetchError, requests.RequestException) as err:
+            print(f"HTTP fetch failed for URL: {url}: {err}")
+            return None
+
+    def _count(self, backend, html):
+        PAGES_FETCHED.inc(backend=backend)
+        with self._lock:
+            self.stats[backend] += 1
+            self.stats['bytes'] += len(html or "")
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+        if self.cache is not None and self.mode != 'cache':
+            # A failed eviction must not keep the caller from its own cleanup
+            try:
+                self.cache.evict()
+            except OSError as err:
+                print(f"Error evicting HTML cache {self.cache.directory}: {err}")
+
+    def report(self):
+        print(f"Fetcher ({self.mode}): {self.stats['http']} pages over HTTP, {self.stats['browser']} via browser, "
+              f"{self.stats['cache']} from cache, {self.stats['fallbacks']} fallbacks")
+        stats = dict(self.stats)
+        if self.cache is not None:
+            stats['html_cache'] = self.cache.report()
+        if self.mode != 'cache':
+            stats['rate_control'] = self.controller.report()
+        return stats
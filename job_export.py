@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+from dotenv import load_dotenv
+from db_pool import get_pool
+from job_search import JOBS_FROM, RESULT_COLUMNS, select_list
+
+# Load environment variables from .env file
+load_dotenv()
+
+EXPORT_COLUMNS = RESULT_COLUMNS + ["updated_at"]
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Output is handed to the server in pieces of about this size
+CHUNK_BYTES = 64 * 1024
+
+EXPORT_QUERY = """
+SELECT {columns}{jobs_from}
+{where}
+ORDER BY linkedin.id
+"""
+
+
+# Function to check the requested columns (comma separated, all when empty)
+# and updated_since (ISO 8601). Raises ValueError for anything unknown.
+def parse_export_options(columns=None, updated_since=None):
+    selected = [column.strip() for column in columns.split(',') if column.strip()] if columns else EXPORT_COLUMNS
+    unknown = [column for column in selected if column not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+    since = None
+    if updated_since:
+        try:
+            since = datetime.fromisoformat(updated_since.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"updated_since is not an ISO 8601 timestamp: {updated_since}")
+    return selected, since
+
+
+# Function to stream the selected rows through a named (server-side)
+# cursor, so only EXPORT_CHUNK_ROWS rows are in memory at a time
+def export_rows(columns, updated_since=None):
+    query = EXPORT_QUERY.format(columns=select_list(columns), jobs_from=JOBS_FROM,
+                                where="WHERE linkedin.updated_at >= %s" if updated_since is not None else "")
+    params = (updated_since,) if updated_since is not None else ()
+
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(name='job_export')
+        cursor.itersize = int(os.getenv('EXPORT_CHUNK_ROWS', 1000))
+        try:
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps({column: _value(value) for column, value in zip(columns, row)}) + '\n'
+
+
+def _csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Function to generate the export body in output_format, optionally gzipped,
+# as chunks of about CHUNK_BYTES
+def export_body(output_format, columns, updated_since=None, compress=False):
+    lines = _ndjson_lines if output_format == 'ndjson' else _csv_lines
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    pending = []
+    size = 0
+    for line in lines(columns, export_rows(columns, updated_since)):
+        data = line.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= CHUNK_BYTES:
+            yield b''.join(pending)
+            pending, size = [], 0
+
+    if compressor is not None:
+        pending.append(compressor.flush())
+    if pending:
+        yield b''.join(pending)
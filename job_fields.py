@@ -0,0 +1,133 @@
+import re
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+
+MISSING = "N/A"
+
+RELATIVE_AGE = re.compile(r'(\d+)\+?\s*(minute|hour|day|week|month|year)s?', re.I)
+AGE_UNITS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365),
+}
+
+CURRENCY_CODES = ('USD', 'EUR', 'GBP', 'CAD', 'AUD', 'NZD', 'INR', 'CHF', 'SEK', 'NOK', 'DKK', 'PLN', 'JPY', 'SGD')
+SALARY_AMOUNT = re.compile(r'(?P<currency>[A-Z]{1,2}\$|[$€£₹]|\b(?:' + '|'.join(CURRENCY_CODES) + r')\b)?\s?'
+                           r'(?P<amount>\d[\d,]*(?:\.\d+)?)\s?(?P<suffix>[KkMm]\b)?')
+# What may stand between the two amounts of a range, e.g. "/yr - "
+RANGE_SEPARATOR = re.compile(r'\s*(?:/\s*[a-z]+\.?\s*)?(?:-|–|—|to)\s*$', re.I)
+CURRENCY_SYMBOLS = {'$': 'USD', 'US$': 'USD', 'CA$': 'CAD', 'A$': 'AUD', 'NZ$': 'NZD', '€': 'EUR', '£': 'GBP', '₹': 'INR'}
+AMOUNT_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+# Salaries without a period this large are taken to be yearly
+ANNUAL_THRESHOLD = 10000
+
+# Periods are only read from salary notation (/yr, per hour, monthly), not
+# from words like "3 years experience"
+SALARY_PERIODS = [
+    (re.compile(r'/\s*(?:hr|hour)\b|\b(?:per|an?)\s+hour\b|\bhourly\b', re.I), 'hour'),
+    (re.compile(r'/\s*(?:wk|week)\b|\b(?:per|a)\s+week\b|\bweekly\b', re.I), 'week'),
+    (re.compile(r'/\s*(?:mo|month)\b|\b(?:per|a)\s+month\b|\bmonthly\b', re.I), 'month'),
+    (re.compile(r'/\s*(?:yr|year)\b|\b(?:per|a)\s+year\b|\byearly\b|\bannum\b|\bannual(?:ly)?\b', re.I), 'year'),
+]
+
+# LinkedIn's f_WT search filter value for remote jobs
+REMOTE_WORKPLACE_TYPE = '2'
+
+
+# Function to turn a card's posted date into a UTC timestamp: the datetime
+# attribute (YYYY-MM-DD) when the card has one, else the relative text
+# ("2 days ago") counted back from now. Relative dates are truncated to the
+# day, or to the hour below a day, so rescraping the same text gives the
+# same value. None when neither can be read.
+def parse_posted_at(text, posted_on=None, now=None):
+    if posted_on and posted_on != MISSING:
+        try:
+            return datetime.strptime(posted_on.strip()[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+
+    match = RELATIVE_AGE.search(text or '')
+    if match is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    unit = match.group(2).lower()
+    posted = now - int(match.group(1)) * AGE_UNITS[unit]
+    if unit in ('minute', 'hour'):
+        return posted.replace(minute=0, second=0, microsecond=0)
+    return posted.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _amount(match):
+    amount = float(match.group('amount').replace(',', ''))
+    suffix = match.group('suffix')
+    return amount * AMOUNT_SUFFIXES[suffix.lower()] if suffix else amount
+
+
+# Function to pick the amounts of a salary out of a text: the first amount
+# with a currency, together with the amount it is a range with, or else the
+# first range of two plain amounts. Numbers that are neither (401(k),
+# "2 years experience") are not salaries.
+def _salary_matches(text):
+    matches = list(SALARY_AMOUNT.finditer(text))
+    for index, match in enumerate(matches):
+        following = matches[index + 1] if index + 1 < len(matches) else None
+        ranged = following is not None and RANGE_SEPARATOR.match(text[match.end():following.start()])
+        if match.group('currency'):
+            return [match, following] if ranged else [match]
+        if ranged:
+            return [match, following]
+    return []
+
+
+# Function to read a salary text such as "$120,000.00/yr - $150,000.00/yr"
+# or "€50K - €70K" into its minimum, maximum, currency and period (hour,
+# week, month or year). Amounts need a currency or the shape of a range;
+# a range without a currency also needs a period or a yearly sized amount.
+# Every value is None when the text has no salary.
+def parse_salary(text):
+    if not text or text == MISSING:
+        return None, None, None, None
+    matches = _salary_matches(text)
+    if not matches:
+        return None, None, None, None
+
+    amounts = [_amount(match) for match in matches]
+    currency = next((match.group('currency') for match in matches if match.group('currency')), None)
+    currency = CURRENCY_SYMBOLS.get(currency, currency)
+    period = next((name for pattern, name in SALARY_PERIODS if pattern.search(text)), None)
+    if period is None and max(amounts) >= ANNUAL_THRESHOLD:
+        period = 'year'
+    if currency is None and period is None:
+        return None, None, None, None
+    return min(amounts), max(amounts), currency, period
+
+
+# Function returning the salary fields of a record for its Salary text
+def salary_fields(text):
+    salary_min, salary_max, currency, period = parse_salary(text)
+    return {'SalaryMin': salary_min, 'SalaryMax': salary_max, 'SalaryCurrency': currency, 'SalaryPeriod': period}
+
+
+def is_remote(*texts):
+    return any('remote' in (text or '').lower() for text in texts)
+
+
+# Function telling whether a search URL only returns remote jobs
+def remote_search(url):
+    workplace_types = parse_qs(urlsplit(url or '').query).get('f_WT', [])
+    return any(REMOTE_WORKPLACE_TYPE in value.split(',') for value in workplace_types)
+
+
+# Function to normalise a company to the key it is stored under: its
+# LinkedIn company page when known, else its lower-cased name. None when
+# the card names no company.
+def company_key(name, link):
+    if link and '/company/' in link:
+        return link.split('?', 1)[0].rstrip('/').lower()
+    if name and name.strip() and name != MISSING:
+        return 'name:' + ' '.join(name.split()).lower()
+    return None
@@ -0,0 +1,318 @@
+import base64
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from job_store import COLUMNS, TYPED_COLUMNS
+from db_pool import execute_prepared
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Columns returned to API clients; search_vector and bookkeeping stay internal
+RESULT_COLUMNS = ["id"] + [column for column, _ in COLUMNS + TYPED_COLUMNS]
+
+# Columns of a list page unless the request asks for others with "fields";
+# the description is fetched per job (see get_job)
+LIST_COLUMNS = [column for column in RESULT_COLUMNS if column != "job_description"]
+
+# How result columns are selected: the company and description come from
+# their own tables, or from the legacy copy on rows not rewritten yet, and
+# salaries as plain numbers
+COLUMN_EXPRESSIONS = {
+    'company_name': "COALESCE(companies.name, linkedin.company_name)",
+    'company_link': "COALESCE(companies.link, linkedin.company_link)",
+    'job_description': "COALESCE(job_descriptions.body, linkedin.job_description)",
+    'salary_min': "linkedin.salary_min::float8",
+    'salary_max': "linkedin.salary_max::float8",
+}
+
+# Postgres drops a LEFT JOIN on a unique key when none of its columns are
+# selected, so queries without the description never touch job_descriptions
+JOBS_FROM = ("\nFROM linkedin LEFT JOIN companies ON companies.id = linkedin.company_id"
+             "\nLEFT JOIN job_descriptions ON job_descriptions.id = linkedin.description_id")
+
+
+# Function to build the select list for result columns, to be used with JOBS_FROM
+def select_list(columns):
+    return ", ".join(f"{COLUMN_EXPRESSIONS.get(column, 'linkedin.' + column)} AS {column}" for column in columns)
+
+TOKEN_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+WORD_PATTERN = re.compile(r'\w+')
+
+# Shortest fragment a trigram index can answer without scanning
+MIN_TRIGRAM_LENGTH = 3
+
+TOTAL_MODES = ('exact', 'estimate', 'cached', 'none')
+
+# Matches are ordered by rank then id, both descending, which is also the
+# keyset a cursor continues from. {columns} is the select list and {matches}
+# the FROM and WHERE clause.
+SEARCH_FROM = JOBS_FROM + ", to_tsquery('english', %(tsquery)s) AS query"
+
+# Every arm of the OR must use an index on linkedin for a BitmapOr, so the
+# matching companies are collected once (an InitPlan) and looked up by
+# company_id; an IN (SELECT ...) arm would make it a filter over a seq scan.
+SEARCH_MATCH = """(search_vector @@ query OR linkedin.job_title ILIKE %(like)s
+       OR linkedin.company_id = ANY(ARRAY(SELECT id FROM companies WHERE name ILIKE %(like)s))
+       OR linkedin.company_name ILIKE %(like)s)"""
+
+SEARCH_QUERY = """
+SELECT {columns}, ts_rank_cd(search_vector, query) AS rank{matches}
+ORDER BY rank DESC, linkedin.id DESC
+LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+SEARCH_AFTER = "(ts_rank_cd(search_vector, query), linkedin.id) < (%(after_rank)s::real, %(after_id)s)"
+
+LIST_QUERY = """
+SELECT {columns}, NULL::real AS rank{matches}
+ORDER BY linkedin.id DESC
+LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+JOB_QUERY = """
+SELECT {columns}{jobs_from}
+WHERE linkedin.id = %(id)s
+""".format(columns=select_list(RESULT_COLUMNS), jobs_from=JOBS_FROM)
+
+LIST_AFTER = "linkedin.id < %(after_id)s"
+
+# Structured filters of /api/jobs and the indexed conditions they add. A
+# salary filter matches jobs whose range overlaps the requested one, in
+# salary_currency (default USD) and salary_period (default year).
+FILTER_CONDITIONS = {
+    'location': "linkedin.job_location ILIKE %(location)s",
+    'remote': "linkedin.is_remote = %(remote)s",
+    'posted_since': "linkedin.posted_at >= %(posted_since)s",
+    'salary_currency': "linkedin.salary_currency = %(salary_currency)s",
+    'salary_period': "linkedin.salary_period = %(salary_period)s",
+    'salary_min': "linkedin.salary_max >= %(salary_min)s",
+    'salary_max': "linkedin.salary_min <= %(salary_max)s",
+}
+SALARY_PERIODS = ('hour', 'week', 'month', 'year')
+
+# Exact totals per search string, reused for JOBS_TOTAL_CACHE_SECONDS
+TOTAL_CACHE_MAX_ENTRIES = 1024
+_total_cache = {}
+_total_cache_lock = threading.Lock()
+
+
+# Function to turn a search box string into a tsquery expression, or None if
+# it has no searchable words. Words are ANDed; "quoted words" must appear as
+# a phrase, a trailing * matches a prefix (dev* -> developer), a leading -
+# excludes a word and OR between two terms matches either of them.
+def parse_search_query(text):
+    expression = []
+    operator = '&'
+    for phrase, token in TOKEN_PATTERN.findall(text or ''):
+        if token.upper() == 'OR' and expression:
+            operator = '|'
+            continue
+
+        negate = prefix = False
+        if token:
+            negate = token.startswith('-') and len(token) > 1
+            prefix = token.endswith('*')
+            phrase = token
+        words = WORD_PATTERN.findall(phrase)
+        if not words:
+            continue
+
+        # Words of one token or phrase (node.js, "full stack") follow each other
+        if prefix:
+            words[-1] += ':*'
+        term = ' <-> '.join(words)
+        if len(words) > 1:
+            term = f'({term})'
+        if negate:
+            term = f'!{term}'
+
+        if expression:
+            expression.append(operator)
+        expression.append(term)
+        operator = '&'
+
+    return ' '.join(expression) or None
+
+
+# Function to build the ILIKE pattern for the trigram indexes, which catch
+# fragments the word index cannot (larav, .net). Only plain searches get one;
+# None when the text uses query syntax or is too short. Whitespace runs are
+# collapsed as in normalize_search, so texts sharing a cache key match alike.
+def like_pattern(text):
+    fragment = normalize_search(text)
+    tokens = fragment.split()
+    if '"' in fragment or '*' in fragment or any(token == 'OR' or token.startswith('-') for token in tokens):
+        return None
+    if len(fragment) < MIN_TRIGRAM_LENGTH:
+        return None
+    fragment = fragment.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{fragment}%'
+
+
+# Function to check the structured filters of a request and convert them to
+# query parameters. Raises ValueError for values it cannot use.
+def parse_filters(data):
+    filters = {}
+    location = ' '.join(str(data.get('location') or '').split())
+    if location:
+        escaped = location.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        filters['location'] = f'%{escaped}%'
+
+    remote = data.get('remote')
+    if remote is not None and remote != '':
+        if not isinstance(remote, bool):
+            raise ValueError("remote must be true or false")
+        filters['remote'] = remote
+
+    if data.get('posted_since'):
+        try:
+            filters['posted_since'] = datetime.fromisoformat(str(data['posted_since']).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"posted_since is not an ISO 8601 timestamp: {data['posted_since']}")
+
+    for name in ('salary_min', 'salary_max'):
+        if data.get(name) is not None and data.get(name) != '':
+            try:
+                filters[name] = float(data[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a number")
+    if 'salary_min' in filters or 'salary_max' in filters:
+        filters['salary_currency'] = str(data.get('salary_currency') or 'USD').upper()
+        filters['salary_period'] = data.get('salary_period') or 'year'
+        if filters['salary_period'] not in SALARY_PERIODS:
+            raise ValueError(f"salary_period must be one of {', '.join(SALARY_PERIODS)}")
+    return filters
+
+
+# Function to read the "fields" of a request (a list or a comma separated
+# string) into result columns, in RESULT_COLUMNS order and always with id,
+# which cursors need. LIST_COLUMNS when none are given; raises ValueError
+# for unknown names.
+def parse_fields(value):
+    if not value:
+        return LIST_COLUMNS
+    names = value.split(',') if isinstance(value, str) else value
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError("fields must be a list of column names")
+    selected = {name.strip() for name in names if name.strip()}
+    unknown = sorted(selected.difference(RESULT_COLUMNS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [column for column in RESULT_COLUMNS if column in selected or column == "id"]
+
+
+# Function to key parsed filters for cursors and caches
+def filter_key(filters):
+    return sorted([name, value.isoformat() if isinstance(value, datetime) else value]
+                  for name, value in (filters or {}).items())
+
+
+# Function to pick the query and parameters for a search box string and
+# filters. Returns the query, its keyset condition, the FROM clause, the
+# WHERE conditions and the parameters.
+def _search_params(text, filters=None):
+    filters = filters or {}
+    conditions = [FILTER_CONDITIONS[name] for name in FILTER_CONDITIONS if name in filters]
+    tsquery = parse_search_query(text)
+    like = like_pattern(text)
+    if tsquery is None and like is None:
+        return LIST_QUERY, LIST_AFTER, JOBS_FROM, conditions, dict(filters)
+    return (SEARCH_QUERY, SEARCH_AFTER, SEARCH_FROM, [SEARCH_MATCH] + conditions,
+            dict(filters, tsquery=tsquery or '', like=like))
+
+
+def _matches(from_clause, conditions):
+    return from_clause + ("\nWHERE " + "\n  AND ".join(conditions) if conditions else "")
+
+
+# Function to normalise a search box string for cursors and cache keys
+def normalize_search(text):
+    return ' '.join((text or '').split())
+
+
+# Function to encode the position after a row as an opaque cursor. The search
+# string and filters are part of the cursor so it cannot be replayed against
+# another search.
+def encode_cursor(text, row, filters=None):
+    position = {'q': normalize_search(text), 'f': filter_key(filters), 'rank': row['rank'], 'id': row['id']}
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(text, cursor_value, filters=None):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor_value.encode('ascii')))
+        after_id = int(position['id'])
+        after_rank = position['rank']
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
+    if position.get('q') != normalize_search(text) or position.get('f', []) != filter_key(filters):
+        raise ValueError("Cursor belongs to a different search")
+    return after_rank, after_id
+
+
+# Function to fetch one page of jobs matching a search box string and the
+# parsed filters, best matches first, using a RealDictCursor. Pages continue
+# either from offset or, without the cost of skipping rows, from the cursor
+# of the previous page. Only columns (LIST_COLUMNS by default) are read.
+# Returns the rows and the cursor of the next page (None at the end).
+def search_jobs(cursor, text, limit, offset=0, after=None, filters=None, columns=None):
+    query, after_clause, from_clause, conditions, params = _search_params(text, filters)
+    params = dict(params, limit=limit, offset=offset)
+    if after:
+        params['after_rank'], params['after_id'] = decode_cursor(text, after, filters)
+        conditions = conditions + [after_clause]
+    query = query.format(columns=select_list(columns or LIST_COLUMNS), matches=_matches(from_clause, conditions))
+
+    execute_prepared(cursor, query, params)
+    jobs = [dict(row) for row in cursor.fetchall()]
+    next_cursor = encode_cursor(text, jobs[-1], filters) if len(jobs) == limit else None
+    for job in jobs:
+        del job['rank']
+    return jobs, next_cursor
+
+
+# Function to count the jobs matching a search box string and filters. mode
+# is 'exact', 'estimate' (planner row estimate, no scan) or 'cached' (exact,
+# reused for JOBS_TOTAL_CACHE_SECONDS). Returns the total and whether it is
+# estimated.
+def count_jobs(cursor, text, mode='exact', filters=None):
+    _, _, from_clause, conditions, params = _search_params(text, filters)
+    matches = _matches(from_clause, conditions)
+    if mode == 'estimate':
+        cursor.execute("EXPLAIN (FORMAT JSON) SELECT 1" + matches, params)
+        plan = list(cursor.fetchone().values())[0]
+        return int(plan[0]['Plan']['Plan Rows']), True
+
+    key = (normalize_search(text), json.dumps(filter_key(filters)))
+    if mode == 'cached':
+        with _total_cache_lock:
+            cached = _total_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1], False
+
+    execute_prepared(cursor, "SELECT COUNT(*) AS total" + matches, params)
+    total = cursor.fetchone()['total']
+
+    if mode == 'cached':
+        now = time.monotonic()
+        with _total_cache_lock:
+            if len(_total_cache) >= TOTAL_CACHE_MAX_ENTRIES:
+                for stale in [k for k, (expires, _) in _total_cache.items() if expires <= now]:
+                    del _total_cache[stale]
+                if len(_total_cache) >= TOTAL_CACHE_MAX_ENTRIES:
+                    _total_cache.clear()
+            _total_cache[key] = (now + float(os.getenv('JOBS_TOTAL_CACHE_SECONDS', 60)), total)
+    return total, False
+
+
+# Function to fetch every result column of one job, description included,
+# using a RealDictCursor. None when there is no such job.
+def get_job(cursor, job_id):
+    execute_prepared(cursor, JOB_QUERY, {'id': job_id})
+    row = cursor.fetchone()
+    return dict(row) if row is not None else None
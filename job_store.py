@@ -0,0 +1,227 @@
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from job_fields import MISSING, company_key
+from fingerprint import description_fingerprint
+
+# Load environment variables from .env file
+load_dotenv()
+
+JOB_ID_PATTERNS = [
+    re.compile(r'/jobs/view/(?:[^/?#]*-)?(\d+)'),
+    re.compile(r'[?&]currentJobId=(\d+)'),
+]
+
+# Record keys in the order of the linkedin table columns they are written to
+COLUMNS = [
+    ("job_title", "JobTitle"),
+    ("job_link", "JobLink"),
+    ("company_name", "CompanyName"),
+    ("company_link", "CompanyLink"),
+    ("job_source", "JobSource"),
+    ("job_location", "JobLocation"),
+    ("salary", "Salary"),
+    ("job_type", "JobType"),
+    ("job_description", "JobDescription"),
+    ("job_posted_date", "JobPostedDate"),
+]
+
+# Typed columns parsed from the text ones by the extractors
+TYPED_COLUMNS = [
+    ("posted_at", "PostedAt"),
+    ("salary_min", "SalaryMin"),
+    ("salary_max", "SalaryMax"),
+    ("salary_currency", "SalaryCurrency"),
+    ("salary_period", "SalaryPeriod"),
+    ("is_remote", "Remote"),
+]
+
+# Columns written by the upsert. The company is stored once in companies and
+# referenced by company_id, which is resolved per batch. Descriptions come
+# from the detail scrapers and live in job_descriptions (see
+# upsert_descriptions).
+WRITE_COLUMNS = ["company_id"] + [column for column, _ in COLUMNS + TYPED_COLUMNS
+                                  if column not in ("company_name", "company_link", "job_description")]
+WRITE_FIELDS = dict(COLUMNS + TYPED_COLUMNS)
+
+# Columns owned by the search card. Description, job type and salary are
+# filled in by the detail scrapers and are not overwritten on conflict. The
+# legacy company_name/company_link copies are cleared on every update.
+CARD_COLUMNS = ["job_title", "job_link", "company_id", "job_location", "job_posted_date", "posted_at", "is_remote"]
+
+UPSERT_QUERY = """
+INSERT INTO linkedin (linkedin_job_id, {columns})
+VALUES %s
+ON CONFLICT (linkedin_job_id) DO UPDATE SET {updates}
+WHERE ({current}) IS DISTINCT FROM ({excluded})
+RETURNING (xmax = 0) AS inserted
+""".format(
+    columns=", ".join(WRITE_COLUMNS),
+    updates=", ".join([f"{column} = EXCLUDED.{column}" for column in CARD_COLUMNS]
+                      + ["company_name = NULL", "company_link = NULL"]),
+    current=", ".join(f"linkedin.{column}" for column in CARD_COLUMNS),
+    excluded=", ".join(f"EXCLUDED.{column}" for column in CARD_COLUMNS),
+)
+
+
+COMPANY_INSERT_QUERY = """
+INSERT INTO companies (company_key, name, link) VALUES %s
+ON CONFLICT (company_key) DO NOTHING
+"""
+
+COMPANY_SELECT_QUERY = "SELECT company_key, id FROM companies WHERE company_key = ANY(%s)"
+
+DESCRIPTION_INSERT_QUERY = """
+INSERT INTO job_descriptions (content_hash, body) VALUES %s
+ON CONFLICT (content_hash) DO NOTHING
+"""
+
+DESCRIPTION_SELECT_QUERY = "SELECT content_hash, id FROM job_descriptions WHERE content_hash = ANY(%s)"
+
+
+# Function to get the numeric LinkedIn job ID out of a job link, or None
+def canonical_job_id(job_link):
+    if not job_link:
+        return None
+    for pattern in JOB_ID_PATTERNS:
+        match = pattern.search(job_link)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+# Function to strip tracking parameters (refId, trackingId, position, trk, ...)
+# from a job view link
+def canonical_job_link(job_link):
+    if not job_link or '/jobs/view/' not in job_link:
+        return job_link
+    parts = urlsplit(job_link)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+
+# Function to add the companies of a batch of jobs that are not stored yet.
+# Returns the company ids by company key.
+def upsert_companies(cursor, jobs):
+    companies = {}
+    for data in jobs:
+        key = company_key(data.get('CompanyName'), data.get('CompanyLink'))
+        if key is not None:
+            name = data.get('CompanyName')
+            link = data.get('CompanyLink')
+            companies[key] = (key, name if name != MISSING else None, link if link != MISSING else None)
+    if not companies:
+        return {}
+
+    execute_values(cursor, COMPANY_INSERT_QUERY, list(companies.values()), page_size=len(companies))
+    cursor.execute(COMPANY_SELECT_QUERY, (list(companies),))
+    return dict(cursor.fetchall())
+
+
+# Function to key a description by its content hash, or None when the page
+# had none
+def description_key(text):
+    if not text or text == MISSING:
+        return None
+    return description_fingerprint(text)
+
+
+# Function to add the descriptions of a batch that are not stored yet.
+# Identical texts are stored once. Returns the description ids by key.
+def upsert_descriptions(cursor, texts):
+    descriptions = {}
+    for text in texts:
+        key = description_key(text)
+        if key is not None:
+            descriptions[key] = (key, text)
+    if not descriptions:
+        return {}
+
+    execute_values(cursor, DESCRIPTION_INSERT_QUERY, list(descriptions.values()), page_size=len(descriptions))
+    cursor.execute(DESCRIPTION_SELECT_QUERY, (list(descriptions),))
+    return dict(cursor.fetchall())
+
+
+# Function to upsert one batch of extracted jobs in a single round trip.
+# Jobs without a LinkedIn job ID have nothing to upsert on and are
+# rejected. Returns the number of rows inserted, updated, left unchanged
+# and rejected.
+def upsert_jobs(cursor, jobs):
+    # The same job may appear twice in a batch; keep the last occurrence
+    records = {}
+    rejected = 0
+    for data in jobs:
+        job_id = canonical_job_id(data.get('JobLink'))
+        if job_id is None:
+            rejected += 1
+            continue
+        records[job_id] = (job_id, dict(data, JobLink=canonical_job_link(data.get('JobLink'))))
+    if not records:
+        return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': rejected}
+
+    company_ids = upsert_companies(cursor, [data for _, data in records.values()])
+    rows = []
+    for job_id, data in records.values():
+        company_id = company_ids.get(company_key(data.get('CompanyName'), data.get('CompanyLink')))
+        rows.append((job_id, company_id) + tuple(data.get(WRITE_FIELDS[column]) for column in WRITE_COLUMNS[1:]))
+
+    results = execute_values(cursor, UPSERT_QUERY, rows, page_size=len(rows), fetch=True)
+    inserted = sum(1 for (was_inserted,) in results if was_inserted)
+    updated = len(results) - inserted
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': len(rows) - inserted - updated,
+        'rejected': rejected,
+    }
+
+
+# Buffers extracted jobs and upserts them in batches of UPSERT_BATCH_SIZE.
+# Each batch runs under a savepoint so one bad batch does not abort the run.
+# Jobs of a written batch are added to the optional seen index.
+class JobWriter:
+    def __init__(self, cursor, batch_size=None, seen=None):
+        self.cursor = cursor
+        self.batch_size = batch_size or int(os.getenv('UPSERT_BATCH_SIZE', 100))
+        self.seen = seen
+        self.pending = []
+        self.totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0, 'failed': 0}
+
+    def add(self, data):
+        if self.seen is not None and canonical_job_id(data.get('JobLink')) in self.seen:
+            return
+        self.pending.append(data)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return None
+        batch, self.pending = self.pending, []
+
+        self.cursor.execute("SAVEPOINT upsert_batch")
+        try:
+            counts = upsert_jobs(self.cursor, batch)
+        except psycopg2.Error as err:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT upsert_batch")
+            print(f"Error upserting batch of {len(batch)} jobs: {err}")
+            self.totals['failed'] += len(batch)
+            return None
+        self.cursor.execute("RELEASE SAVEPOINT upsert_batch")
+        if self.seen is not None:
+            for data in batch:
+                self.seen.add(canonical_job_id(data.get('JobLink')))
+
+        for key, value in counts.items():
+            self.totals[key] += value
+        print(f"Upserted batch of {len(batch)} jobs: {counts['inserted']} inserted, "
+              f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['rejected']} without job ID")
+        return counts
+
+    def report(self):
+        print(f"Jobs written: {self.totals['inserted']} inserted, {self.totals['updated']} updated, "
+              f"{self.totals['unchanged']} unchanged, {self.totals['rejected']} without job ID, "
+              f"{self.totals['failed']} failed")
+        return dict(self.totals)
@@ -1,9 +1,19 @@
-import time
 import psycopg2
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from dotenv import load_dotenv
+from browser_pool import BrowserPool
+from crawl_scheduler import CrawlTask
+from deep_crawl import DeepCrawl, later_page
+from http_fetcher import PageFetcher, SEARCH_PAGE_MARKER
+from readiness import wait_for_search_results, wait_report
+from extractor import search_page_parser
+from job_store import JobWriter
+from job_fields import remote_search
+from seen_index import SeenIndex
+from html_cache import CacheMiss
+from rate_controller import FetchError
+from response_cache import bump_generation
+from db_pool import get_pool
+from metrics import STAGE_SECONDS, write_timing_report
 import os
 
 # Load environment variables from .env file
@@ -11,165 +21,117 @@ load_dotenv()
 
 
 def init():
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-
-    return webdriver.Chrome(options=chrome_options)
-
-
-def crawlPage(driver):
-    url = "https://www.linkedin.com/jobs/search?keywords=&location=United%20States&geoId=103644278&f_TPR=&f_WT=2&position=1&pageNum=0"
-    driver.get(url)
-    driver.implicitly_wait(10)
-    driver.execute_script("window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });")
-    time.sleep(3)
+    return BrowserPool()
+
+
+SEARCH_URL = "https://www.linkedin.com/jobs/search?keywords=&location=United%20States&geoId=103644278&f_TPR=&f_WT=2&position=1&pageNum=0"
+
+
+def crawlPage(driver, url=SEARCH_URL):
+    with STAGE_SECONDS.time(stage='driver_get'):
+        driver.get(url)
+    wait_for_search_results(driver)
     return driver.page_source
 
 
-def parseHtml(html):
-    return BeautifulSoup(html, "html.parser")
-
-
-def findSections(soup):
-    section = soup.find("section", class_="two-pane-serp-page__results-list")
-    if section is None:
-        print("Section not found. The structure might have changed.")
-    return section
-
-
-def findjobs(p_section):
-    return p_section.find_all("div",
-                              class_="base-card relative w-full hover:no-underline focus:no-underline base-card--link base-search-card base-search-card--link job-search-card")
-
-
-def extractJobData(job_sections):
-    job_title = (job_sections.find("h3", class_="base-search-card__title")
-                 .text.strip()) if job_sections.find("h3", class_="base-search-card__title") else "N/A"
-    job_link_tag = job_sections.find("a",
-                                     class_="base-card__full-link absolute top-0 right-0 bottom-0 left-0 p-0 z-[2]")
-    job_link = job_link_tag['href'].strip() if job_link_tag else "N/A"
-
-    job_description = (job_sections.find("div", class_="show-more-less-html__markup relative overflow-hidden")
-                       .text.strip()) if job_sections.find("div",
-                                                           class_="show-more-less-html__markup relative overflow-hidden") else "N/A"
-    company_name = (job_sections.find("a", class_="hidden-nested-link")
-                    .text.strip()) if job_sections.find("a", class_="hidden-nested-link") else "N/A"
-    company_link_tag = job_sections.find("a", class_="hidden-nested-link")
-    company_link = company_link_tag['href'].strip() if company_link_tag else "N/A"
-
-    job_source = "LinkedIn"
-    job_type = (job_sections.find("li",
-                                  class_="job-details-jobs-unified-top-card__job-insight job-details-jobs-unified-top-card__job-insight--highlight")
-                .text.strip()) if job_sections.find("li",
-                                                    class_="job-details-jobs-unified-top-card__job-insight job-details-jobs-unified-top-card__job-insight--highlight") else "N/A"
-    job_location = (job_sections.find("span", class_="job-search-card__location")
-                    .text.strip()) if job_sections.find("span", class_="job-search-card__location") else "N/A"
-    salary = (job_sections.find("div", class_="salary compensation__salary")
-              .text.strip()) if job_sections.find("div", class_="salary compensation__salary") else "N/A"
-    job_posted_date = (job_sections.find("time", class_="job-search-card__listdate--new")
-                       .text.strip()) if job_sections.find("time", class_="job-search-card__listdate--new") else "N/A"
-
-    return {
-        "JobTitle": job_title,
-        "JobLink": job_link,
-        "CompanyName": company_name,
-        "CompanyLink": company_link,
-        "JobSource": job_source,
-        "JobLocation": job_location,
-        "Salary": salary,
-        "JobType": job_type,
-        "JobDescription": job_description,
-        "JobPostedDate": job_posted_date
-    }
-
-
-def insert_job_data(cursor, data):
-    try:
-        check_query = """
-        SELECT 1 FROM linkedin WHERE job_title = %s LIMIT 1
-        """
-        cursor.execute(check_query, (data['JobTitle'],))
-        result = cursor.fetchone()
-
-        # If result is None, the job does not exist, proceed to insert it
-        if result is None:
-            insert_query = """
-            INSERT INTO linkedin (job_title, job_link, company_name, company_link, job_source, job_location, salary, job_type, job_description, job_posted_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            cursor.execute(insert_query, (
-                data['JobTitle'],
-                data['JobLink'],
-                data['CompanyName'],
-                data['CompanyLink'],
-                data['JobSource'],
-                data['JobLocation'],
-                data['Salary'],
-                data['JobType'],
-                data['JobDescription'],
-                data['JobPostedDate']
-            ))
-        else:
-            print(f"Job with title '{data['JobTitle']}' already exists in the database.")
+def crawlPooledPage(pool, url=SEARCH_URL):
+    with pool.lease() as driver:
+        return crawlPage(driver, url)
 
-    except psycopg2.Error as err:
-        print(f"Error inserting data: {err}")
-        print(f"Failed data: {data}")
 
+def scrollPooledPage(pool, deep, seen, url=SEARCH_URL):
+    with pool.lease() as driver:
+        return deep.scroll_page(driver, url, seen)
 
-def main():
-    # Database connection parameters
-    config = {
-        'user': os.getenv('POSTGRES_USER'),
-        'password': os.getenv('POSTGRES_PASSWORD'),
-        'host': os.getenv('POSTGRES_HOST'),
-        'port': os.getenv('POSTGRES_PORT'),
-        'database': os.getenv('POSTGRES_DB'),
-    }
 
-    # Initialize the web driver
-    driver = init()
+# Writes a JSON timing report of the run to timing_report, or TIMING_REPORT.
+# With CRAWL_PAGINATION set the search is followed past its first results
+# page (see DeepCrawl).
+def main(fetch_mode=None, timing_report=None):
+    # Connections come from the process-wide database pool
+    db_pool = get_pool()
+    deep = DeepCrawl()
+
+    # Initialize the browser pool
+    pool = init()
+
+    # Jobs written by earlier runs are skipped before extraction; the index
+    # exists before the fetchers so the scroll fetch can consult it
+    fetch_mode = fetch_mode or os.getenv('FETCH_MODE', 'browser')
+    seen = SeenIndex('jobs', mode='off' if fetch_mode == 'cache' else None)
+
+    if deep.mode == 'scroll':
+        browser_fetch = lambda url: scrollPooledPage(pool, deep, seen, url)
+    else:
+        browser_fetch = lambda url: crawlPooledPage(pool, url)
+    fetcher = PageFetcher(browser_fetch, SEARCH_PAGE_MARKER, mode=fetch_mode, marker_optional=later_page)
 
     # Initialize the connection and cursor variables
     conn = None
     cursor = None
 
     try:
-        html = crawlPage(driver)
-        soup = parseHtml(html)
-        # print(soup.prettify())
-        p_section = findSections(soup)
-        print("Total Containers: " + str(len(p_section)))
-        job_sections = findjobs(p_section)
-        # print(job_sections)
-
-        # Connect to the database
-        conn = psycopg2.connect(**config)
+        # Check a connection out of the pool
+        conn = db_pool.getconn()
         cursor = conn.cursor()
-
-        for job_section in job_sections:
-            data = extractJobData(job_section)
-            insert_job_data(cursor, data)
-
-        # Commit the transaction
+        writer = JobWriter(cursor, seen=seen)
+        total_jobs = 0
+
+        # Jobs are queued for writing as soon as each card has been parsed,
+        # page by page until the crawl of the search stops
+        task = CrawlTask('search', SEARCH_URL)
+        while task is not None:
+            try:
+                html = fetcher(task.url)
+            except FetchError as err:
+                # Jobs of the pages read so far are still written
+                print(f"Error fetching URL: {task.url}: {err}")
+                break
+            except CacheMiss as err:
+                print(f"Page not in the HTML cache: {err}")
+                break
+            parser = search_page_parser()
+            known = deep.known_run(seen)
+            for data in parser.iter_jobs(html, seen=known):
+                # Cards of a remote-only search rarely say so themselves
+                writer.add(dict(data, Remote=True) if remote_search(task.url) else data)
+                total_jobs += 1
+
+            # Past its last page a search has no results section and simply ends
+            if not parser.section_found and task.page == 0:
+                print(f"Section not found for URL: {task.url}. The structure might have changed.")
+                break
+            task = deep.next_task(task, known)
+        writer.flush()
+
+        print("Total Jobs: " + str(total_jobs))
+        writer.report()
+
+        # Commit the transaction, invalidating cached API responses
+        bump_generation(cursor)
         conn.commit()
+        seen.save()
+        seen.report()
 
     except psycopg2.Error as err:
         print(f"Database Error: {err}")
 
     finally:
-        # Close the cursor and connection if they were initialized
+        # Close the cursor and return the connection if they were initialized
         if cursor is not None:
             cursor.close()
         if conn is not None:
-            conn.close()
-        driver.quit()
+            db_pool.putconn(conn)
+        db_pool.report()
+        fetcher.close()
+        fetcher.report()
+        pool.close()
+        pool.report()
+        wait_report()
+        deep.report()
+        timing_report = timing_report or os.getenv('TIMING_REPORT')
+        if timing_report:
+            write_timing_report(timing_report)
 
 
 if __name__ == "__main__":
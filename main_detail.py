@@ -1,142 +1,82 @@
-import time
 import psycopg2
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from dotenv import load_dotenv
+from browser_pool import BrowserPool, WEBRTC_ARGUMENTS
+from http_fetcher import PageFetcher, DETAIL_PAGE_MARKER
+from readiness import wait_report
+from crawl_pages import fetch_detail_page
+from extractor import extract_detail_page
+from enrichment import EnrichmentQueue
+from enrichment_pipeline import EnrichmentPipeline
+from response_cache import bump_generation
+from db_pool import get_pool
+from metrics import write_timing_report
 import os
 
 # Load environment variables from .env file
 load_dotenv()
 
 
-def init():
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36")
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
+def init(size=None):
+    return BrowserPool(size=size, extra_arguments=WEBRTC_ARGUMENTS)
 
-    # Add these lines to disable WebRTC
-    chrome_options.add_argument("--disable-webrtc")
-    chrome_options.add_argument("--disable-rtc-smoothness-algorithm")
-    chrome_options.add_argument("--disable-rtc-smoothing")
 
-    return webdriver.Chrome(options=chrome_options)
+# Writes a JSON timing report of the run to timing_report, or TIMING_REPORT
+def main(fetch_mode=None, timing_report=None):
+    # Connections come from the process-wide database pool
+    db_pool = get_pool()
 
+    # One browser per fetch worker of the pipeline
+    fetch_workers = int(os.getenv('ENRICH_FETCH_WORKERS', 2))
+    pool = init(size=fetch_workers)
+    fetcher = PageFetcher(lambda url: fetch_detail_page(pool, url), DETAIL_PAGE_MARKER, mode=fetch_mode,
+                          pool_size=fetch_workers)
+    pipeline = EnrichmentPipeline(fetcher, extract_detail_page, fetch_workers=fetch_workers)
 
-def crawlPage(driver, url):
-    driver.get(url)
-    driver.implicitly_wait(10)
-    time.sleep(3)
-    return driver.page_source
-
-
-def parseHtml(html):
-    return BeautifulSoup(html, "html.parser")
-
-
-def extractAdditionalJobData(soup):
-    job_description = (soup.find("div", class_="description__text description__text--rich")
-                       .text.strip()) if soup.find("div", class_="description__text description__text--rich") else "N/A"
-    job_type = (soup.find("span", class_="description__job-criteria-text description__job-criteria-text--criteria")
-                .text.strip()) if soup.find("span",
-                                            class_="description__job-criteria-text description__job-criteria-text--criteria") else "N/A"
-    salary = (soup.find("div", class_="salary compensation__salary")
-              .text.strip()) if soup.find("div", class_="salary compensation__salary") else "N/A"
-
-    return {
-        "JobDescription": job_description,
-        "JobType": job_type,
-        "Salary": salary
-    }
-
-
-def update_job_data(cursor, data, job_id):
-    try:
-        update_query = """
-        UPDATE linkedin 
-        SET job_description = %s, job_type = %s, salary = %s
-        WHERE id = %s
-        """
-        cursor.execute(update_query, (
-            data['JobDescription'],
-            data['JobType'],
-            data['Salary'],
-            job_id
-        ))
-    except psycopg2.Error as err:
-        print(f"Error updating data: {err}")
-        print(f"Failed data: {data}")
-
-
-def main():
-    # Database connection parameters
-    config = {
-        'user': os.getenv('POSTGRES_USER'),
-        'password': os.getenv('POSTGRES_PASSWORD'),
-        'host': os.getenv('POSTGRES_HOST'),
-        'port': os.getenv('POSTGRES_PORT'),
-        'database': os.getenv('POSTGRES_DB'),
-    }
-
-    # Initialize the web driver
-    driver = init()
-
-    # Initialize the connection and cursor variables
+    # Initialize the connection, cursor and queue variables
     conn = None
     cursor = None
+    queue = None
 
     try:
-        # Connect to the database
-        conn = psycopg2.connect(**config)
+        # Check a connection out of the pool
+        conn = db_pool.getconn()
         cursor = conn.cursor()
 
-        offset = 0
-        limit = 10
-
-        while True:
-            # Fetch records with offset and limit
-            cursor.execute("SELECT id, job_link FROM linkedin LIMIT %s OFFSET %s", (limit, offset))
-            jobs = cursor.fetchall()
-
-            print('Jobs: ', offset)
-            # Break the loop if no more records are fetched
-            if not jobs:
-                break
-
-            for job in jobs:
-                job_id, job_link = job
-
-                # Crawl the job link page
-                html = crawlPage(driver, job_link)
-                soup = parseHtml(html)
-
-                # Extract additional job data
-                additional_data = extractAdditionalJobData(soup)
-
-                # Update the job record in the database with the new data
-                update_job_data(cursor, additional_data, job_id)
+        # Only rows without details, or with stale details, are queued; in
+        # cache mode every row with a cached page is parsed again
+        if fetcher.mode == 'cache':
+            queue = EnrichmentQueue(cursor, reparse=True, is_cached=fetcher.cache.contains)
+        else:
+            queue = EnrichmentQueue(cursor)
 
-            # Commit the transaction for the current batch
-            conn.commit()
+        # Fetch, parse and write run as concurrent stages, committing per batch
+        pipeline.run(conn, queue)
 
-            # Increment offset for the next batch
-            offset += limit
+        # Cached API responses are invalidated once the details are committed
+        bump_generation(cursor)
+        conn.commit()
 
     except psycopg2.Error as err:
         print(f"Database Error: {err}")
 
     finally:
-        # Close the cursor and connection if they were initialized
+        # Close the cursor and return the connection if they were initialized
         if cursor is not None:
             cursor.close()
         if conn is not None:
-            conn.close()
-        driver.quit()
+            db_pool.putconn(conn)
+        db_pool.report()
+        fetcher.close()
+        fetcher.report()
+        pool.close()
+        pool.report()
+        wait_report()
+        pipeline.report()
+        if queue is not None:
+            queue.report()
+        timing_report = timing_report or os.getenv('TIMING_REPORT')
+        if timing_report:
+            write_timing_report(timing_report)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from fast DB statements to slow page loads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(labelnames, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in sorted(values.items())]
+
+    def snapshot(self):
+        with self._lock:
+            return {','.join(key) or 'total': value for key, value in sorted(self._values.items())}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                                              'max': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['buckets'][index] += 1
+            series['count'] += 1
+            series['sum'] += seconds
+            series['max'] = max(series['max'], seconds)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            series = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._series.items()}
+        lines = []
+        for key, value in sorted(series.items()):
+            for bound, count in zip(self.buckets, value['buckets']):
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', '+Inf')])} {value['count']}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {value['sum']}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {value['count']}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                ','.join(key) or 'total': {
+                    'count': value['count'],
+                    'total_seconds': value['sum'],
+                    'avg_seconds': value['sum'] / value['count'] if value['count'] else 0.0,
+                    'max_seconds': value['max'],
+                }
+                for key, value in sorted(self._series.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+# All metrics of this process. Each gunicorn worker keeps its own, so
+# /metrics answers for the worker that served the scrape.
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'scraper_stage_seconds', 'Time spent in each scraping stage',
+    ['stage']))
+DB_STATEMENT_SECONDS = REGISTRY.register(Histogram(
+    'db_statement_seconds', 'Time spent executing database statements, by statement type',
+    ['statement']))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'http_request_seconds', 'Time spent handling API requests',
+    ['method', 'endpoint', 'status']))
+PAGES_FETCHED = REGISTRY.register(Counter(
+    'scraper_pages_fetched_total', 'Pages fetched, by backend',
+    ['backend']))
+JOBS_EXTRACTED = REGISTRY.register(Counter(
+    'scraper_jobs_extracted_total', 'Job records extracted from search result cards'))
+FETCH_ATTEMPTS = REGISTRY.register(Counter(
+    'scraper_fetch_attempts_total', 'Paced fetch attempts, by host and outcome',
+    ['host', 'outcome']))
+WORK_ITEMS = REGISTRY.register(Counter(
+    'scraper_work_items_total', 'Work queue items handled by this worker, by kind and outcome',
+    ['kind', 'outcome']))
+
+
+# Function to time API requests of a Flask app and serve GET /metrics in
+# the Prometheus text format
+def instrument_app(app):
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = getattr(g, 'request_started', None)
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, endpoint=endpoint,
+                                         status=str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Function to write the timings of a CLI run as JSON to path
+def write_timing_report(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(REGISTRY.snapshot(), f, indent=2, sort_keys=True)
+    print(f"Timing report written to {path}")
@@ -33,6 +33,249 @@ def apply_migration():
     )
     """
 
+    # Canonical LinkedIn job ID that scraped jobs are upserted on. Existing
+    # rows are backfilled from job_link and duplicates (keeping the oldest
+    # row) removed before the unique index is built.
+    job_id_queries = [
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS linkedin_job_id BIGINT",
+        """
+        UPDATE linkedin
+        SET linkedin_job_id = COALESCE(
+            substring(job_link from '/jobs/view/(?:[^/?#]*-)?([0-9]+)'),
+            substring(job_link from '[?&]currentJobId=([0-9]+)')
+        )::BIGINT
+        WHERE linkedin_job_id IS NULL
+        """,
+        """
+        DELETE FROM linkedin a
+        USING linkedin b
+        WHERE a.linkedin_job_id = b.linkedin_job_id AND a.id > b.id
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS linkedin_job_id_key ON linkedin (linkedin_job_id)",
+    ]
+
+    # Enrichment status, failed attempts and page/record fingerprints per
+    # row, plus the checkpoint the detail enricher resumes from after a crash
+    enrichment_queries = [
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS enrichment_status VARCHAR(20)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS enriched_at TIMESTAMPTZ",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS enrich_attempts INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS page_hash VARCHAR(64)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS record_hash VARCHAR(64)",
+        """
+        CREATE TABLE IF NOT EXISTS enrichment_checkpoint (
+            name VARCHAR(50) PRIMARY KEY,
+            last_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+    ]
+
+    # Weighted full-text search vector (title > company > location and type >
+    # description), plus GIN indexes for it and for trigram matching of
+    # title and company fragments. The vector is maintained by a trigger
+    # (see trigger_queries).
+    search_queries = [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS search_vector TSVECTOR",
+        "CREATE INDEX IF NOT EXISTS linkedin_search_vector_idx ON linkedin USING GIN (search_vector)",
+        "CREATE INDEX IF NOT EXISTS linkedin_job_title_trgm_idx ON linkedin USING GIN (job_title gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS linkedin_company_name_trgm_idx ON linkedin USING GIN (company_name gin_trgm_ops)",
+    ]
+
+    # Generation counter per data set, bumped by every scrape run that commits,
+    # which invalidates the API response caches
+    generation_queries = [
+        """
+        CREATE TABLE IF NOT EXISTS data_generation (
+            name VARCHAR(50) PRIMARY KEY,
+            generation BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        "INSERT INTO data_generation (name) VALUES ('jobs') ON CONFLICT (name) DO NOTHING",
+    ]
+
+    # Scrape runs queued by triggers and worked off one at a time per kind;
+    # at most one run per kind can be queued, later triggers join it
+    scrape_run_queries = [
+        """
+        CREATE TABLE IF NOT EXISTS scrape_runs (
+            id SERIAL PRIMARY KEY,
+            kind VARCHAR(20) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            params JSONB NOT NULL DEFAULT '{}',
+            progress JSONB NOT NULL DEFAULT '{}',
+            error TEXT,
+            trigger_count INTEGER NOT NULL DEFAULT 1,
+            requested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS scrape_runs_queued_key ON scrape_runs (kind) WHERE status = 'queued'",
+    ]
+
+    # Last change to a row's job data, for incremental exports, set by a
+    # trigger (see trigger_queries)
+    updated_at_queries = [
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+        """
+        CREATE OR REPLACE FUNCTION linkedin_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "CREATE INDEX IF NOT EXISTS linkedin_updated_at_idx ON linkedin (updated_at)",
+    ]
+
+    # Companies stored once and referenced by company_id, plus typed columns
+    # parsed from the posted date, salary and location texts, with the
+    # indexes behind the /api/jobs filters. The legacy company_name and
+    # company_link columns are cleared as rows are rewritten or backfilled
+    # (schema_backfill.py).
+    typed_schema_queries = [
+        """
+        CREATE TABLE IF NOT EXISTS companies (
+            id SERIAL PRIMARY KEY,
+            company_key TEXT NOT NULL UNIQUE,
+            name VARCHAR(255),
+            link TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS companies_name_trgm_idx ON companies USING GIN (name gin_trgm_ops)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS company_id INTEGER REFERENCES companies (id)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS posted_at TIMESTAMPTZ",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS salary_min NUMERIC(12, 2)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS salary_max NUMERIC(12, 2)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS salary_currency VARCHAR(3)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS salary_period VARCHAR(10)",
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS is_remote BOOLEAN",
+        "CREATE INDEX IF NOT EXISTS linkedin_company_posted_idx ON linkedin (company_id, posted_at DESC)",
+        "CREATE INDEX IF NOT EXISTS linkedin_remote_posted_idx ON linkedin (is_remote, posted_at DESC)",
+        "CREATE INDEX IF NOT EXISTS linkedin_posted_at_idx ON linkedin (posted_at DESC, id DESC)",
+        """
+        CREATE INDEX IF NOT EXISTS linkedin_salary_idx
+        ON linkedin (salary_currency, salary_period, salary_max, salary_min)
+        """,
+        "CREATE INDEX IF NOT EXISTS linkedin_job_location_trgm_idx ON linkedin USING GIN (job_location gin_trgm_ops)",
+    ]
+
+    # Descriptions move out of linkedin into job_descriptions, stored once
+    # per content hash and referenced by description_id, so list pages and
+    # scans of the hot table never read them. DESCRIPTION_COMPRESSION (pglz
+    # or lz4, Postgres 14+) sets how Postgres compresses new descriptions.
+    # The legacy job_description column is cleared as rows are enriched or
+    # backfilled (schema_backfill.py).
+    description_queries = [
+        """
+        CREATE TABLE IF NOT EXISTS job_descriptions (
+            id SERIAL PRIMARY KEY,
+            content_hash VARCHAR(64) NOT NULL UNIQUE,
+            body TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        "ALTER TABLE linkedin ADD COLUMN IF NOT EXISTS description_id INTEGER REFERENCES job_descriptions (id)",
+    ]
+    compression = os.getenv('DESCRIPTION_COMPRESSION')
+    if compression in ('pglz', 'lz4'):
+        description_queries.append(f"ALTER TABLE job_descriptions ALTER COLUMN body SET COMPRESSION {compression}")
+    elif compression:
+        print(f"Ignoring unknown DESCRIPTION_COMPRESSION: {compression}")
+
+    # The search vector and updated_at triggers, defined once over the final
+    # columns. The search vector reads the company name and description from
+    # their tables, falling back to the legacy copies, and is only rebuilt
+    # when a searched column is written; the enricher's status and hash
+    # updates change neither it nor updated_at. Missing search vectors are
+    # filled in while the updated_at trigger is down.
+    trigger_queries = [
+        """
+        CREATE OR REPLACE FUNCTION linkedin_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.job_title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(
+                    (SELECT name FROM companies WHERE id = NEW.company_id), NEW.company_name, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(NEW.job_location, '') || ' ' ||
+                                                 coalesce(NEW.job_type, '')), 'C') ||
+                setweight(to_tsvector('english', coalesce(
+                    (SELECT body FROM job_descriptions WHERE id = NEW.description_id), NEW.job_description, '')), 'D');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS linkedin_search_vector_trigger ON linkedin",
+        """
+        CREATE TRIGGER linkedin_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF job_title, company_id, job_location, job_type, job_description, description_id
+        ON linkedin
+        FOR EACH ROW EXECUTE FUNCTION linkedin_search_vector_update()
+        """,
+        "DROP TRIGGER IF EXISTS linkedin_updated_at_trigger ON linkedin",
+        "UPDATE linkedin SET job_title = job_title WHERE search_vector IS NULL",
+        """
+        CREATE TRIGGER linkedin_updated_at_trigger
+        BEFORE UPDATE OF job_title, job_link, company_id, job_source, job_location, salary, job_type,
+                         job_description, description_id, job_posted_date, posted_at, salary_min, salary_max,
+                         salary_currency, salary_period, is_remote ON linkedin
+        FOR EACH ROW EXECUTE FUNCTION linkedin_touch_updated_at()
+        """,
+    ]
+
+    # Work queue shared by crawl workers on any number of machines: search
+    # and detail URLs with priorities, leases and retry counts, claimed with
+    # FOR UPDATE SKIP LOCKED (see work_queue.py), plus one row per worker
+    # process for heartbeats and throughput
+    work_queue_queries = [
+        """
+        CREATE TABLE IF NOT EXISTS work_queue (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(10) NOT NULL,
+            url TEXT NOT NULL,
+            keyword VARCHAR(255),
+            page INTEGER NOT NULL DEFAULT 0,
+            job_id INTEGER REFERENCES linkedin (id) ON DELETE CASCADE,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status VARCHAR(10) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker VARCHAR(255),
+            lease_expires_at TIMESTAMPTZ,
+            available_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            last_error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            finished_at TIMESTAMPTZ,
+            UNIQUE (kind, url)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS work_queue_claim_idx
+        ON work_queue (priority DESC, available_at, id) WHERE status = 'queued'
+        """,
+        "CREATE INDEX IF NOT EXISTS work_queue_lease_idx ON work_queue (lease_expires_at) WHERE status = 'leased'",
+        """
+        CREATE TABLE IF NOT EXISTS work_queue_workers (
+            id VARCHAR(255) PRIMARY KEY,
+            host VARCHAR(255) NOT NULL,
+            pid INTEGER NOT NULL,
+            kinds VARCHAR(50) NOT NULL,
+            started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            stopped_at TIMESTAMPTZ,
+            done INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            retried INTEGER NOT NULL DEFAULT 0,
+            busy_seconds DOUBLE PRECISION NOT NULL DEFAULT 0
+        )
+        """,
+    ]
+
     conn = None
     cursor = None
 
@@ -43,11 +286,25 @@ def apply_migration():
 
         # Execute migration commands
         cursor.execute(create_table_query)
+        for query in (job_id_queries + enrichment_queries + search_queries + generation_queries +
+                      scrape_run_queries + updated_at_queries + typed_schema_queries + description_queries +
+                      trigger_queries + work_queue_queries):
+            cursor.execute(query)
 
         # Commit changes
         conn.commit()
 
         print("Table 'linkedin' created or already exists.")
+        print("Unique job ID index on 'linkedin' created or already exists.")
+        print("Enrichment status columns and checkpoint table created or already exist.")
+        print("Full-text search vector and indexes created or already exist.")
+        print("Data generation table created or already exists.")
+        print("Scrape run table created or already exists.")
+        print("Job updated_at column and index created or already exist.")
+        print("Companies table, typed job columns and filter indexes created or already exist.")
+        print("Job descriptions table and description references created or already exist.")
+        print("Search vector and updated_at triggers created or replaced.")
+        print("Work queue and worker tables created or already exist.")
 
     except psycopg2.Error as err:
         print(f"Error: {err}")
@@ -0,0 +1,308 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from metrics import FETCH_ATTEMPTS
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+# A fetch that failed in a way worth retrying later: a server error, a
+# timeout or a page without the markup we came for
+class FetchError(Exception):
+    pass
+
+
+# The host told us to slow down (429, LinkedIn's 999) or put up an auth wall
+class Throttled(FetchError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Raised without fetching while the circuit breaker of a host is open
+class CircuitOpen(FetchError):
+    pass
+
+
+# Function to read a Retry-After header given in seconds, or None
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+# Refills rate tokens per second up to burst; acquire() blocks until a
+# token is available
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# Closed while the host answers; opens after failure_threshold failures in
+# a row and rejects fetches for reset_seconds, then lets a single probe
+# through (half open) which closes it again or reopens it
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def succeeded(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.opens += 1
+            self._probing = False
+
+    # Lets the next probe through when a half-open probe ended without a verdict
+    def release(self):
+        with self._lock:
+            self._probing = False
+
+    def retry_in(self):
+        with self._lock:
+            return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+
+# Pacing state of one host: a token bucket for the request rate, an AIMD
+# concurrency limit and a circuit breaker. Fast successes add to the rate
+# and the limit; throttling, failures and slow responses halve both.
+class HostLimiter:
+    def __init__(self, host, controller):
+        self.host = host
+        self.controller = controller
+        self.bucket = TokenBucket(controller.rate, controller.burst)
+        self.breaker = CircuitBreaker(controller.failure_threshold, controller.reset_seconds)
+        self.limit = float(controller.concurrency)
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.stats = {'fetches': 0, 'succeeded': 0, 'throttled': 0, 'failed': 0, 'retries': 0, 'rejected': 0,
+                      'slow': 0, 'paced_seconds': 0.0, 'backoff_seconds': 0.0}
+        self._slots = threading.Condition()
+        self._lock = threading.Lock()
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    @contextmanager
+    def slot(self):
+        with self._slots:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._slots.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._slots:
+                self.in_flight -= 1
+                self._slots.notify_all()
+
+    def _increase(self):
+        controller = self.controller
+        with self._slots:
+            self.limit = min(controller.max_concurrency, self.limit + 1 / max(1.0, self.limit))
+            self._slots.notify_all()
+        self.bucket.set_rate(min(controller.max_rate, self.bucket.rate + controller.rate_step))
+
+    # Multiplicative decrease, at most once per cooldown so that a burst of
+    # concurrent failures counts as one congestion signal
+    def _decrease(self):
+        controller = self.controller
+        now = time.monotonic()
+        with self._slots:
+            if now - self.last_decrease < controller.decrease_cooldown:
+                return
+            self.last_decrease = now
+            self.limit = max(1.0, self.limit * controller.backoff_factor)
+        self.bucket.set_rate(max(controller.min_rate, self.bucket.rate * controller.backoff_factor))
+
+    def succeeded(self, seconds):
+        self.breaker.succeeded()
+        self.count('succeeded')
+        if seconds > self.controller.latency_target:
+            self.count('slow')
+            self._decrease()
+        else:
+            self._increase()
+
+    def failed(self, err):
+        self.breaker.failed()
+        self.count('throttled' if isinstance(err, Throttled) else 'failed')
+        self._decrease()
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return dict(stats, state=self.breaker.state, opens=self.breaker.opens, concurrency=round(self.limit, 2),
+                    rate=round(self.bucket.rate, 3))
+
+
+# Paces the fetches of every host shared by all fetchers of a process:
+# requests wait for a token of the host's bucket (FETCH_RATE per second,
+# bursts of FETCH_BURST) and for a slot under its concurrency limit (starting
+# at FETCH_CONCURRENCY). Both grow additively while responses arrive within
+# FETCH_LATENCY_TARGET_SECONDS and are halved on throttling, failures or slow
+# responses. Failed fetches are retried FETCH_RETRIES times with jittered
+# exponential backoff (honouring Retry-After), and BREAKER_FAILURES failures
+# in a row open the host's circuit for BREAKER_RESET_SECONDS.
+class RateController:
+    def __init__(self, rate=None, burst=None, min_rate=None, max_rate=None, concurrency=None,
+                 max_concurrency=None, latency_target=None, retries=None, backoff_seconds=None,
+                 max_backoff_seconds=None, failure_threshold=None, reset_seconds=None):
+        self.rate = rate or float(os.getenv('FETCH_RATE', 1.0))
+        self.burst = burst or float(os.getenv('FETCH_BURST', 2))
+        self.min_rate = min_rate or float(os.getenv('FETCH_MIN_RATE', 0.1))
+        self.max_rate = max_rate or float(os.getenv('FETCH_MAX_RATE', 5.0))
+        self.concurrency = concurrency or int(os.getenv('FETCH_CONCURRENCY', 2))
+        self.max_concurrency = max_concurrency or int(os.getenv('FETCH_MAX_CONCURRENCY', 8))
+        self.latency_target = latency_target or float(os.getenv('FETCH_LATENCY_TARGET_SECONDS', 5))
+        self.retries = retries if retries is not None else int(os.getenv('FETCH_RETRIES', 3))
+        self.backoff_seconds = backoff_seconds or float(os.getenv('FETCH_BACKOFF_SECONDS', 2))
+        self.max_backoff_seconds = max_backoff_seconds or float(os.getenv('FETCH_MAX_BACKOFF_SECONDS', 60))
+        self.failure_threshold = failure_threshold or int(os.getenv('BREAKER_FAILURES', 5))
+        self.reset_seconds = reset_seconds or float(os.getenv('BREAKER_RESET_SECONDS', 120))
+        self.rate_step = self.rate / 10
+        self.backoff_factor = 0.5
+        self.decrease_cooldown = 1.0
+
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            limiter = self.hosts.get(host)
+            if limiter is None:
+                limiter = self.hosts[host] = HostLimiter(host, self)
+            return limiter
+
+    # Full jitter: a random delay up to the exponential backoff, but never
+    # shorter than what the host asked for
+    def backoff(self, attempt, err):
+        delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+        retry_after = getattr(err, 'retry_after', None)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff_seconds))
+        return delay
+
+    # Function to run fetch(url) under the pacing of url's host. FetchErrors
+    # are retried (FETCH_RETRIES times unless retries is given) and finally
+    # re-raised; other exceptions pass straight through without counting
+    # against the host.
+    def call(self, url, fetch, retries=None):
+        retries = self.retries if retries is None else retries
+        limiter = self.host(url)
+        for attempt in range(retries + 1):
+            if not limiter.breaker.allow():
+                limiter.count('rejected')
+                FETCH_ATTEMPTS.inc(host=limiter.host, outcome='rejected')
+                raise CircuitOpen(f"Circuit open for {limiter.host}, retry in {limiter.breaker.retry_in():.0f}s")
+
+            with limiter.slot():
+                limiter.count('paced_seconds', limiter.bucket.acquire())
+                limiter.count('fetches')
+                started = time.perf_counter()
+                try:
+                    result = fetch(url)
+                except FetchError as err:
+                    error = err
+                except Exception:
+                    limiter.breaker.release()
+                    raise
+                else:
+                    limiter.succeeded(time.perf_counter() - started)
+                    FETCH_ATTEMPTS.inc(host=limiter.host, outcome='ok')
+                    return result
+
+            limiter.failed(error)
+            FETCH_ATTEMPTS.inc(host=limiter.host, outcome='throttled' if isinstance(error, Throttled) else 'failed')
+            if attempt == retries:
+                raise error
+            delay = self.backoff(attempt, error)
+            limiter.count('retries')
+            limiter.count('backoff_seconds', delay)
+            print(f"Retrying {url} in {delay:.1f}s after: {error}")
+            time.sleep(delay)
+
+    def report(self):
+        with self._lock:
+            hosts = dict(self.hosts)
+        report = {}
+        for host, limiter in hosts.items():
+            report[host] = stats = limiter.report()
+            print(f"Rate control ({host}): {stats['succeeded']} ok, {stats['throttled']} throttled, "
+                  f"{stats['failed']} failed, {stats['retries']} retries, {stats['rejected']} rejected; "
+                  f"circuit {stats['state']}, concurrency {stats['concurrency']}, {stats['rate']} req/s")
+        return report
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+# Function returning the rate controller shared by every fetcher of this
+# process, so that concurrent runs pace the same hosts together
+def get_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = RateController()
+        return _controller
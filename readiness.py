@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from dotenv import load_dotenv
+from metrics import STAGE_SECONDS
+
+# Load environment variables from .env file
+load_dotenv()
+
+JOB_CARD_SELECTOR = ".two-pane-serp-page__results-list .job-search-card"
+DESCRIPTION_SELECTOR = ".description__text"
+
+PAGE_TIMEOUTS = {
+    'search': float(os.getenv('READY_TIMEOUT_SEARCH', 10)),
+    'detail': float(os.getenv('READY_TIMEOUT_DETAIL', 10)),
+}
+SETTLE_SECONDS = float(os.getenv('READY_SETTLE_SECONDS', 1.0))
+POLL_SECONDS = 0.2
+
+_lock = threading.Lock()
+_waits = {}
+
+
+def _record(page_type, seconds, timed_out):
+    with _lock:
+        stats = _waits.setdefault(page_type, {'waits': 0, 'timeouts': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+        stats['waits'] += 1
+        stats['timeouts'] += 1 if timed_out else 0
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+
+# Condition that holds once the number of job cards has stopped changing for
+# SETTLE_SECONDS after the page finished loading
+class card_count_stable:
+    def __init__(self, settle_seconds):
+        self.settle_seconds = settle_seconds
+        self.count = None
+        self.since = None
+
+    def __call__(self, driver):
+        if driver.execute_script("return document.readyState") != "complete":
+            return False
+        count = len(driver.find_elements(By.CSS_SELECTOR, JOB_CARD_SELECTOR))
+        now = time.perf_counter()
+        if count != self.count:
+            self.count = count
+            self.since = now
+            return False
+        return now - self.since >= self.settle_seconds
+
+
+def _wait(driver, page_type, condition, timeout):
+    timeout = timeout or PAGE_TIMEOUTS[page_type]
+    started = time.perf_counter()
+    timed_out = False
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_SECONDS,
+                      ignored_exceptions=(WebDriverException,)).until(condition)
+    except TimeoutException:
+        timed_out = True
+        print(f"Timed out after {timeout}s waiting for {page_type} page: {driver.current_url}")
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.observe(elapsed, stage=f'wait_{page_type}')
+    _record(page_type, elapsed, timed_out)
+    return not timed_out
+
+
+# Function to scroll a search page and wait until the job card list settles
+def wait_for_search_results(driver, timeout=None):
+    driver.execute_script("window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });")
+    return _wait(driver, 'search', card_count_stable(SETTLE_SECONDS), timeout)
+
+
+# Function to wait for the description node of a job detail page
+def wait_for_job_detail(driver, timeout=None):
+    condition = EC.presence_of_element_located((By.CSS_SELECTOR, DESCRIPTION_SELECTOR))
+    return _wait(driver, 'detail', condition, timeout)
+
+
+# Function to report how long the readiness waits of the run actually took
+def wait_report():
+    with _lock:
+        report = {page_type: dict(stats) for page_type, stats in _waits.items()}
+        _waits.clear()
+    for page_type, stats in report.items():
+        stats['avg_seconds'] = stats['total_seconds'] / stats['waits'] if stats['waits'] else 0.0
+        print(f"Readiness ({page_type}): {stats['waits']} waits, avg {stats['avg_seconds']:.2f}s, "
+              f"max {stats['max_seconds']:.2f}s, {stats['timeouts']} timed out")
+    return report
@@ -0,0 +1,142 @@
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+CHANNEL = 'data_generation'
+LISTEN_POLL_SECONDS = 5
+RECONNECT_SECONDS = 5
+
+BUMP_GENERATION_QUERY = """
+INSERT INTO data_generation (name, generation, updated_at) VALUES (%s, 1, now())
+ON CONFLICT (name) DO UPDATE SET generation = data_generation.generation + 1, updated_at = now()
+RETURNING generation
+"""
+
+LOAD_GENERATION_QUERY = "SELECT generation FROM data_generation WHERE name = %s"
+
+
+# Function to bump the data generation of name inside the caller's
+# transaction. Listeners are notified when that transaction commits.
+def bump_generation(cursor, name='jobs'):
+    cursor.execute(BUMP_GENERATION_QUERY, (name,))
+    generation = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, f"{name}:{generation}"))
+    return generation
+
+
+# In-process LRU cache of API responses, with entries expiring after
+# RESPONSE_CACHE_TTL_SECONDS. Every key is tagged with the data generation
+# it was computed at; writers bump the generation in Postgres and NOTIFY,
+# and a listener thread in each gunicorn worker picks the new generation up,
+# which makes all older entries unreachable. While the listener is not
+# connected the cache is bypassed rather than risk serving stale data.
+class ResponseCache:
+    def __init__(self, name, db_config, max_entries=None, ttl_seconds=None):
+        self.name = name
+        self.db_config = db_config
+        self.max_entries = max_entries or int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 512))
+        self.ttl_seconds = ttl_seconds or float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 300))
+        self.enabled = os.getenv('RESPONSE_CACHE', 'on') != 'off'
+
+        self.generation = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener = None
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'bypassed': 0, 'generations': 0}
+
+    # The listener is started on first use so it runs in the gunicorn worker
+    # and not in a parent process that forks afterwards
+    def _ensure_listener(self):
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name=f"{self.name}-cache-listener",
+                                                      daemon=True)
+                    self._listener.start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.db_config)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {CHANNEL}")
+                cursor.execute(LOAD_GENERATION_QUERY, (self.name,))
+                row = cursor.fetchone()
+                self._set_generation(row[0] if row else 0)
+
+                while True:
+                    if select.select([conn], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        name, _, generation = conn.notifies.pop(0).payload.partition(':')
+                        if name == self.name:
+                            self._set_generation(int(generation))
+            except (psycopg2.Error, OSError, ValueError) as err:
+                print(f"Response cache '{self.name}' listener error: {err}")
+            finally:
+                if conn is not None:
+                    conn.close()
+            self._set_generation(None)
+            time.sleep(RECONNECT_SECONDS)
+
+    def _set_generation(self, generation):
+        with self._lock:
+            if generation != self.generation:
+                self.generation = generation
+                self._entries.clear()
+                if generation is not None:
+                    self.stats['generations'] += 1
+
+    # Returns the cached value of key, or None
+    def get(self, key):
+        if not self.enabled:
+            return None
+        self._ensure_listener()
+        with self._lock:
+            if self.generation is None:
+                self.stats['bypassed'] += 1
+                return None
+            entry = self._entries.get((self.generation, key))
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[(self.generation, key)]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end((self.generation, key))
+            self.stats['hits'] += 1
+            return value
+
+    # Caches value under key for the generation the caller read it at; a
+    # value computed while the generation moved on is dropped
+    def put(self, key, value, generation):
+        if not self.enabled or generation is None:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[(generation, key)] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end((generation, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def report(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_rate = self.stats['hits'] / lookups if lookups else 0.0
+        return dict(self.stats, name=self.name, generation=self.generation, entries=len(self._entries),
+                    hit_rate=hit_rate)
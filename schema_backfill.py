@@ -0,0 +1,171 @@
+import time
+import psycopg2
+from psycopg2.errors import LockNotAvailable
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from db_pool import get_pool
+from enrichment import LOAD_CHECKPOINT_QUERY, SAVE_CHECKPOINT_QUERY
+from job_fields import company_key, is_remote, parse_posted_at, parse_salary
+from job_store import description_key, upsert_companies, upsert_descriptions
+from response_cache import bump_generation
+import os
+
+# Load environment variables from .env file
+load_dotenv()
+
+CHECKPOINT_NAME = 'schema_backfill'
+
+# Rows written before the typed columns existed: a company or description
+# still stored inline, or typed columns never filled in from their text
+SELECT_BATCH_QUERY = """
+SELECT id, company_name, company_link, job_location, job_title, job_posted_date, salary, updated_at,
+       job_description
+FROM linkedin
+WHERE id > %s
+  AND ((company_id IS NULL AND (company_name IS NOT NULL OR company_link IS NOT NULL))
+       OR (description_id IS NULL AND job_description IS NOT NULL AND job_description <> 'N/A')
+       OR (posted_at IS NULL AND job_posted_date IS NOT NULL)
+       OR is_remote IS NULL
+       OR (salary_min IS NULL AND salary IS NOT NULL AND salary <> 'N/A'))
+ORDER BY id
+LIMIT %s
+"""
+
+# Values already set by a newer scrape win over the backfilled ones, and the
+# inline company and description copies are dropped once the row
+# references a stored one
+UPDATE_BATCH_QUERY = """
+UPDATE linkedin
+SET company_id = COALESCE(linkedin.company_id, v.company_id),
+    company_name = CASE WHEN COALESCE(linkedin.company_id, v.company_id) IS NULL
+                        THEN linkedin.company_name END,
+    company_link = CASE WHEN COALESCE(linkedin.company_id, v.company_id) IS NULL
+                        THEN linkedin.company_link END,
+    description_id = COALESCE(linkedin.description_id, v.description_id),
+    job_description = CASE WHEN COALESCE(linkedin.description_id, v.description_id) IS NULL
+                           THEN linkedin.job_description END,
+    posted_at = COALESCE(linkedin.posted_at, v.posted_at),
+    salary_min = COALESCE(linkedin.salary_min, v.salary_min),
+    salary_max = COALESCE(linkedin.salary_max, v.salary_max),
+    salary_currency = COALESCE(linkedin.salary_currency, v.salary_currency),
+    salary_period = COALESCE(linkedin.salary_period, v.salary_period),
+    is_remote = COALESCE(linkedin.is_remote, v.is_remote)
+FROM (VALUES %s) AS v (id, company_id, description_id, posted_at, salary_min, salary_max, salary_currency,
+                       salary_period, is_remote)
+WHERE linkedin.id = v.id
+"""
+
+UPDATE_TEMPLATE = ("(%s::integer, %s::integer, %s::integer, %s::timestamptz, %s::numeric, %s::numeric, %s::varchar, "
+                   "%s::varchar, %s::boolean)")
+
+
+# Function to compute the typed values of one legacy row. Relative posted
+# dates ("3 days ago") are counted back from when the row was last written,
+# the closest we have to when the text was scraped.
+def backfill_values(row, company_ids, description_ids):
+    (job_id, company_name, company_link, job_location, job_title, job_posted_date, salary, updated_at,
+     job_description) = row
+    company_id = company_ids.get(company_key(company_name, company_link))
+    description_id = description_ids.get(description_key(job_description))
+    salary_min, salary_max, currency, period = parse_salary(salary)
+    return (job_id, company_id, description_id, parse_posted_at(job_posted_date, now=updated_at), salary_min, salary_max,
+            currency, period, is_remote(job_location, job_title))
+
+
+# Fills the companies and job_descriptions tables and the typed columns of
+# rows scraped before they existed, online: BACKFILL_BATCH_SIZE rows per short transaction in id
+# order, pausing BACKFILL_PAUSE_SECONDS between batches so scrapes and API
+# reads keep their locks. Progress is checkpointed, so an interrupted run
+# resumes where it stopped.
+class SchemaBackfill:
+    def __init__(self, conn, batch_size=None, pause_seconds=None, lock_timeout=None):
+        self.conn = conn
+        self.batch_size = batch_size or int(os.getenv('BACKFILL_BATCH_SIZE', 1000))
+        if pause_seconds is None:
+            pause_seconds = float(os.getenv('BACKFILL_PAUSE_SECONDS', 0.5))
+        self.pause_seconds = pause_seconds
+        self.lock_timeout = lock_timeout or '5s'
+        self.stats = {'batches': 0, 'rows': 0, 'companies': 0, 'descriptions': 0, 'lock_timeouts': 0}
+
+    def _load_checkpoint(self, cursor):
+        cursor.execute(LOAD_CHECKPOINT_QUERY, (CHECKPOINT_NAME,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    # Function to backfill the batch of rows after last_id in one
+    # transaction. Returns the id of the last row handled, or None when
+    # no row is left.
+    def run_batch(self, cursor, last_id):
+        cursor.execute(f"SET LOCAL lock_timeout = '{self.lock_timeout}'")
+        cursor.execute(SELECT_BATCH_QUERY, (last_id, self.batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+
+        company_ids = upsert_companies(cursor, [{'CompanyName': row[1], 'CompanyLink': row[2]} for row in rows])
+        description_ids = upsert_descriptions(cursor, [row[8] for row in rows])
+        values = [backfill_values(row, company_ids, description_ids) for row in rows]
+        execute_values(cursor, UPDATE_BATCH_QUERY, values, template=UPDATE_TEMPLATE, page_size=len(values))
+        cursor.execute(SAVE_CHECKPOINT_QUERY, (CHECKPOINT_NAME, rows[-1][0]))
+        self.stats['companies'] += len(company_ids)
+        self.stats['descriptions'] += len(description_ids)
+        self.stats['rows'] += len(rows)
+        self.stats['batches'] += 1
+        return rows[-1][0]
+
+    def run(self):
+        cursor = self.conn.cursor()
+        try:
+            last_id = self._load_checkpoint(cursor)
+            self.conn.commit()
+            while True:
+                try:
+                    handled = self.run_batch(cursor, last_id)
+                    self.conn.commit()
+                except LockNotAvailable:
+                    # A scrape holds the rows; retry the same batch after a pause
+                    self.conn.rollback()
+                    self.stats['lock_timeouts'] += 1
+                    time.sleep(self.pause_seconds or 1)
+                    continue
+                if handled is None:
+                    break
+                last_id = handled
+                if self.pause_seconds:
+                    time.sleep(self.pause_seconds)
+
+            # Done, so the next run starts from the beginning again
+            cursor.execute(SAVE_CHECKPOINT_QUERY, (CHECKPOINT_NAME, 0))
+            # Cached API responses are invalidated once the rows are committed
+            bump_generation(cursor)
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+    def report(self):
+        print(f"Schema backfill: {self.stats['rows']} rows in {self.stats['batches']} batches, "
+              f"{self.stats['companies']} companies and {self.stats['descriptions']} descriptions referenced, "
+              f"{self.stats['lock_timeouts']} lock timeouts")
+        return dict(self.stats)
+
+
+def main():
+    # Connections come from the process-wide database pool
+    db_pool = get_pool()
+    conn = None
+    backfill = None
+    try:
+        conn = db_pool.getconn()
+        backfill = SchemaBackfill(conn)
+        backfill.run()
+    except psycopg2.Error as err:
+        print(f"Database Error: {err}")
+    finally:
+        if conn is not None:
+            db_pool.putconn(conn)
+        if backfill is not None:
+            backfill.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+import psycopg2
+from dotenv import load_dotenv
+from db_pool import TimedRealDictCursor, get_pool
+
+# Load environment variables from .env file
+load_dotenv()
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+PROGRESS_INTERVAL_SECONDS = 2
+
+# A second trigger while a run of the same kind is queued joins that run
+REQUEST_RUN_QUERY = f"""
+INSERT INTO scrape_runs (kind, status, params) VALUES (%s, '{STATUS_QUEUED}', %s)
+ON CONFLICT (kind) WHERE status = '{STATUS_QUEUED}'
+DO UPDATE SET trigger_count = scrape_runs.trigger_count + 1
+RETURNING id
+"""
+
+# Serializes recent-run checks of a kind until the requesting transaction
+# commits; the run lock itself is held for the length of a run
+REQUEST_LOCK_QUERY = "SELECT pg_advisory_xact_lock(hashtext(%s))"
+
+RECENT_RUN_QUERY = f"""
+SELECT id FROM scrape_runs
+WHERE kind = %s AND status <> '{STATUS_FAILED}' AND requested_at > now() - make_interval(secs => %s)
+ORDER BY id DESC LIMIT 1
+"""
+
+CLAIM_RUN_QUERY = f"""
+UPDATE scrape_runs SET status = '{STATUS_RUNNING}', started_at = now()
+WHERE id = (SELECT id FROM scrape_runs WHERE kind = %s AND status = '{STATUS_QUEUED}' ORDER BY id LIMIT 1)
+RETURNING id, params
+"""
+
+# Runs left running by a process that died; only valid under the run lock
+INTERRUPTED_RUNS_QUERY = f"""
+UPDATE scrape_runs SET status = '{STATUS_FAILED}', finished_at = now(), error = 'interrupted'
+WHERE kind = %s AND status = '{STATUS_RUNNING}'
+"""
+
+HAS_QUEUED_QUERY = f"SELECT EXISTS (SELECT 1 FROM scrape_runs WHERE kind = %s AND status = '{STATUS_QUEUED}')"
+
+PROGRESS_QUERY = "UPDATE scrape_runs SET progress = %s WHERE id = %s"
+
+FINISH_RUN_QUERY = "UPDATE scrape_runs SET status = %s, finished_at = now(), progress = %s, error = %s WHERE id = %s"
+
+STATUS_QUERY = """
+SELECT id, kind, status, trigger_count, params, progress, error, requested_at, started_at, finished_at
+FROM scrape_runs WHERE id = %s
+"""
+
+
+# Single-flight coordination of one kind of scrape across every process
+# sharing the database. Triggers queue a run, or join the run already
+# queued, and return its id at once. A background thread then takes the
+# advisory lock of the kind and works through the queued runs; a process
+# that cannot take the lock leaves them to the process holding it, which
+# checks for new runs again after releasing it.
+class ScrapeCoordinator:
+    def __init__(self, kind, run):
+        self.kind = kind
+        self.run = run
+        self._draining = threading.Lock()
+        self._wakeup = threading.Event()
+
+    # Queues a run with params (passed to run as keyword arguments) and
+    # returns its id. With skip_recent_seconds a run requested that recently
+    # is returned instead, so a trigger firing in every worker runs once. The
+    # check and the insert run under a transaction lock, so a second trigger
+    # waits for the first to commit and then finds its run.
+    def request(self, params=None, skip_recent_seconds=None):
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                if skip_recent_seconds:
+                    cursor.execute(REQUEST_LOCK_QUERY, (f"scrape-request:{self.kind}",))
+                    cursor.execute(RECENT_RUN_QUERY, (self.kind, skip_recent_seconds))
+                    row = cursor.fetchone()
+                    if row is not None:
+                        return row[0]
+                cursor.execute(REQUEST_RUN_QUERY, (self.kind, json.dumps(params or {})))
+                run_id = cursor.fetchone()[0]
+            conn.commit()
+
+        threading.Thread(target=self.drain, name=f"{self.kind}-scrape", daemon=True).start()
+        return run_id
+
+    def status(self, run_id):
+        with get_pool().connection() as conn:
+            with conn.cursor(cursor_factory=TimedRealDictCursor) as cursor:
+                cursor.execute(STATUS_QUERY, (run_id,))
+                row = cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    # Runs queued runs for as long as this process holds the lock. A trigger
+    # arriving while another thread of this process drains sets the wakeup
+    # event, which that thread checks before it stops.
+    def drain(self):
+        self._wakeup.set()
+        while True:
+            if not self._draining.acquire(blocking=False):
+                return
+            try:
+                while self._wakeup.is_set():
+                    self._wakeup.clear()
+                    while self._drain_locked():
+                        pass
+            except psycopg2.Error as err:
+                print(f"Scrape coordinator '{self.kind}' error: {err}")
+            finally:
+                self._draining.release()
+            if not self._wakeup.is_set():
+                return
+
+    # One pass under the advisory lock. Returns True when runs were queued
+    # after the lock was released and another pass should try to take it.
+    def _drain_locked(self):
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f"scrape:{self.kind}",))
+                if not cursor.fetchone()[0]:
+                    return False
+                try:
+                    cursor.execute(INTERRUPTED_RUNS_QUERY, (self.kind,))
+                    while True:
+                        cursor.execute(CLAIM_RUN_QUERY, (self.kind,))
+                        row = cursor.fetchone()
+                        if row is None:
+                            break
+                        self._execute(cursor, row[0], row[1] or {})
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (f"scrape:{self.kind}",))
+
+                # A trigger that found the lock taken relies on this check
+                cursor.execute(HAS_QUEUED_QUERY, (self.kind,))
+                return cursor.fetchone()[0]
+        finally:
+            conn.autocommit = False
+            db_pool.putconn(conn)
+
+    def _execute(self, cursor, run_id, params):
+        progress = {}
+        last_update = [0.0]
+
+        # Progress is written at most every PROGRESS_INTERVAL_SECONDS
+        def report_progress(values):
+            progress.update(values)
+            if time.monotonic() - last_update[0] >= PROGRESS_INTERVAL_SECONDS:
+                last_update[0] = time.monotonic()
+                cursor.execute(PROGRESS_QUERY, (json.dumps(progress), run_id))
+
+        print(f"Starting {self.kind} scrape run {run_id}")
+        try:
+            self.run(progress=report_progress, **params)
+        except Exception as err:
+            print(f"{self.kind} scrape run {run_id} failed: {err}")
+            cursor.execute(FINISH_RUN_QUERY, (STATUS_FAILED, json.dumps(progress), str(err), run_id))
+            return
+        cursor.execute(FINISH_RUN_QUERY, (STATUS_DONE, json.dumps(progress), None, run_id))
+        print(f"Finished {self.kind} scrape run {run_id}")
+
@@ -0,0 +1,164 @@
+import fcntl
+import hashlib
+import math
+import os
+import struct
+from array import array
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+EXACT_HEADER = b"SEEN1"
+BLOOM_HEADER = b"BLOOM1"
+
+
+# Exact set of job IDs, stored on disk as a packed array of 64-bit integers
+class ExactSet:
+    def __init__(self):
+        self.ids = set()
+
+    def __contains__(self, job_id):
+        return job_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, job_id):
+        self.ids.add(job_id)
+
+    def merge(self, other):
+        self.ids.update(other.ids)
+
+    def dump(self, f):
+        f.write(EXACT_HEADER)
+        array('Q', sorted(self.ids)).tofile(f)
+
+    @classmethod
+    def load(cls, data):
+        seen = cls()
+        ids = array('Q')
+        ids.frombytes(data[len(EXACT_HEADER):])
+        seen.ids.update(ids)
+        return seen
+
+
+# Bloom filter for very large histories: fixed size, no false negatives and
+# a false positive rate of about error_rate once capacity IDs were added
+class BloomSet:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, job_id):
+        digest = hashlib.blake2b(str(job_id).encode(), digest_size=16).digest()
+        first, second = struct.unpack("<QQ", digest)
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, job_id):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(job_id))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, job_id):
+        if job_id in self:
+            return
+        for p in self._positions(job_id):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    # Function to add the IDs of a filter of the same shape. The size of the
+    # union is estimated from the number of bits set.
+    def merge(self, other):
+        if (other.size, other.hashes) != (self.size, self.hashes):
+            print("Seen index on disk was built with other Bloom settings, not merging it.")
+            return
+        bits = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        self.bits = bytearray(bits.to_bytes(len(self.bits), 'little'))
+        filled = min(bits.bit_count(), self.size - 1)
+        self.count = max(self.count, other.count, round(-self.size / self.hashes * math.log(1 - filled / self.size)))
+
+    def dump(self, f):
+        f.write(BLOOM_HEADER)
+        f.write(struct.pack("<QIQ", self.size, self.hashes, self.count))
+        f.write(self.bits)
+
+    @classmethod
+    def load(cls, data):
+        seen = cls.__new__(cls)
+        offset = len(BLOOM_HEADER)
+        seen.size, seen.hashes, seen.count = struct.unpack_from("<QIQ", data, offset)
+        seen.bits = bytearray(data[offset + struct.calcsize("<QIQ"):])
+        return seen
+
+
+# Set of LinkedIn job IDs already handled, kept in memory during a run and
+# persisted to SEEN_INDEX_DIR/<name>.idx between runs. SEEN_INDEX_MODE=bloom
+# switches to a fixed-size Bloom filter for very large histories, and mode
+# 'off' sees nothing, e.g. when reparsing cached pages on purpose.
+class SeenIndex:
+    def __init__(self, name, mode=None, path=None):
+        self.mode = mode or os.getenv('SEEN_INDEX_MODE', 'exact')
+        self.path = path or os.path.join(os.getenv('SEEN_INDEX_DIR', '.seen'), f"{name}.idx")
+        self.hits = 0
+        self.ids = self._load()
+
+    def _empty(self):
+        if self.mode == 'bloom':
+            return BloomSet(int(os.getenv('SEEN_BLOOM_CAPACITY', 1000000)),
+                            float(os.getenv('SEEN_BLOOM_ERROR_RATE', 0.001)))
+        if self.mode in ('exact', 'off'):
+            return ExactSet()
+        raise ValueError(f"Unknown seen index mode: {self.mode}")
+
+    def _load(self):
+        if self.mode == 'off' or not os.path.exists(self.path):
+            return self._empty()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if self.mode == 'exact' and data.startswith(EXACT_HEADER):
+            return ExactSet.load(data)
+        if self.mode == 'bloom' and data.startswith(BLOOM_HEADER):
+            return BloomSet.load(data)
+        print(f"Seen index {self.path} was written in another mode, starting empty.")
+        return self._empty()
+
+    def __contains__(self, job_id):
+        if self.mode != 'off' and job_id is not None and job_id in self.ids:
+            self.hits += 1
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, job_id):
+        if job_id is not None:
+            self.ids.add(job_id)
+
+    # Function to write the index. Other processes (gunicorn workers, CLI
+    # runs, queue workers) save the same file, so what they saved since it
+    # was loaded is merged in under an exclusive lock before it is replaced.
+    def save(self):
+        if self.mode == 'off':
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.ids.merge(self._load())
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    self.ids.dump(f)
+                os.replace(temp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def report(self):
+        print(f"Seen index {self.path}: {len(self)} jobs, {self.hits} skipped as already seen")
+        return {'size': len(self), 'skipped': self.hits}
@@ -0,0 +1,148 @@
+import psycopg2
+import psycopg2.extensions
+import pytest
+import db_pool
+from db_pool import DatabasePool, PoolTimeout, _numbered_placeholders, execute_prepared
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+
+class FakeInfo:
+    transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+# Stands in for PooledConnection, which needs a server to construct
+class FakeConnection:
+    def __init__(self, max_prepared=64, ping_error=None):
+        self.prepared = db_pool.OrderedDict()
+        self.max_prepared = max_prepared
+        self.checked_at = 1000.0
+        self.closed = False
+        self.info = FakeInfo()
+        self.rollbacks = 0
+        self.ping_error = ping_error
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        if self.connection.ping_error is not None:
+            raise self.connection.ping_error
+        self.connection.executed.append((query, params))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(db_pool, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def pooled(monkeypatch):
+    monkeypatch.setattr(db_pool, 'PooledConnection', FakeConnection)
+
+
+def pool(monkeypatch, connections, **kwargs):
+    database = DatabasePool({}, size=kwargs.pop('size', 2), timeout=0.01, validate_after=30, **kwargs)
+    connections = iter(connections)
+    monkeypatch.setattr(database, '_connect', lambda: next(connections))
+    return database
+
+
+def test_numbered_placeholders():
+    assert _numbered_placeholders("SELECT %s, %s") == ("SELECT $1, $2", [0, 1])
+    body, names = _numbered_placeholders("WHERE a = %(a)s AND b = %(b)s OR a LIKE '5%%' || %(a)s")
+    assert body == "WHERE a = $1 AND b = $2 OR a LIKE '5%' || $1"
+    assert names == ['a', 'b']
+
+
+def test_execute_prepared_reuses_statements(pooled):
+    conn = FakeConnection()
+    execute_prepared(conn.cursor(), "SELECT * FROM jobs WHERE id = %(id)s", {'id': 3})
+    execute_prepared(conn.cursor(), "SELECT * FROM jobs WHERE id = %(id)s", {'id': 4})
+    queries = [query for query, _ in conn.executed]
+    assert len(conn.prepared) == 1
+    assert [query.split()[0] for query in queries] == ['PREPARE', 'EXECUTE', 'EXECUTE']
+    assert queries[0].endswith("AS SELECT * FROM jobs WHERE id = $1")
+    assert conn.executed[2][1] == [4]
+
+
+def test_execute_prepared_deallocates_the_least_recently_used(pooled):
+    conn = FakeConnection(max_prepared=2)
+    execute_prepared(conn.cursor(), "SELECT 1")
+    first = next(iter(conn.prepared))
+    execute_prepared(conn.cursor(), "SELECT 2")
+    execute_prepared(conn.cursor(), "SELECT 1")
+    execute_prepared(conn.cursor(), "SELECT 3")
+    assert len(conn.prepared) == 2
+    assert first in conn.prepared
+    deallocated = [query for query, _ in conn.executed if query.startswith('DEALLOCATE')]
+    assert len(deallocated) == 1
+    assert first not in deallocated[0]
+
+
+def test_execute_prepared_runs_plain_statements_on_other_connections():
+    conn = FakeConnection()
+    execute_prepared(conn.cursor(), "SELECT %s", (1,))
+    assert conn.executed == [("SELECT %s", (1,))]
+    assert not conn.prepared
+
+
+def test_pool_reuses_idle_connections_and_rolls_back_on_return(monkeypatch, clock):
+    conn = FakeConnection()
+    database = pool(monkeypatch, [conn])
+    checked_out = database.getconn()
+    checked_out.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    database.putconn(checked_out)
+    assert conn.rollbacks == 1
+    with database.connection() as again:
+        assert again is conn
+    assert database.report()['checkouts'] == 2
+
+
+def test_pool_reconnects_when_the_ping_fails(monkeypatch, clock):
+    stale, fresh = FakeConnection(), FakeConnection()
+    database = pool(monkeypatch, [stale, fresh])
+    database.putconn(database.getconn())
+    clock.now += 31
+    stale.ping_error = psycopg2.OperationalError("server closed the connection")
+    assert database.getconn() is fresh
+    assert stale.closed
+    assert database.stats['reconnects'] == 1
+
+
+def test_pool_times_out_when_every_connection_is_checked_out(monkeypatch, clock):
+    database = pool(monkeypatch, [FakeConnection()], size=1)
+    database.getconn()
+    with pytest.raises(PoolTimeout):
+        database.getconn()
+    assert database.stats['timeouts'] == 1
@@ -0,0 +1,59 @@
+from crawl_scheduler import CrawlTask
+from deep_crawl import DeepCrawl, KnownRun, later_page, page_url
+
+URL = "https://www.linkedin.com/jobs/search/?keywords=php&pageNum=0"
+
+
+class FakeDriver:
+    def __init__(self, batches):
+        self.batches = batches
+        self.loaded = 1
+
+    def get(self, url):
+        self.loaded = 1
+
+    def execute_script(self, script, *args):
+        if args:
+            count = sum(self.batches[:self.loaded])
+            return [f"urn:li:jobPosting:{job_id}" for job_id in range(1, count + 1)]
+        return None
+
+    def find_elements(self, by, selector):
+        return []
+
+    @property
+    def page_source(self):
+        return "<html></html>"
+
+
+def known_after(cards):
+    known = KnownRun(None, 0)
+    for job_id in range(cards):
+        assert job_id not in known
+    return known
+
+
+def test_later_page():
+    assert not later_page(URL)
+    assert later_page(page_url(URL, 1))
+    assert not later_page(URL + "&start=0")
+
+
+def test_offset_crawl_follows_pages_until_exhausted():
+    deep = DeepCrawl(mode='offset', max_pages=10, stop_after_known=0)
+    task = CrawlTask('php', URL)
+    next_task = deep.next_task(task, known_after(25))
+    assert next_task.page == 1
+    assert later_page(next_task.url)
+    assert deep.next_task(next_task, known_after(0)) is None
+    assert deep.report()['searches'] == {'php': {'pages': 2, 'stopped': 'exhausted'}}
+
+
+def test_scrolled_search_is_recorded_once(monkeypatch):
+    monkeypatch.setattr('deep_crawl.wait_for_search_results', lambda driver: True)
+    deep = DeepCrawl(mode='scroll', max_pages=5, stop_after_known=0)
+    deep.scroll_page(FakeDriver([25]), "http://localhost:8000/jobs/search/?keywords=php&pageNum=0")
+    assert deep.next_task(CrawlTask('php', URL), known_after(25)) is None
+    report = deep.report()
+    assert report['searches'] == {'php': {'pages': 1, 'stopped': 'exhausted'}}
+    assert report['pages'] == 1
@@ -0,0 +1,140 @@
+from enrichment import EnrichmentQueue
+from enrichment_pipeline import EnrichmentPipeline, compare_detail_page
+from extractor import EXTRACTOR_VERSION
+from fingerprint import page_fingerprint, record_fingerprint
+from rate_controller import CircuitOpen
+
+
+# Stands in for EnrichmentQueue: hands out rows (id, link, page hash, record
+# hash) and records what the pipeline writes
+class FakeQueue:
+    def __init__(self, job_ids, batch_size=2):
+        self.rows = [(job_id, f"https://www.linkedin.com/jobs/view/{job_id}", None, None) for job_id in job_ids]
+        self.batch_size = batch_size
+        self.reparse = False
+        self.stats = {}
+        self.details = []
+        self.unchanged = []
+        self.failed = []
+        self.checkpoints = []
+        self.finished = False
+
+    def next_batch(self):
+        batch, self.rows = self.rows[:self.batch_size], self.rows[self.batch_size:]
+        return batch
+
+    def save_details(self, rows):
+        self.details.extend(job_id for job_id, _, _, _ in rows)
+
+    def mark_unchanged(self, rows):
+        self.unchanged.extend(job_id for job_id, _, _ in rows)
+
+    def mark_failed(self, job_ids):
+        self.failed.extend(job_ids)
+
+    def checkpoint(self, last_id):
+        self.checkpoints.append(last_id)
+
+    def finish(self):
+        self.finished = True
+
+
+class FakeConnection:
+    def commit(self):
+        pass
+
+
+def parse(html):
+    return {"JobDescription": html, "JobType": "Full-time", "Salary": "N/A"}
+
+
+def run(fetch, job_ids):
+    enrichment_queue = FakeQueue(job_ids)
+    pipeline = EnrichmentPipeline(fetch, parse, fetch_workers=2, parse_workers=1, queue_size=4)
+    pipeline.run(FakeConnection(), enrichment_queue)
+    return pipeline, enrichment_queue
+
+
+def test_pipeline_writes_every_row_and_finishes():
+    pipeline, enrichment_queue = run(lambda url: f"description of {url}", range(1, 8))
+    assert sorted(enrichment_queue.details) == list(range(1, 8))
+    assert enrichment_queue.checkpoints[-1] == 7
+    assert enrichment_queue.finished
+    assert pipeline.report()['stages']['write']['processed'] == 7
+
+
+def test_failed_fetches_are_marked_failed_and_passed_by_the_checkpoint():
+    def fetch(url):
+        if url.endswith("/1"):
+            raise RuntimeError("page gone")
+        return "description"
+
+    _, enrichment_queue = run(fetch, range(1, 6))
+    assert enrichment_queue.failed == [1]
+    assert sorted(enrichment_queue.details) == [2, 3, 4, 5]
+    assert enrichment_queue.checkpoints[-1] == 5
+    assert enrichment_queue.finished
+
+
+def test_open_circuit_stops_the_run_and_holds_the_checkpoint():
+    def fetch(url):
+        if int(url.rsplit("/", 1)[1]) >= 3:
+            raise CircuitOpen("Circuit open for www.linkedin.com")
+        return "description"
+
+    pipeline, enrichment_queue = run(fetch, range(1, 100))
+    assert pipeline.halted.is_set()
+    assert not enrichment_queue.finished
+    assert enrichment_queue.failed == []
+    assert max(enrichment_queue.checkpoints, default=0) <= 2
+    assert enrichment_queue.rows
+    assert pipeline.report()['halted']
+
+
+def test_compare_detail_page():
+    html = "<div class='description__text'>Build things</div>"
+    page_hash = page_fingerprint(html, EXTRACTOR_VERSION)
+    record_hash = record_fingerprint(parse(html))
+    assert compare_detail_page(parse, html, page_hash, None)['status'] == 'unchanged_page'
+    assert compare_detail_page(parse, html, page_hash, record_hash, reparse=True)['status'] == 'unchanged_record'
+    assert compare_detail_page(parse, html, page_fingerprint(html), record_hash)['status'] == 'unchanged_record'
+    changed = compare_detail_page(parse, html, None, None)
+    assert changed['status'] == 'changed' and changed['data'] == parse(html)
+
+
+class FakeCursor:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+def test_mark_failed_schedules_the_next_attempt(monkeypatch):
+    monkeypatch.setenv('ENRICH_RETRY_SECONDS', '60')
+    cursor = FakeCursor()
+    enrichment_queue = EnrichmentQueue(cursor, stale_days=3)
+    enrichment_queue.mark_failed([4, 5])
+    query, params = cursor.executed[-1]
+    assert 'enrich_attempts = enrich_attempts + 1' in query
+    assert params == {'status': 'failed', 'retry_seconds': 60.0, 'stale_days': 3, 'ids': [4, 5]}
+    assert enrichment_queue.stats['failed'] == 2
+
+
+def test_reparse_queue_ignores_the_checkpoint_and_uncached_rows():
+    rows = [(1, "cached", None, None), (2, "missing", None, None)]
+    cursor = FakeCursor(rows)
+    enrichment_queue = EnrichmentQueue(cursor, reparse=True, is_cached=lambda link: link == "cached")
+    assert cursor.executed == []
+    assert enrichment_queue.next_batch() == [rows[0]]
+    enrichment_queue.checkpoint(2)
+    enrichment_queue.finish()
+    assert all('enrichment_checkpoint' not in query for query, _ in cursor.executed)
@@ -0,0 +1,83 @@
+import pytest
+from extractor import STREAM_CHUNK_SIZE, StreamingCardParser, TreeCardParser, card_job_id, search_page_parser
+
+CARD = """
+<li>
+  <div class="base-card base-search-card job-search-card" data-entity-urn="urn:li:jobPosting:{job_id}">
+    <a class="base-card__full-link" href="https://www.linkedin.com/jobs/view/engineer-{job_id}?position={index}&amp;refId=abc">
+      <span class="sr-only">Engineer {index}</span>
+    </a>
+    <div class="base-search-card__info">
+      <h3 class="base-search-card__title">
+          Engineer {index}
+      </h3>
+      <h4 class="base-search-card__subtitle">
+        <a class="hidden-nested-link" href="https://www.linkedin.com/company/acme-{index}?trk=x">Acme {index}</a>
+      </h4>
+      <div class="base-search-card__metadata">
+        <span class="job-search-card__location">Remote</span>
+        <div class="compensation__salary">$100K - $120K</div>
+        <time class="job-search-card__listdate" datetime="2026-10-05">13 days ago</time>
+      </div>
+    </div>
+  </div>
+  <script>{padding}</script>
+</li>
+"""
+
+
+# Function to build a search results page of count cards, padded so the
+# streaming parser has to read it in several chunks
+def search_page(count, padding=400):
+    cards = "".join(CARD.format(job_id=4023000000 + index, index=index, padding="x" * padding)
+                    for index in range(count))
+    return ('<html><body><main><section class="two-pane-serp-page__results-list"><ul>'
+            f'{cards}</ul></section></main></body></html>')
+
+
+def test_streaming_parser_matches_tree_parser():
+    html = search_page(200)
+    assert len(html) > 2 * STREAM_CHUNK_SIZE
+    tree = TreeCardParser()
+    stream = StreamingCardParser()
+    tree_jobs = list(tree.iter_jobs(html))
+    stream_jobs = list(stream.iter_jobs(html))
+    assert len(tree_jobs) == 200
+    assert stream_jobs == tree_jobs
+    assert tree.section_found and stream.section_found
+
+
+def test_card_fields():
+    job = next(StreamingCardParser().iter_jobs(search_page(1)))
+    assert job["JobTitle"] == "Engineer 0"
+    assert job["CompanyName"] == "Acme 0"
+    assert job["JobLocation"] == "Remote"
+    assert job["JobPostedDate"] == "13 days ago"
+
+
+@pytest.mark.parametrize("parser", [TreeCardParser, StreamingCardParser])
+def test_parsers_skip_seen_jobs(parser):
+    html = search_page(10)
+    seen = {4023000000 + index for index in range(0, 10, 2)}
+    jobs = list(parser().iter_jobs(html, seen=seen))
+    assert [job["JobTitle"] for job in jobs] == [f"Engineer {index}" for index in range(1, 10, 2)]
+
+
+def test_card_job_id():
+    assert card_job_id({"data-entity-urn": "urn:li:jobPosting:4023652314"}) == 4023652314
+    assert card_job_id({"data-entity-urn": "urn:li:jobPosting:abc"}) is None
+    assert card_job_id({}) is None
+
+
+@pytest.mark.parametrize("parser", [TreeCardParser, StreamingCardParser])
+def test_parsers_report_a_missing_section(parser):
+    instance = parser()
+    assert list(instance.iter_jobs("<html><body><p>Sign in</p></body></html>")) == []
+    assert not instance.section_found
+
+
+def test_search_page_parser_modes():
+    assert isinstance(search_page_parser('stream'), StreamingCardParser)
+    assert isinstance(search_page_parser('tree'), TreeCardParser)
+    with pytest.raises(ValueError):
+        search_page_parser('regex')
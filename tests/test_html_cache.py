@@ -0,0 +1,81 @@
+import json
+import os
+import time
+import pytest
+from html_cache import BLOB_GRACE_SECONDS, HtmlCache, canonical_url
+
+URL = "https://www.linkedin.com/jobs/view/4023652314"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HtmlCache(str(tmp_path), max_mb=1, max_age_days=30, evict_seconds=0)
+
+
+# Function to make an entry and its blob look written seconds ago
+def age(cache, url, seconds):
+    entry = cache.get_entry(url)
+    entry['fetched_at'] -= seconds
+    cache._write_atomic(cache._entry_path(url), json.dumps(entry).encode('utf-8'))
+    blob_path = cache._blob_path(entry['content_hash'])
+    os.utime(blob_path, (time.time() - seconds, time.time() - seconds))
+    return blob_path
+
+
+def test_canonical_url_drops_tracking_parameters():
+    assert canonical_url(URL + "/?trk=x&refId=y&b=2&a=1#top") == canonical_url(URL + "?a=1&b=2")
+
+
+def test_put_and_get(cache):
+    assert cache.get(URL) is None
+    assert not cache.contains(URL)
+    cache.put(URL + "?trackingId=abc", "<html>job</html>", 'http')
+    assert cache.contains(URL)
+    assert cache.get(URL) == "<html>job</html>"
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+
+def test_identical_pages_share_a_blob(cache):
+    first = cache.put(URL, "<html>same</html>", 'http')
+    second = cache.put(URL + "1", "<html>same</html>", 'browser')
+    assert first['content_hash'] == second['content_hash']
+    assert sum(len(files) for _, _, files in os.walk(cache.blobs_dir)) == 1
+
+
+def test_evict_drops_expired_entries_and_their_blobs(cache):
+    cache.put(URL, "<html>old</html>", 'http')
+    cache.put(URL + "1", "<html>new</html>", 'http')
+    blob_path = age(cache, URL, 31 * 86400)
+    assert cache.evict()
+    assert not cache.contains(URL)
+    assert not os.path.exists(blob_path)
+    assert cache.get(URL + "1") == "<html>new</html>"
+    assert cache.stats['evicted'] == 1
+
+
+def test_evict_keeps_recent_unreferenced_blobs(cache):
+    entry = cache.put(URL, "<html>job</html>", 'http')
+    os.remove(cache._entry_path(URL))
+    blob_path = cache._blob_path(entry['content_hash'])
+    cache.evict()
+    assert os.path.exists(blob_path)
+
+    os.utime(blob_path, (time.time() - BLOB_GRACE_SECONDS - 1,) * 2)
+    cache.evict()
+    assert not os.path.exists(blob_path)
+
+
+def test_evict_tolerates_files_removed_meanwhile(cache, monkeypatch):
+    cache.put(URL, "<html>old</html>", 'http')
+    age(cache, URL, 31 * 86400)
+    entries = list(cache._entries())
+    os.remove(entries[0][0])
+    monkeypatch.setattr(cache, '_entries', lambda: iter(entries))
+    assert cache.evict()
+    assert cache.stats['evicted'] == 0
+
+
+def test_evict_runs_at_most_every_evict_seconds(tmp_path):
+    cache = HtmlCache(str(tmp_path), evict_seconds=3600)
+    assert cache.evict()
+    assert not cache.evict()
@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime, timezone
+from job_fields import company_key, parse_posted_at, parse_salary, remote_search
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$120,000.00/yr - $150,000.00/yr", (120000.0, 150000.0, 'USD', 'year')),
+    ("CA$90,000.00/yr - CA$110,000.00/yr", (90000.0, 110000.0, 'CAD', 'year')),
+    ("€50K - €70K", (50000.0, 70000.0, 'EUR', 'year')),
+    ("$50K - 70K a year", (50000.0, 70000.0, 'USD', 'year')),
+    ("USD 80,000 to 90,000", (80000.0, 90000.0, 'USD', 'year')),
+    ("$40.00/hr - $55.00/hr", (40.0, 55.0, 'USD', 'hour')),
+    ("$5,000/month", (5000.0, 5000.0, 'USD', 'month')),
+    ("50,000 - 70,000", (50000.0, 70000.0, None, 'year')),
+    ("15 - 20 per hour", (15.0, 20.0, None, 'hour')),
+])
+def test_parse_salary(text, expected):
+    assert parse_salary(text) == expected
+
+
+def test_parse_salary_skips_numbers_before_the_amount():
+    assert parse_salary("401(k) plus $100K") == (100000.0, 100000.0, 'USD', 'year')
+
+
+@pytest.mark.parametrize("text", [
+    "From 2 years experience",
+    "2-3 years experience",
+    "401(k) matching",
+    "Competitive",
+    "N/A",
+    "",
+    None,
+])
+def test_parse_salary_without_a_salary(text):
+    assert parse_salary(text) == (None, None, None, None)
+
+
+NOW = datetime(2026, 10, 18, 15, 42, 7, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("text, posted_on, expected", [
+    ("2 days ago", "2026-10-15", datetime(2026, 10, 15, tzinfo=timezone.utc)),
+    ("2 days ago", None, datetime(2026, 10, 16, tzinfo=timezone.utc)),
+    ("3 hours ago", None, datetime(2026, 10, 18, 12, tzinfo=timezone.utc)),
+    ("30 minutes ago", None, datetime(2026, 10, 18, 15, tzinfo=timezone.utc)),
+    ("1 week ago", "N/A", datetime(2026, 10, 11, tzinfo=timezone.utc)),
+    ("Reposted 2 weeks ago", "not a date", datetime(2026, 10, 4, tzinfo=timezone.utc)),
+    ("1 month ago", None, datetime(2026, 9, 18, tzinfo=timezone.utc)),
+    ("30+ days ago", None, datetime(2026, 9, 18, tzinfo=timezone.utc)),
+    ("Just now", None, None),
+    ("N/A", "N/A", None),
+    (None, None, None),
+])
+def test_parse_posted_at(text, posted_on, expected):
+    assert parse_posted_at(text, posted_on, now=NOW) == expected
+
+
+def test_parse_posted_at_is_stable_within_the_hour():
+    later = NOW.replace(minute=59)
+    assert parse_posted_at("5 hours ago", now=NOW) == parse_posted_at("5 hours ago", now=later)
+
+
+def test_remote_search():
+    assert remote_search("https://www.linkedin.com/jobs/search/?f_WT=2&keywords=php")
+    assert remote_search("https://www.linkedin.com/jobs/search/?f_WT=1%2C2")
+    assert not remote_search("https://www.linkedin.com/jobs/search/?f_WT=1&keywords=php")
+    assert not remote_search(None)
+
+
+def test_company_key():
+    assert company_key("Acme", "https://www.linkedin.com/company/Acme/?trk=x") == "https://www.linkedin.com/company/acme"
+    assert company_key("  Acme   Corp ", None) == "name:acme corp"
+    assert company_key("N/A", "N/A") is None
@@ -0,0 +1,39 @@
+import pytest
+from job_search import like_pattern, normalize_search, parse_search_query
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("php developer", "php & developer"),
+    ("react   developer", "react & developer"),
+    ('"full stack" OR react', "(full <-> stack) | react"),
+    ("node.js -php", "(node <-> js) & !php"),
+    ("dev*", "dev:*"),
+    ("php OR", "php"),
+    ("", None),
+    ("  ", None),
+    ("-", None),
+])
+def test_parse_search_query(text, expected):
+    assert parse_search_query(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("php developer", "%php developer%"),
+    ("  react   developer ", "%react developer%"),
+    ("100%_x", "%100\\%\\_x%"),
+    ("larav", "%larav%"),
+    ("ab", None),
+    ('"full stack"', None),
+    ("dev*", None),
+    ("php OR react", None),
+    ("react -php", None),
+])
+def test_like_pattern(text, expected):
+    assert like_pattern(text) == expected
+
+
+def test_texts_with_the_same_cache_key_search_alike():
+    first, second = "react developer", " react \t developer  "
+    assert normalize_search(first) == normalize_search(second)
+    assert parse_search_query(first) == parse_search_query(second)
+    assert like_pattern(first) == like_pattern(second)
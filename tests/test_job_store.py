@@ -0,0 +1,53 @@
+import pytest
+import job_store
+from job_store import canonical_job_id, canonical_job_link, upsert_jobs
+
+
+@pytest.mark.parametrize("link, expected", [
+    ("https://www.linkedin.com/jobs/view/4023652314", 4023652314),
+    ("https://www.linkedin.com/jobs/view/senior-php-developer-at-acme-4023652314?refId=abc&trk=x", 4023652314),
+    ("https://www.linkedin.com/jobs/view/4023652314/?position=3", 4023652314),
+    ("https://www.linkedin.com/jobs/search/?currentJobId=4023652314&keywords=php", 4023652314),
+    ("https://www.linkedin.com/company/acme", None),
+    ("N/A", None),
+    ("", None),
+    (None, None),
+])
+def test_canonical_job_id(link, expected):
+    assert canonical_job_id(link) == expected
+
+
+def test_canonical_job_link_strips_tracking_parameters():
+    link = "https://www.linkedin.com/jobs/view/php-developer-4023652314?refId=abc&trackingId=def&position=1"
+    assert canonical_job_link(link) == "https://www.linkedin.com/jobs/view/php-developer-4023652314"
+    assert canonical_job_link("https://www.linkedin.com/company/acme?trk=x") == \
+        "https://www.linkedin.com/company/acme?trk=x"
+
+
+def test_upsert_jobs_counts_after_dedup(monkeypatch):
+    written = []
+
+    # Stands in for the upsert: the first job is new, the second changed and
+    # the third unchanged, so no row comes back for it
+    def execute_values(cursor, query, rows, page_size=None, fetch=False):
+        written.extend(rows)
+        return [(True,), (False,)]
+
+    monkeypatch.setattr(job_store, 'execute_values', execute_values)
+    monkeypatch.setattr(job_store, 'upsert_companies', lambda cursor, jobs: {})
+    jobs = [
+        {"JobLink": "https://www.linkedin.com/jobs/view/1?refId=a", "JobTitle": "First"},
+        {"JobLink": "https://www.linkedin.com/jobs/view/2", "JobTitle": "Second"},
+        {"JobLink": "https://www.linkedin.com/jobs/view/3", "JobTitle": "Third"},
+        {"JobLink": "https://www.linkedin.com/jobs/view/1?refId=b", "JobTitle": "First again"},
+        {"JobLink": "N/A", "JobTitle": "No link"},
+    ]
+    counts = upsert_jobs(None, jobs)
+    assert counts == {'inserted': 1, 'updated': 1, 'unchanged': 1, 'rejected': 1}
+    assert [row[0] for row in written] == [1, 2, 3]
+
+
+def test_upsert_jobs_without_job_ids_writes_nothing(monkeypatch):
+    monkeypatch.setattr(job_store, 'execute_values', lambda *args, **kwargs: pytest.fail("nothing to write"))
+    counts = upsert_jobs(None, [{"JobLink": "N/A"}, {"JobLink": None}])
+    assert counts == {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 2}
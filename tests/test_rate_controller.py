@@ -0,0 +1,189 @@
+import pytest
+import rate_controller
+from http_fetcher import PageFetcher
+from rate_controller import CircuitBreaker, CircuitOpen, FetchError, RateController, Throttled, TokenBucket
+
+URL = "https://www.linkedin.com/jobs/search/?keywords=php"
+
+
+# Stands in for the time module: sleeping advances the clock
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.delenv('HTML_CACHE_DIR', raising=False)
+    monkeypatch.setattr(rate_controller, 'time', fake)
+    return fake
+
+
+def controller(**kwargs):
+    settings = dict(rate=1.0, burst=2, min_rate=0.1, max_rate=5.0, concurrency=2, max_concurrency=8,
+                    latency_target=5, retries=3, backoff_seconds=2, max_backoff_seconds=60, failure_threshold=5,
+                    reset_seconds=120)
+    settings.update(kwargs)
+    return RateController(**settings)
+
+
+# Answers every request with the same status code
+class StubSession:
+    def __init__(self, status_code, headers=None, text=""):
+        self.response = type('Response', (), {'status_code': status_code, 'headers': headers or {}, 'text': text})
+        self.requests = 0
+
+    def get(self, url, timeout=None):
+        self.requests += 1
+        return self.response
+
+    def close(self):
+        pass
+
+
+def test_token_bucket_paces_after_the_burst(clock):
+    bucket = TokenBucket(rate=2.0, burst=2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    assert bucket.acquire() == 0.0
+    assert bucket.tokens == pytest.approx(1.0)
+
+
+def test_circuit_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    breaker.failed()
+    assert breaker.allow()
+    breaker.failed()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.retry_in() == 10
+
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+    breaker.failed()
+    assert breaker.state == 'open'
+    assert breaker.opens == 2
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.succeeded()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+
+
+def test_host_limiter_increases_additively_and_halves(clock):
+    limiter = controller().host(URL)
+    limiter.succeeded(0.1)
+    assert limiter.limit == pytest.approx(2.5)
+    assert limiter.bucket.rate == pytest.approx(1.1)
+
+    limiter.failed(FetchError("HTTP 503"))
+    assert limiter.limit == pytest.approx(1.25)
+    assert limiter.bucket.rate == pytest.approx(0.55)
+
+    # A burst of failures within the cooldown counts once
+    limiter.failed(Throttled("HTTP 429"))
+    assert limiter.limit == pytest.approx(1.25)
+    clock.now += 1
+    limiter.succeeded(6.0)
+    assert limiter.limit == 1.0
+    assert limiter.bucket.rate == pytest.approx(0.275)
+    assert limiter.report()['slow'] == 1
+
+
+def test_call_honours_retry_after(clock):
+    answers = [Throttled("HTTP 429", retry_after=7), "<html></html>"]
+
+    def fetch(url):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    rates = controller()
+    assert rates.call(URL, fetch) == "<html></html>"
+    assert clock.sleeps[-1] == 7
+    stats = rates.host(URL).report()
+    assert (stats['throttled'], stats['retries'], stats['succeeded']) == (1, 1, 1)
+
+
+def test_retry_after_is_capped(clock):
+    assert controller(max_backoff_seconds=60).backoff(0, Throttled("HTTP 429", retry_after=600)) == 60
+
+
+def test_call_gives_up_and_opens_the_circuit(clock):
+    calls = []
+
+    def fetch(url):
+        calls.append(url)
+        raise FetchError("HTTP 503")
+
+    rates = controller(retries=2, failure_threshold=3)
+    with pytest.raises(FetchError):
+        rates.call(URL, fetch)
+    assert len(calls) == 3
+    with pytest.raises(CircuitOpen):
+        rates.call(URL, fetch)
+    assert len(calls) == 3
+
+
+def test_other_errors_pass_through_without_counting(clock):
+    def fetch(url):
+        raise KeyError(url)
+
+    rates = controller()
+    with pytest.raises(KeyError):
+        rates.call(URL, fetch)
+    assert rates.host(URL).report()['failed'] == 0
+
+
+def test_fetcher_raises_throttled_after_429_retries(clock):
+    rates = controller(retries=2)
+    fetcher = PageFetcher(lambda url: pytest.fail("no browser fallback"), "results", mode='http',
+                          controller=rates)
+    fetcher.session = StubSession(429, {'Retry-After': '30'})
+    with pytest.raises(Throttled):
+        fetcher(URL)
+    assert fetcher.session.requests == 3
+    assert clock.sleeps == [30, 30]
+
+
+def test_fetcher_falls_back_to_the_browser_once(clock):
+    browser_calls = []
+
+    def browser_fetch(url):
+        browser_calls.append(url)
+        raise RuntimeError("tab crashed")
+
+    rates = controller(retries=3, failure_threshold=100)
+    fetcher = PageFetcher(browser_fetch, "results", mode='http', controller=rates)
+    fetcher.session = StubSession(503)
+    with pytest.raises(FetchError):
+        fetcher(URL)
+    assert fetcher.session.requests == 4
+    assert len(browser_calls) == 1
+    assert rates.host(URL).report()['failed'] == 5
+
+
+def test_fetcher_returns_later_pages_without_the_marker(clock):
+    fetcher = PageFetcher(lambda url: "<html>No more jobs</html>", "results", mode='browser',
+                          controller=controller(retries=0), marker_optional=lambda url: 'start=' in url)
+    assert fetcher(URL + "&start=25") == "<html>No more jobs</html>"
+    with pytest.raises(FetchError):
+        fetcher(URL)
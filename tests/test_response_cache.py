@@ -0,0 +1,102 @@
+import pytest
+import response_cache
+from response_cache import CHANNEL, ResponseCache, bump_generation
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeCursor:
+    def __init__(self, generation):
+        self.generation = generation
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchone(self):
+        return (self.generation,)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(response_cache, 'time', clock)
+    return clock
+
+
+# A cache whose listener counts as started and which is at generation 1
+def cache(monkeypatch, **kwargs):
+    monkeypatch.setenv('RESPONSE_CACHE', 'on')
+    cache = ResponseCache('jobs', {}, **kwargs)
+    cache._listener = object()
+    cache._set_generation(1)
+    return cache
+
+
+def test_new_generation_invalidates_entries(monkeypatch, clock):
+    jobs = cache(monkeypatch)
+    jobs.put('page-1', ['job'], generation=1)
+    assert jobs.get('page-1') == ['job']
+    jobs._set_generation(2)
+    assert jobs.get('page-1') is None
+    assert jobs.report()['entries'] == 0
+    assert jobs.stats['generations'] == 2
+
+
+def test_value_computed_at_an_older_generation_is_dropped(monkeypatch, clock):
+    jobs = cache(monkeypatch)
+    jobs._set_generation(2)
+    jobs.put('page-1', ['stale'], generation=1)
+    assert jobs.get('page-1') is None
+
+
+def test_cache_is_bypassed_while_the_listener_is_disconnected(monkeypatch, clock):
+    jobs = cache(monkeypatch)
+    jobs.put('page-1', ['job'], generation=1)
+    jobs._set_generation(None)
+    assert jobs.get('page-1') is None
+    jobs.put('page-1', ['job'], generation=None)
+    assert jobs.stats['bypassed'] == 1
+    assert jobs.report()['entries'] == 0
+
+
+def test_entries_expire_after_the_ttl(monkeypatch, clock):
+    jobs = cache(monkeypatch, ttl_seconds=60)
+    jobs.put('page-1', ['job'], generation=1)
+    clock.now += 59
+    assert jobs.get('page-1') == ['job']
+    clock.now += 1
+    assert jobs.get('page-1') is None
+    assert jobs.stats['expired'] == 1
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch, clock):
+    jobs = cache(monkeypatch, max_entries=2)
+    jobs.put('a', 1, generation=1)
+    jobs.put('b', 2, generation=1)
+    assert jobs.get('a') == 1
+    jobs.put('c', 3, generation=1)
+    assert jobs.get('b') is None
+    assert (jobs.get('a'), jobs.get('c')) == (1, 3)
+    assert jobs.stats['evicted'] == 1
+
+
+def test_disabled_cache_stores_nothing(monkeypatch, clock):
+    monkeypatch.setenv('RESPONSE_CACHE', 'off')
+    jobs = ResponseCache('jobs', {})
+    jobs.put('page-1', ['job'], generation=None)
+    assert jobs.get('page-1') is None
+    assert jobs._listener is None
+
+
+def test_bump_generation_notifies_listeners():
+    cursor = FakeCursor(generation=5)
+    assert bump_generation(cursor) == 5
+    assert cursor.executed[0][1] == ('jobs',)
+    assert cursor.executed[1] == ("SELECT pg_notify(%s, %s)", (CHANNEL, 'jobs:5'))
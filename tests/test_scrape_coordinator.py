@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+import scrape_coordinator
+from scrape_coordinator import REQUEST_LOCK_QUERY, RECENT_RUN_QUERY, REQUEST_RUN_QUERY, ScrapeCoordinator
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakePool:
+    def __init__(self, cursor):
+        self.conn = FakeConnection(cursor)
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+def coordinator(monkeypatch, rows):
+    cursor = FakeCursor(rows)
+    pool = FakePool(cursor)
+    monkeypatch.setattr(scrape_coordinator, 'get_pool', lambda: pool)
+    monkeypatch.setattr(ScrapeCoordinator, 'drain', lambda self: None)
+    return ScrapeCoordinator('jobs', run=None), cursor, pool.conn
+
+
+def test_request_checks_recent_runs_under_the_request_lock(monkeypatch):
+    coord, cursor, conn = coordinator(monkeypatch, [None, (12,)])
+    assert coord.request({'fetch_mode': 'http'}, skip_recent_seconds=300) == 12
+    assert [query for query, _ in cursor.executed] == [REQUEST_LOCK_QUERY, RECENT_RUN_QUERY, REQUEST_RUN_QUERY]
+    assert cursor.executed[0][1] == ('scrape-request:jobs',)
+    assert cursor.executed[2][1] == ('jobs', '{"fetch_mode": "http"}')
+    assert conn.commits == 1
+
+
+def test_request_returns_a_recent_run(monkeypatch):
+    coord, cursor, conn = coordinator(monkeypatch, [(9,)])
+    assert coord.request(skip_recent_seconds=300) == 9
+    assert [query for query, _ in cursor.executed] == [REQUEST_LOCK_QUERY, RECENT_RUN_QUERY]
+    assert conn.commits == 0
+
+
+def test_request_without_skip_takes_no_lock(monkeypatch):
+    coord, cursor, conn = coordinator(monkeypatch, [(3,)])
+    assert coord.request() == 3
+    assert [query for query, _ in cursor.executed] == [REQUEST_RUN_QUERY]
@@ -0,0 +1,64 @@
+import pytest
+from seen_index import SeenIndex
+
+
+@pytest.fixture(params=['exact', 'bloom'])
+def mode(request, monkeypatch):
+    monkeypatch.setenv('SEEN_BLOOM_CAPACITY', '10000')
+    monkeypatch.setenv('SEEN_BLOOM_ERROR_RATE', '0.001')
+    return request.param
+
+
+def test_added_ids_are_seen(tmp_path, mode):
+    seen = SeenIndex('jobs', mode=mode, path=str(tmp_path / 'jobs.idx'))
+    seen.add(4023652314)
+    seen.add(None)
+    assert 4023652314 in seen
+    assert 4023652315 not in seen
+    assert None not in seen
+    assert len(seen) == 1
+    assert seen.hits == 1
+
+
+def test_saved_ids_are_loaded(tmp_path, mode):
+    path = str(tmp_path / 'jobs.idx')
+    seen = SeenIndex('jobs', mode=mode, path=path)
+    for job_id in range(1000, 1100):
+        seen.add(job_id)
+    seen.save()
+
+    loaded = SeenIndex('jobs', mode=mode, path=path)
+    assert all(job_id in loaded for job_id in range(1000, 1100))
+    assert len(loaded) == 100
+
+
+def test_save_merges_what_others_saved(tmp_path, mode):
+    path = str(tmp_path / 'jobs.idx')
+    first = SeenIndex('jobs', mode=mode, path=path)
+    second = SeenIndex('jobs', mode=mode, path=path)
+    first.add(1)
+    second.add(2)
+    first.save()
+    second.save()
+
+    merged = SeenIndex('jobs', mode=mode, path=path)
+    assert 1 in merged and 2 in merged
+    assert len(merged) == 2
+
+
+def test_index_of_another_mode_starts_empty(tmp_path, monkeypatch):
+    monkeypatch.setenv('SEEN_BLOOM_CAPACITY', '10000')
+    path = str(tmp_path / 'jobs.idx')
+    exact = SeenIndex('jobs', mode='exact', path=path)
+    exact.add(1)
+    exact.save()
+    assert len(SeenIndex('jobs', mode='bloom', path=path)) == 0
+
+
+def test_off_mode_sees_nothing_and_saves_nothing(tmp_path):
+    path = tmp_path / 'jobs.idx'
+    seen = SeenIndex('jobs', mode='off', path=str(path))
+    seen.add(1)
+    assert 1 not in seen
+    seen.save()
+    assert not path.exists()
@@ -0,0 +1,115 @@
+import time
+from contextlib import contextmanager
+import work_queue
+from crawl_scheduler import CrawlTask
+from work_queue import LeaseKeeper, WorkQueue
+
+
+class FakeCursor:
+    def __init__(self, rows=(), rowcount=1):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakePool:
+    def __init__(self, cursor):
+        self.conn = FakeConnection(cursor)
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+
+def item(item_id=7, attempts=1, kind='detail'):
+    return {'id': item_id, 'kind': kind, 'url': 'https://www.linkedin.com/jobs/view/1', 'attempts': attempts,
+            'priority': 50}
+
+
+def queue(cursor, **kwargs):
+    return WorkQueue(cursor, worker='host:1', lease_seconds=600, max_attempts=3, retry_seconds=60,
+                     requeue_after=1800, **kwargs)
+
+
+def test_claim_leases_items_highest_priority_first():
+    rows = [(2, 'detail', 'u2', None, None, 11, 50, 1, 3), (1, 'search', 'u1', 'php', 0, None, 100, 1, 3)]
+    cursor = FakeCursor(rows)
+    items = queue(cursor).claim(['search', 'detail'], limit=2)
+    assert [claimed['id'] for claimed in items] == [1, 2]
+    assert items[0]['keyword'] == 'php'
+    _, params = cursor.executed[-1]
+    assert params == {'worker': 'host:1', 'lease_seconds': 600, 'kinds': ['search', 'detail'], 'limit': 2}
+
+
+def test_fail_backs_off_per_attempt():
+    cursor = FakeCursor([('queued',)])
+    assert queue(cursor).fail(item(attempts=3), ValueError("x" * 2000)) == 'queued'
+    _, (delay, error, item_id, worker) = cursor.executed[-1]
+    assert delay == 240
+    assert len(error) == 1000
+    assert (item_id, worker) == (7, 'host:1')
+
+
+def test_fail_of_a_lost_lease_returns_none():
+    assert queue(FakeCursor([])).fail(item(), ValueError("gone")) is None
+
+
+def test_extend_complete_and_reclaim_report_rowcounts():
+    assert queue(FakeCursor(rowcount=1)).extend(item())
+    assert not queue(FakeCursor(rowcount=0)).complete(item())
+    assert queue(FakeCursor(rowcount=4)).reclaim() == 4
+    assert queue(FakeCursor()).release([]) == 0
+
+
+def test_seed_queues_searches_and_details(monkeypatch):
+    cursor = FakeCursor(rowcount=3)
+    monkeypatch.setattr(work_queue, 'execute_values', lambda cursor, query, values, page_size=None: None)
+    counts = queue(cursor).seed([CrawlTask('php', 'https://www.linkedin.com/jobs/search/?keywords=php')])
+    assert counts == {'searches': 3, 'details': 3}
+    assert queue(cursor).enqueue_details(job_ids=[]) == 0
+
+
+def test_lease_keeper_extends_while_the_item_runs(monkeypatch):
+    cursor = FakeCursor(rowcount=1)
+    pool = FakePool(cursor)
+    monkeypatch.setattr(work_queue, 'get_pool', lambda: pool)
+    with LeaseKeeper(queue(FakeCursor()), item(), interval=0.01) as lease:
+        time.sleep(0.1)
+    assert not lease.lost.is_set()
+    assert pool.conn.commits >= 2
+    assert all(params == (600, 7, 'host:1') for _, params in cursor.executed)
+
+
+def test_lease_keeper_notices_a_lost_lease(monkeypatch):
+    pool = FakePool(FakeCursor(rowcount=0))
+    monkeypatch.setattr(work_queue, 'get_pool', lambda: pool)
+    with LeaseKeeper(queue(FakeCursor()), item(), interval=0.01) as lease:
+        assert lease.lost.wait(1)
+    assert pool.conn.commits == 1
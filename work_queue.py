@@ -0,0 +1,311 @@
+import os
+import socket
+import threading
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from db_pool import get_pool
+
+# Load environment variables from .env file
+load_dotenv()
+
+KIND_SEARCH = 'search'
+KIND_DETAIL = 'detail'
+WORK_KINDS = (KIND_SEARCH, KIND_DETAIL)
+
+STATUS_QUEUED = 'queued'
+STATUS_LEASED = 'leased'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Searches come before details, first result pages before deeper ones and
+# jobs never enriched before stale ones
+PRIORITY_SEARCH = 100
+PRIORITY_NEW_DETAIL = 50
+PRIORITY_STALE_DETAIL = 10
+
+# An item already queued or leased keeps its place; a finished one is queued
+# again once it finished more than {requeue_after} seconds ago, so every
+# scheduler firing at once queues a search only once
+REQUEUE_SET = f"""
+SET status = '{STATUS_QUEUED}', priority = EXCLUDED.priority, max_attempts = EXCLUDED.max_attempts,
+    attempts = 0, available_at = now(), lease_expires_at = NULL, last_error = NULL, finished_at = NULL
+WHERE work_queue.status IN ('{STATUS_DONE}', '{STATUS_FAILED}')
+  AND work_queue.finished_at < now() - make_interval(secs => {{requeue_after}})
+"""
+
+ENQUEUE_QUERY = """
+INSERT INTO work_queue (kind, url, keyword, page, priority, max_attempts) VALUES %s
+ON CONFLICT (kind, url) DO UPDATE""" + REQUEUE_SET
+
+# Rows without details, or with details older than stale_days, that are not
+# waiting for their next attempt after a failure or given up
+ENQUEUE_DETAILS_QUERY = f"""
+INSERT INTO work_queue (kind, url, job_id, priority, max_attempts)
+SELECT DISTINCT ON (job_link) '{KIND_DETAIL}', job_link, id,
+       CASE WHEN enriched_at IS NULL THEN {PRIORITY_NEW_DETAIL} ELSE {PRIORITY_STALE_DETAIL} END, %(max_attempts)s
+FROM linkedin
+WHERE job_link IS NOT NULL
+  AND (enriched_at IS NULL OR enriched_at < now() - make_interval(days => %(stale_days)s))
+  AND enrich_attempts < %(max_enrich_attempts)s AND (next_attempt_at IS NULL OR next_attempt_at <= now()){{only}}
+ORDER BY job_link, id
+ON CONFLICT (kind, url) DO UPDATE""" + REQUEUE_SET
+
+CLAIM_COLUMNS = ['id', 'kind', 'url', 'keyword', 'page', 'job_id', 'priority', 'attempts', 'max_attempts']
+
+# Concurrent workers skip the rows another worker is claiming instead of
+# waiting for it, so each item is leased by one worker at a time
+CLAIM_QUERY = f"""
+UPDATE work_queue
+SET status = '{STATUS_LEASED}', worker = %(worker)s, attempts = attempts + 1,
+    lease_expires_at = now() + make_interval(secs => %(lease_seconds)s)
+WHERE id IN (
+    SELECT id FROM work_queue
+    WHERE status = '{STATUS_QUEUED}' AND available_at <= now() AND kind = ANY(%(kinds)s)
+    ORDER BY priority DESC, available_at, id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING {', '.join(CLAIM_COLUMNS)}
+"""
+
+EXTEND_LEASE_QUERY = f"""
+UPDATE work_queue SET lease_expires_at = now() + make_interval(secs => %s)
+WHERE id = %s AND worker = %s AND status = '{STATUS_LEASED}'
+"""
+
+COMPLETE_QUERY = f"""
+UPDATE work_queue SET status = '{STATUS_DONE}', finished_at = now(), lease_expires_at = NULL, last_error = NULL
+WHERE id = %s AND worker = %s AND status = '{STATUS_LEASED}'
+"""
+
+# A failed item is retried after a delay until it used up max_attempts
+FAIL_QUERY = f"""
+UPDATE work_queue
+SET status = CASE WHEN attempts >= max_attempts THEN '{STATUS_FAILED}' ELSE '{STATUS_QUEUED}' END,
+    finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+    available_at = now() + make_interval(secs => %s), lease_expires_at = NULL, last_error = %s
+WHERE id = %s AND worker = %s AND status = '{STATUS_LEASED}'
+RETURNING status
+"""
+
+# Hands leased items back without counting the attempt
+RELEASE_QUERY = f"""
+UPDATE work_queue
+SET status = '{STATUS_QUEUED}', attempts = attempts - 1, lease_expires_at = NULL,
+    available_at = now() + make_interval(secs => %s)
+WHERE id = ANY(%s) AND worker = %s AND status = '{STATUS_LEASED}'
+"""
+
+# Leases of workers that died or hung; the claim already counted the attempt
+RECLAIM_QUERY = f"""
+UPDATE work_queue
+SET status = CASE WHEN attempts >= max_attempts THEN '{STATUS_FAILED}' ELSE '{STATUS_QUEUED}' END,
+    finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+    available_at = now(), lease_expires_at = NULL, last_error = 'lease expired'
+WHERE id IN (
+    SELECT id FROM work_queue
+    WHERE status = '{STATUS_LEASED}' AND lease_expires_at < now()
+    FOR UPDATE SKIP LOCKED
+)
+"""
+
+REGISTER_WORKER_QUERY = """
+INSERT INTO work_queue_workers (id, host, pid, kinds) VALUES (%s, %s, %s, %s)
+ON CONFLICT (id) DO UPDATE
+SET host = EXCLUDED.host, pid = EXCLUDED.pid, kinds = EXCLUDED.kinds, started_at = now(), heartbeat_at = now(),
+    stopped_at = NULL, done = 0, failed = 0, retried = 0, busy_seconds = 0
+"""
+
+HEARTBEAT_QUERY = """
+UPDATE work_queue_workers
+SET heartbeat_at = now(), done = %s, failed = %s, retried = %s, busy_seconds = %s
+WHERE id = %s
+"""
+
+STOP_WORKER_QUERY = "UPDATE work_queue_workers SET stopped_at = now() WHERE id = %s"
+
+QUEUE_STATUS_QUERY = f"""
+SELECT kind, status, count(*) AS items,
+       min(available_at) FILTER (WHERE status = '{STATUS_QUEUED}') AS oldest_available_at
+FROM work_queue
+GROUP BY kind, status
+ORDER BY kind, status
+"""
+
+# Throughput of every worker that is running or stopped within the window:
+# items done per minute since it started and the share of that time spent
+# on items. A running worker is alive while its heartbeat is recent.
+WORKER_STATUS_QUERY = f"""
+SELECT w.id, w.host, w.pid, w.kinds, w.started_at, w.heartbeat_at, w.stopped_at, w.done, w.failed, w.retried,
+       (w.done / GREATEST(extract(epoch FROM w.heartbeat_at - w.started_at), 1) * 60)::float8 AS per_minute,
+       (w.busy_seconds / GREATEST(extract(epoch FROM w.heartbeat_at - w.started_at), 1))::float8 AS busy_share,
+       (SELECT count(*) FROM work_queue q WHERE q.worker = w.id AND q.status = '{STATUS_LEASED}') AS leased,
+       w.stopped_at IS NULL AND w.heartbeat_at > now() - make_interval(secs => %(stale_seconds)s) AS alive
+FROM work_queue_workers w
+WHERE w.stopped_at IS NULL OR w.stopped_at > now() - make_interval(secs => %(window_seconds)s)
+ORDER BY w.id
+"""
+
+
+# Function to name this worker process: WORKER_ID, or host and process id
+def worker_id():
+    return os.getenv('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+
+
+# Search and detail URLs shared by the crawl workers of every machine.
+# Items are leased for WORK_LEASE_SECONDS; a worker that dies loses its
+# leases to reclaim(). Failed items are retried after WORK_RETRY_SECONDS,
+# doubled per attempt, up to WORK_MAX_ATTEMPTS attempts. Statements run on
+# the given cursor; the caller commits.
+class WorkQueue:
+    def __init__(self, cursor, worker=None, lease_seconds=None, max_attempts=None, retry_seconds=None,
+                 requeue_after=None):
+        self.cursor = cursor
+        self.worker = worker or worker_id()
+        self.lease_seconds = lease_seconds or float(os.getenv('WORK_LEASE_SECONDS', 600))
+        self.max_attempts = max_attempts or int(os.getenv('WORK_MAX_ATTEMPTS', 3))
+        self.retry_seconds = retry_seconds or float(os.getenv('WORK_RETRY_SECONDS', 60))
+        if requeue_after is None:
+            requeue_after = float(os.getenv('WORK_REQUEUE_AFTER_SECONDS', 1800))
+        self.requeue_after = requeue_after
+
+    # Function to queue the searches of crawl tasks. Returns the number of
+    # items queued or queued again.
+    def enqueue_searches(self, tasks):
+        values = [(KIND_SEARCH, task.url, task.keyword, task.page, PRIORITY_SEARCH - task.page, self.max_attempts)
+                  for task in tasks]
+        if not values:
+            return 0
+        execute_values(self.cursor, ENQUEUE_QUERY.format(requeue_after=float(self.requeue_after)), values,
+                       page_size=len(values))
+        return self.cursor.rowcount
+
+    # Function to queue the detail pages of jobs that need enriching, only
+    # those with the given LinkedIn job IDs when job_ids is not None
+    def enqueue_details(self, stale_days=None, job_ids=None):
+        if job_ids is not None and not job_ids:
+            return 0
+        only = "\n  AND linkedin_job_id = ANY(%(job_ids)s)" if job_ids is not None else ""
+        query = ENQUEUE_DETAILS_QUERY.format(only=only, requeue_after=float(self.requeue_after))
+        self.cursor.execute(query, {
+            'max_attempts': self.max_attempts,
+            'stale_days': stale_days or int(os.getenv('ENRICH_STALE_DAYS', 7)),
+            'max_enrich_attempts': int(os.getenv('ENRICH_MAX_ATTEMPTS', 5)),
+            'job_ids': list(job_ids or []),
+        })
+        return self.cursor.rowcount
+
+    # Function to queue the keyword searches of a scheduled run and every
+    # job whose details are missing or stale
+    def seed(self, tasks):
+        return {'searches': self.enqueue_searches(tasks), 'details': self.enqueue_details()}
+
+    # Function to lease up to limit items of kinds, highest priority first
+    def claim(self, kinds, limit=1):
+        self.cursor.execute(CLAIM_QUERY, {'worker': self.worker, 'lease_seconds': self.lease_seconds,
+                                          'kinds': list(kinds), 'limit': limit})
+        items = [dict(zip(CLAIM_COLUMNS, row)) for row in self.cursor.fetchall()]
+        return sorted(items, key=lambda item: (-item['priority'], item['id']))
+
+    # Renews the lease of an item before working on it; False when the
+    # lease expired and the item was reclaimed
+    def extend(self, item):
+        self.cursor.execute(EXTEND_LEASE_QUERY, (self.lease_seconds, item['id'], self.worker))
+        return self.cursor.rowcount == 1
+
+    def complete(self, item):
+        self.cursor.execute(COMPLETE_QUERY, (item['id'], self.worker))
+        return self.cursor.rowcount == 1
+
+    # Returns the new status of the item, queued (to be retried) or failed
+    def fail(self, item, error):
+        delay = self.retry_seconds * 2 ** max(0, item['attempts'] - 1)
+        self.cursor.execute(FAIL_QUERY, (delay, str(error)[:1000], item['id'], self.worker))
+        row = self.cursor.fetchone()
+        return row[0] if row is not None else None
+
+    def release(self, items, delay=0):
+        if not items:
+            return 0
+        self.cursor.execute(RELEASE_QUERY, (delay, [item['id'] for item in items], self.worker))
+        return self.cursor.rowcount
+
+    # Function to put the items of expired leases back in the queue, or fail
+    # them once they used up their attempts. Returns how many were reclaimed.
+    def reclaim(self):
+        self.cursor.execute(RECLAIM_QUERY)
+        return self.cursor.rowcount
+
+    def register(self, kinds):
+        self.cursor.execute(REGISTER_WORKER_QUERY, (self.worker, socket.gethostname(), os.getpid(), ','.join(kinds)))
+
+    def heartbeat(self, stats):
+        self.cursor.execute(HEARTBEAT_QUERY, (stats['done'], stats['failed'], stats['retried'],
+                                              stats['busy_seconds'], self.worker))
+
+    def stop(self, stats):
+        self.heartbeat(stats)
+        self.cursor.execute(STOP_WORKER_QUERY, (self.worker,))
+
+
+# Keeps the lease of an item being worked on, extending it every third of
+# the lease from a connection of its own, since the item's transaction only
+# commits once the item is done. lost is set once an extension finds the
+# lease gone, e.g. reclaimed after the worker stalled; the item's results
+# must then be thrown away.
+class LeaseKeeper:
+    def __init__(self, queue, item, interval=None):
+        self.queue = queue
+        self.item = item
+        self.interval = interval or queue.lease_seconds / 3
+        self.lost = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{item['id']}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._done.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            try:
+                with get_pool().connection() as conn:
+                    with conn.cursor() as cursor:
+                        extended = WorkQueue(cursor, worker=self.queue.worker,
+                                             lease_seconds=self.queue.lease_seconds).extend(self.item)
+                    conn.commit()
+            except psycopg2.Error as err:
+                print(f"Could not extend the lease of item {self.item['id']}: {err}")
+                continue
+            if not extended:
+                print(f"Lease of {self.item['kind']} item {self.item['id']} was lost while it was worked on")
+                self.lost.set()
+                return
+
+
+# Function returning the queue depth by kind and status and the throughput
+# of each worker, using a RealDictCursor. Workers stopped more than
+# window_seconds ago are left out.
+def queue_status(cursor, window_seconds=3600, stale_seconds=None):
+    cursor.execute(QUEUE_STATUS_QUERY)
+    queue = [dict(row) for row in cursor.fetchall()]
+    stale_seconds = stale_seconds or float(os.getenv('WORK_HEARTBEAT_SECONDS', 15)) * 4
+    cursor.execute(WORKER_STATUS_QUERY, {'window_seconds': window_seconds, 'stale_seconds': stale_seconds})
+    workers = [dict(row) for row in cursor.fetchall()]
+    return {'queue': queue, 'workers': workers}
+
+
+# Function to queue the keyword searches of tasks and the jobs needing
+# details for the crawl workers (worker.py)
+def seed_work_queue(tasks):
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            counts = WorkQueue(cursor).seed(tasks)
+        conn.commit()
+    print(f"Queued {counts['searches']} searches and {counts['details']} detail pages")
+    return counts
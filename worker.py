@@ -0,0 +1,362 @@
+import json
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+from browser_pool import BrowserPool, WEBRTC_ARGUMENTS
+from crawl_scheduler import CrawlTask
+from deep_crawl import DeepCrawl, later_page
+from enrichment import DetailWriter
+from enrichment_pipeline import compare_detail_page
+from extractor import MISSING, extract_detail_page, search_page_parser
+from http_fetcher import PageFetcher, DETAIL_PAGE_MARKER, SEARCH_PAGE_MARKER
+from job_fields import remote_search
+from job_store import JobWriter, canonical_job_id
+from crawl_pages import fetch_detail_page, fetch_search_page, generate_tasks, scroll_search_page
+from rate_controller import CircuitOpen, get_controller
+from readiness import wait_report
+from response_cache import bump_generation
+from seen_index import SeenIndex
+from db_pool import get_pool
+from metrics import WORK_ITEMS
+from work_queue import (KIND_DETAIL, KIND_SEARCH, STATUS_FAILED, WORK_KINDS, LeaseKeeper, WorkQueue, queue_status,
+                        seed_work_queue)
+import os
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Usage: python worker.py [run] [--kinds search,detail] [--fetch-mode http] [--exit-when-idle]
+#        python worker.py seed
+#        python worker.py status
+#
+# Start any number of workers on any number of machines against the same
+# database; they share the work queue (see work_queue.py). "seed" queues
+# the keyword searches and the jobs needing details, as the hourly
+# scheduler of flask_main.py does with WORK_QUEUE=on, and "status" prints
+# the queue depth and the throughput of every worker.
+
+JOB_HASHES_QUERY = "SELECT page_hash, record_hash FROM linkedin WHERE id = %s"
+
+# Jobs written by any worker since a given time
+KNOWN_JOBS_QUERY = "SELECT linkedin_job_id FROM linkedin WHERE linkedin_job_id IS NOT NULL AND updated_at >= %s"
+
+# Cached API responses are invalidated at most this often while working
+GENERATION_BUMP_SECONDS = 30
+
+
+# Works through queue items of the given kinds (WORKER_KINDS), leasing
+# WORK_CLAIM_BATCH at a time and waiting WORK_POLL_SECONDS when the queue
+# is empty. Each item is written and marked done in one transaction. Every
+# WORK_RECLAIM_SECONDS the worker also puts expired leases of dead workers
+# back in the queue, every WORK_HEARTBEAT_SECONDS it records its counters
+# for the status query and every WORK_SEEN_SYNC_SECONDS it adds the jobs
+# written by all workers to its seen index and saves it. SIGTERM or Ctrl-C stops it after the
+# current item and hands its other leases back.
+class QueueWorker:
+    def __init__(self, kinds=None, fetch_mode=None, claim_batch=None, poll_seconds=None, exit_when_idle=False):
+        self.kinds = kinds or [kind.strip() for kind in os.getenv('WORKER_KINDS', ','.join(WORK_KINDS)).split(',')
+                               if kind.strip()]
+        unknown = [kind for kind in self.kinds if kind not in WORK_KINDS]
+        if unknown:
+            raise ValueError(f"Unknown work kinds: {', '.join(unknown)}")
+        self.claim_batch = claim_batch or int(os.getenv('WORK_CLAIM_BATCH', 1))
+        self.poll_seconds = poll_seconds or float(os.getenv('WORK_POLL_SECONDS', 5))
+        self.reclaim_seconds = float(os.getenv('WORK_RECLAIM_SECONDS', 60))
+        self.heartbeat_seconds = float(os.getenv('WORK_HEARTBEAT_SECONDS', 15))
+        self.seen_sync_seconds = float(os.getenv('WORK_SEEN_SYNC_SECONDS', 300))
+        self.exit_when_idle = exit_when_idle
+
+        self.deep = DeepCrawl()
+
+        # Jobs written before are skipped before extraction, unless cached
+        # pages are being reparsed. The index on disk is only as recent as
+        # its last save, so jobs updated since then are synced from the
+        # database. It exists before the fetchers so the scroll fetch can
+        # consult it.
+        fetch_mode = fetch_mode or os.getenv('FETCH_MODE', 'browser')
+        self.seen = SeenIndex('jobs', mode='off' if fetch_mode == 'cache' else None)
+        self._seen_synced_at = None
+        if os.path.exists(self.seen.path):
+            self._seen_synced_at = datetime.fromtimestamp(os.path.getmtime(self.seen.path), timezone.utc)
+
+        self.pools = []
+        self.fetchers = []
+        self.search_fetcher = self.detail_fetcher = None
+        if KIND_SEARCH in self.kinds:
+            pool = BrowserPool(size=1)
+            if self.deep.mode == 'scroll':
+                browser_fetch = lambda url: scroll_search_page(pool, self.deep, self.seen, url)
+            else:
+                browser_fetch = lambda url: fetch_search_page(pool, url)
+            self.search_fetcher = PageFetcher(browser_fetch, SEARCH_PAGE_MARKER, mode=fetch_mode,
+                                              marker_optional=later_page)
+            self.pools.append(pool)
+            self.fetchers.append(self.search_fetcher)
+        if KIND_DETAIL in self.kinds:
+            pool = BrowserPool(size=1, extra_arguments=WEBRTC_ARGUMENTS)
+            self.detail_fetcher = PageFetcher(lambda url: fetch_detail_page(pool, url), DETAIL_PAGE_MARKER,
+                                              mode=fetch_mode)
+            self.pools.append(pool)
+            self.fetchers.append(self.detail_fetcher)
+
+        self.stats = {'done': 0, 'failed': 0, 'retried': 0, 'deferred': 0, 'lost': 0, 'busy_seconds': 0.0}
+        self.details = None
+        self._stopping = threading.Event()
+        self._changed = False
+        self._last_bump = time.monotonic()
+
+    def stop(self, *args):
+        if not self._stopping.is_set():
+            print("Stopping after the current item...")
+        self._stopping.set()
+
+    def run(self):
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+        cursor = conn.cursor()
+        queue = WorkQueue(cursor)
+        self.details = DetailWriter(cursor)
+        print(f"Worker {queue.worker} working on {', '.join(self.kinds)} items")
+
+        try:
+            queue.register(self.kinds)
+            conn.commit()
+            self._sync_seen(cursor, conn)
+            last_reclaim = last_heartbeat = 0.0
+            last_seen_sync = time.monotonic()
+            while not self._stopping.is_set():
+                if time.monotonic() - last_reclaim >= self.reclaim_seconds:
+                    last_reclaim = time.monotonic()
+                    reclaimed = queue.reclaim()
+                    conn.commit()
+                    if reclaimed:
+                        print(f"Reclaimed {reclaimed} items with expired leases")
+                if time.monotonic() - last_heartbeat >= self.heartbeat_seconds:
+                    last_heartbeat = time.monotonic()
+                    queue.heartbeat(self.stats)
+                    conn.commit()
+                if time.monotonic() - last_seen_sync >= self.seen_sync_seconds:
+                    last_seen_sync = time.monotonic()
+                    self._sync_seen(cursor, conn)
+
+                items = queue.claim(self.kinds, self.claim_batch)
+                conn.commit()
+                if not items:
+                    self._publish(cursor, conn, force=True)
+                    if self.exit_when_idle:
+                        break
+                    self._stopping.wait(self.poll_seconds)
+                    continue
+
+                for index, item in enumerate(items):
+                    if self._stopping.is_set():
+                        queue.release(items[index:])
+                        conn.commit()
+                        break
+                    self._process(conn, queue, item)
+                    self._publish(cursor, conn)
+
+            self._publish(cursor, conn, force=True)
+            queue.stop(self.stats)
+            conn.commit()
+            self._sync_seen(cursor, conn)
+        finally:
+            cursor.close()
+            db_pool.putconn(conn)
+            for fetcher in self.fetchers:
+                fetcher.close()
+                fetcher.report()
+            for pool in self.pools:
+                pool.close()
+                pool.report()
+            wait_report()
+            self.deep.report()
+            self.report()
+
+    # Function to work on one leased item, keeping its lease while it runs.
+    # The results and the done mark are committed together; a failure rolls
+    # the results back and queues the item for a retry, an open circuit
+    # hands it back untried and a lost lease throws the results away, as
+    # another worker has the item by then. Jobs of a search only count as
+    # seen once they are committed.
+    def _process(self, conn, queue, item):
+        if not queue.extend(item):
+            conn.commit()
+            self.stats['lost'] += 1
+            print(f"Lease of {item['kind']} item {item['id']} expired before it was started")
+            return
+        conn.commit()
+
+        started = time.perf_counter()
+        try:
+            job_ids = []
+            with LeaseKeeper(queue, item) as lease:
+                if item['kind'] == KIND_SEARCH:
+                    job_ids = self._process_search(queue, item)
+                else:
+                    self._process_detail(item)
+            if lease.lost.is_set() or not queue.complete(item):
+                conn.rollback()
+                outcome = 'lost'
+                self.stats['lost'] += 1
+                print(f"Lease of {item['kind']} item {item['id']} expired while it was worked on, "
+                      f"discarding its results")
+            else:
+                conn.commit()
+                for job_id in job_ids:
+                    self.seen.add(job_id)
+                outcome = 'done'
+                self.stats['done'] += 1
+                self._changed = True
+        except CircuitOpen as err:
+            conn.rollback()
+            queue.release([item], delay=get_controller().reset_seconds)
+            conn.commit()
+            outcome = 'deferred'
+            self.stats['deferred'] += 1
+            print(f"Deferred {item['url']}: {err}")
+        except Exception as err:
+            conn.rollback()
+            status = queue.fail(item, err)
+            conn.commit()
+            outcome = 'failed' if status == STATUS_FAILED else 'retried'
+            self.stats[outcome] += 1
+            print(f"Error on {item['kind']} item {item['url']} (attempt {item['attempts']}): {err}")
+        self.stats['busy_seconds'] += time.perf_counter() - started
+        WORK_ITEMS.inc(kind=item['kind'], outcome=outcome)
+
+    # Function to scrape one search results page, queue its next page when
+    # the search goes on and queue the details of the jobs it found. Fails
+    # when a batch of its jobs could not be written. Returns the IDs of the
+    # jobs written.
+    def _process_search(self, queue, item):
+        task = CrawlTask(item['keyword'], item['url'], page=item['page'])
+        html = self.search_fetcher(task.url)
+
+        writer = JobWriter(queue.cursor)
+        parser = search_page_parser()
+        known = self.deep.known_run(self.seen)
+        remote = remote_search(task.url)
+        job_ids = []
+        for data in parser.iter_jobs(html, seen=known):
+            # Cards of a remote-only search rarely say so themselves
+            writer.add(dict(data, Remote=True) if remote else data)
+            job_ids.append(canonical_job_id(data.get('JobLink')))
+        writer.flush()
+        if writer.totals['failed']:
+            raise RuntimeError(f"{writer.totals['failed']} jobs from {task.url} could not be written")
+        # Past its last page a search has no results section and simply ends
+        if not parser.section_found and task.page == 0:
+            raise ValueError(f"Section not found for URL: {task.url}. The structure might have changed.")
+
+        next_task = self.deep.next_task(task, known)
+        if next_task is not None:
+            queue.enqueue_searches([next_task])
+        job_ids = [job_id for job_id in job_ids if job_id is not None]
+        queue.enqueue_details(job_ids=job_ids)
+        print(f"Scraped {len(job_ids)} new jobs from {task.url}")
+        return job_ids
+
+    def _process_detail(self, item):
+        html = self.detail_fetcher(item['url'])
+
+        cursor = self.details.cursor
+        cursor.execute(JOB_HASHES_QUERY, (item['job_id'],))
+        row = cursor.fetchone()
+        if row is None:
+            return
+        job_id = item['job_id']
+        result = compare_detail_page(extract_detail_page, html, row[0], row[1],
+                                     reparse=self.detail_fetcher.mode == 'cache')
+        if result['status'] != 'changed':
+            self.details.mark_unchanged([(job_id, result['page_hash'], result['status'])])
+        elif result['data']['JobDescription'] == MISSING:
+            self.details.mark_failed([job_id])
+        else:
+            self.details.save_details([(job_id, result['data'], result['page_hash'], result['record_hash'])])
+
+    # Function to add the jobs written by any worker, on any machine, since
+    # the last sync to the seen index and save it
+    def _sync_seen(self, cursor, conn):
+        if self.seen.mode == 'off':
+            return
+        cursor.execute("SELECT now()")
+        synced_at = cursor.fetchone()[0]
+        if self._seen_synced_at is not None:
+            cursor.execute(KNOWN_JOBS_QUERY, (self._seen_synced_at,))
+            for (job_id,) in cursor.fetchall():
+                self.seen.add(job_id)
+        conn.commit()
+        self._seen_synced_at = synced_at
+        self.seen.save()
+
+    # Invalidates cached API responses once something was written, at most
+    # every GENERATION_BUMP_SECONDS unless forced
+    def _publish(self, cursor, conn, force=False):
+        if not self._changed:
+            return
+        if not force and time.monotonic() - self._last_bump < GENERATION_BUMP_SECONDS:
+            return
+        bump_generation(cursor)
+        conn.commit()
+        self._changed = False
+        self._last_bump = time.monotonic()
+
+    def report(self):
+        print(f"Worker: {self.stats['done']} done, {self.stats['retried']} retried, {self.stats['failed']} failed, "
+              f"{self.stats['deferred']} deferred, {self.stats['lost']} lost leases, "
+              f"{self.stats['busy_seconds']:.1f}s busy")
+        if self.details is not None:
+            print(f"Details: {self.details.stats['done']} enriched, {self.details.stats['failed']} failed, "
+                  f"{self.details.stats['unchanged_page'] + self.details.stats['unchanged_record']} unchanged")
+        return dict(self.stats)
+
+
+def print_status():
+    with get_pool().connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            status = queue_status(cursor)
+    for row in status['queue']:
+        print(f"{row['kind']:8} {row['status']:8} {row['items']:>8}")
+    for worker in status['workers']:
+        state = 'alive' if worker['alive'] else ('stopped' if worker['stopped_at'] else 'lost')
+        print(f"{worker['id']:40} {state:8} {worker['kinds']:14} {worker['done']:>7} done "
+              f"{worker['failed']:>5} failed {worker['per_minute']:7.2f}/min busy {worker['busy_share']:.0%} "
+              f"leased {worker['leased']}")
+    return status
+
+
+def main(argv):
+    command = argv[0] if argv and not argv[0].startswith('--') else 'run'
+    if command == 'seed':
+        seed_work_queue(generate_tasks())
+        return 0
+    if command == 'status':
+        status = print_status()
+        if '--json' in argv:
+            print(json.dumps(status, default=str, indent=2))
+        return 0
+    if command != 'run':
+        print(f"Unknown command: {command}")
+        return 2
+
+    kinds = argv[argv.index('--kinds') + 1].split(',') if '--kinds' in argv else None
+    fetch_mode = argv[argv.index('--fetch-mode') + 1] if '--fetch-mode' in argv else None
+    worker = QueueWorker(kinds=kinds, fetch_mode=fetch_mode, exit_when_idle='--exit-when-idle' in argv)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.run()
+    except psycopg2.Error as err:
+        print(f"Database Error: {err}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))